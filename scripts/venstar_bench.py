@@ -0,0 +1,168 @@
+"""Load benchmark for the Venstar ColorTouch clients against simulated devices.
+
+Starts N simulated thermostats (or uses ones given with --device), polls them
+all for a fixed time the way the integration does and reports polls/sec,
+p50/p99 refresh latency and memory per client::
+
+    python scripts/venstar_bench.py --devices 40 --duration 20 --concurrency 4
+
+Run it before and after every performance change to this component.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from venstar.venstarcolortouch import AsyncVenstarColorTouch, VenstarColorTouch  # noqa: E402
+import venstar_sim  # noqa: E402
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def client_kwargs(args, url):
+    proto, addr = url.split("://", 1)
+    return dict(addr=addr, timeout=args.timeout, user=args.user, password=args.password,
+                proto=proto, SSLCert=False)
+
+
+def measure_memory(cls, args, urls, refresh):
+    """Return bytes allocated per client after creating and refreshing each once."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    clients = [cls(**client_kwargs(args, url)) for url in urls]
+    refresh(clients)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return clients, (after - before) / len(clients)
+
+
+async def run_async(args, urls):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, failures = [], 0
+
+    async def refresh_all(clients):
+        await asyncio.gather(*(client.refresh() for client in clients))
+
+    clients = [AsyncVenstarColorTouch(**client_kwargs(args, url)) for url in urls]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    await refresh_all(clients)
+    gc.collect()
+    per_client = (tracemalloc.get_traced_memory()[0] - before) / len(clients)
+    tracemalloc.stop()
+
+    deadline = time.monotonic() + args.duration
+
+    async def poll(client):
+        nonlocal failures
+        while time.monotonic() < deadline:
+            async with semaphore:
+                start = time.monotonic()
+                results = await client.refresh()
+                latencies.append(time.monotonic() - start)
+            if not all(results.values()):
+                failures += 1
+            if args.interval:
+                await asyncio.sleep(args.interval)
+
+    started = time.monotonic()
+    await asyncio.gather(*(poll(client) for client in clients))
+    elapsed = time.monotonic() - started
+    for client in clients:
+        await client.close()
+    return latencies, failures, elapsed, per_client
+
+
+def run_sync(args, urls):
+    latencies, failures = [], 0
+
+    def refresh_all(clients):
+        for client in clients:
+            client.refresh()
+
+    clients, per_client = measure_memory(VenstarColorTouch, args, urls, refresh_all)
+    deadline = time.monotonic() + args.duration
+
+    def poll(client):
+        nonlocal failures
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            results = client.refresh()
+            latencies.append(time.monotonic() - start)
+            if not all(results.values()):
+                failures += 1
+            if args.interval:
+                time.sleep(args.interval)
+
+    started = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(poll, clients))
+    elapsed = time.monotonic() - started
+    for client in clients:
+        client.close()
+    return latencies, failures, elapsed, per_client
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=10, help="simulated devices to start")
+    parser.add_argument("--device", action="append", default=[],
+                        help="URL of an existing device to poll instead (repeatable)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to poll for")
+    parser.add_argument("--interval", type=float, default=0.0,
+                        help="pause between polls of one device")
+    parser.add_argument("--concurrency", type=int, default=4, help="polls in flight at once")
+    parser.add_argument("--client", choices=("async", "sync"), default="async")
+    parser.add_argument("--timeout", type=float, default=5)
+    parser.add_argument("--user")
+    parser.add_argument("--password")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated device latency")
+    parser.add_argument("--jitter", type=float, default=0.0, help="simulated latency jitter")
+    parser.add_argument("--loss", type=float, default=0.0, help="simulated packet loss")
+    parser.add_argument("--quirk", action="append", choices=venstar_sim.QUIRKS, default=[])
+    args = parser.parse_args()
+
+    servers = []
+    urls = list(args.device)
+    if not urls:
+        servers = venstar_sim.start_fleet(args.devices, quirks=args.quirk, user=args.user,
+                                          password=args.password, latency=args.latency,
+                                          jitter=args.jitter, loss=args.loss)
+        urls = [server.url for server in servers]
+
+    try:
+        if args.client == "async":
+            latencies, failures, elapsed, per_client = asyncio.run(run_async(args, urls))
+        else:
+            latencies, failures, elapsed, per_client = run_sync(args, urls)
+    finally:
+        venstar_sim.stop_fleet(servers)
+
+    print("client:         {0}".format(args.client))
+    print("devices:        {0}".format(len(urls)))
+    print("polls:          {0} ({1} with a failed endpoint)".format(len(latencies), failures))
+    print("polls/sec:      {0:.1f}".format(len(latencies) / elapsed))
+    print("p50 latency:    {0:.1f} ms".format(percentile(latencies, 0.50) * 1000))
+    print("p99 latency:    {0:.1f} ms".format(percentile(latencies, 0.99) * 1000))
+    if latencies:
+        print("mean latency:   {0:.1f} ms".format(statistics.mean(latencies) * 1000))
+    print("memory/client:  {0:.1f} KiB".format(per_client / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Import-time benchmark for the Venstar component.
+
+Imports the component's modules in fresh interpreters, after the Home
+Assistant modules any install has loaded by then, and reports how long that
+took and which top-level packages it pulled in::
+
+    python scripts/venstar_import_bench.py --runs 9 --max-ms 40
+
+Without Home Assistant installed only the client module is measured. Exits
+non-zero if the median is over --max-ms or a --forbid package got imported, so
+it can guard against startup regressions. Each interpreter starts from cached
+bytecode: the component is compiled first, even under PYTHONDONTWRITEBYTECODE,
+and a first, untimed run warms the rest.
+"""
+import argparse
+import compileall
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Loaded by Home Assistant before any custom integration's platforms.
+BASELINE = (
+    "homeassistant.core",
+    "homeassistant.helpers.config_validation",
+    "homeassistant.helpers.aiohttp_client",
+    "homeassistant.helpers.entity_platform",
+    "homeassistant.components.climate",
+    "homeassistant.components.sensor",
+    "homeassistant.components.binary_sensor",
+    "homeassistant.components.diagnostics",
+)
+MODULES = (
+    "venstar",
+    "venstar.climate",
+    "venstar.sensor",
+    "venstar.binary_sensor",
+    "venstar.config_flow",
+    "venstar.diagnostics",
+)
+CLIENT_MODULES = ("venstar.venstarcolortouch",)
+# Only needed by the sync client, the runtime analytics and profiling traces.
+FORBIDDEN = ("requests", "urllib3", "numpy", "cProfile")
+MARKER = "-- venstar imports --"
+
+CHILD = """
+import importlib, json, logging, sys, time
+sys.path.insert(0, {root!r})
+logging.disable(logging.CRITICAL)
+for name in {baseline!r}:
+    importlib.import_module(name)
+before = set(sys.modules)
+sys.stderr.write({marker!r} + "\\n")
+start = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - start
+new = set(sys.modules) - before
+print(json.dumps({{"elapsed": elapsed,
+                  "packages": sorted({{name.split(".")[0] for name in new}})}}))
+"""
+
+
+def run_once(baseline, modules):
+    """Return (seconds, new top-level packages, [(self us, cumulative us, name)])."""
+    code = CHILD.format(root=ROOT, baseline=baseline, modules=modules, marker=MARKER)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, check=False)
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.split(MARKER)[-1].strip() or "import failed")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    timings = []
+    for line in proc.stderr.split(MARKER, 1)[-1].splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        timings.append((int(own), int(cumulative), name.strip()))
+    return result["elapsed"], result["packages"], timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="interpreters to time")
+    parser.add_argument("--max-ms", type=float, help="fail if the median is slower")
+    parser.add_argument("--forbid", action="append", default=None,
+                        help="fail if this package is imported (default: {0})".format(
+                            ", ".join(FORBIDDEN)))
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to list")
+    args = parser.parse_args()
+    forbidden = args.forbid if args.forbid is not None else FORBIDDEN
+
+    if importlib.util.find_spec("homeassistant") is not None:
+        baseline, modules = BASELINE, MODULES
+    else:
+        baseline, modules = (), CLIENT_MODULES
+    compileall.compile_dir(os.path.join(ROOT, "venstar"), quiet=1)
+    run_once(baseline, modules)
+    runs = [run_once(baseline, modules) for _ in range(args.runs)]
+    elapsed = [run[0] for run in runs]
+    packages, timings = runs[-1][1], runs[-1][2]
+    median = statistics.median(elapsed) * 1000
+
+    print("modules:        {0}".format(", ".join(modules)))
+    print("median:         {0:.1f} ms".format(median))
+    print("min/max:        {0:.1f}/{1:.1f} ms".format(min(elapsed) * 1000, max(elapsed) * 1000))
+    print("new packages:   {0}".format(", ".join(packages)))
+    print("slowest (self us, cumulative us):")
+    for own, cumulative, name in sorted(timings, reverse=True)[:args.top]:
+        print("  {0:8d} {1:10d}  {2}".format(own, cumulative, name))
+
+    failed = False
+    imported = [name for name in forbidden if name in packages]
+    if imported:
+        print("FAIL: imported {0}".format(", ".join(imported)))
+        failed = True
+    if args.max_ms is not None and median > args.max_ms:
+        print("FAIL: median {0:.1f} ms is over {1:.1f} ms".format(median, args.max_ms))
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,397 @@
+"""Simulated Venstar ColorTouch thermostat for local testing and benchmarks.
+
+Serves the local API the integration talks to (``/``, ``query/info``,
+``query/sensors``, ``query/runtimes``, ``query/alerts``, ``/control`` and
+``/settings``) with optional Digest auth and HTTPS, plus configurable latency,
+packet loss and firmware quirks.
+
+Run one or more devices from the command line::
+
+    python scripts/venstar_sim.py --count 5 --port 8100 --latency 0.05 --loss 0.01
+
+or start them in-process with ``start_fleet()`` (see venstar_bench.py).
+
+With ``--announce HOST:PORT`` every device also sends SSDP NOTIFY messages to
+that address (the integration's ``discovery_address``), periodically and
+right after its state changes, as a stand-in for the multicast announcements
+real units make.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Firmware quirks a simulated device can be given.
+QUIRK_T5800 = "t5800"  # no humidity readings or setpoints
+QUIRK_NO_OUTDOOR = "no_outdoor"  # only the thermostat's own sensor
+QUIRKS = (QUIRK_T5800, QUIRK_NO_OUTDOOR)
+
+MODE_OFF, MODE_HEAT, MODE_COOL, MODE_AUTO = 0, 1, 2, 3
+STATE_IDLE, STATE_HEATING, STATE_COOLING = 0, 1, 2
+
+DAY = 86400
+
+SSDP_ST = "venstar:thermostat:ecp"
+
+
+class SimulatedThermostat:
+    """Device state, with a crude room model so heating and cooling cycle."""
+
+    def __init__(self, name, quirks=(), runtime_days=60, mac="00:23:a7:00:00:01"):
+        self.lock = threading.Lock()
+        self.quirks = set(quirks)
+        self.mac = mac
+        # Bumped whenever info changes, so the announcer knows to send a NOTIFY.
+        self.revision = 0
+        self.info = {
+            "name": name,
+            "mode": MODE_HEAT,
+            "state": STATE_IDLE,
+            "fan": 0,
+            "fanstate": 0,
+            "tempunits": 0,
+            "schedule": 0,
+            "schedulepart": 255,
+            "away": 0,
+            "spacetemp": 68.0,
+            "heattemp": 70,
+            "cooltemp": 76,
+            "cooltempmin": 35,
+            "cooltempmax": 99,
+            "heattempmin": 35,
+            "heattempmax": 99,
+            "setpointdelta": 2,
+            "availablemodes": 0,
+        }
+        if QUIRK_T5800 not in self.quirks:
+            self.info.update(hum=40, hum_setpoint=35, dehum_setpoint=55, hum_active=1)
+        self.outdoor = 45.0
+        today = int(time.time()) // DAY * DAY
+        self.runtimes = [
+            {
+                "ts": today - DAY * day,
+                "heat1": random.randint(0, 300),
+                "heat2": 0,
+                "cool1": random.randint(0, 120),
+                "cool2": 0,
+                "aux1": 0,
+                "aux2": 0,
+                "fc": 0,
+            }
+            for day in range(runtime_days, 0, -1)
+        ]
+        self.alerts = [
+            {"name": "Air Filter", "active": False},
+            {"name": "UV Lamp", "active": False},
+            {"name": "Service", "active": False},
+        ]
+        self._last_step = time.monotonic()
+
+    def step(self):
+        """Advance the room model to now."""
+        now = time.monotonic()
+        minutes = (now - self._last_step) / 60
+        self._last_step = now
+        info = self.info
+        temp = info["spacetemp"]
+        mode = info["mode"]
+        state = info["state"]
+        if mode in (MODE_HEAT, MODE_AUTO) and temp < info["heattemp"] - 0.5:
+            info["state"] = STATE_HEATING
+        elif mode in (MODE_COOL, MODE_AUTO) and temp > info["cooltemp"] + 0.5:
+            info["state"] = STATE_COOLING
+        elif (info["state"] == STATE_HEATING and temp >= info["heattemp"]) or (
+            info["state"] == STATE_COOLING and temp <= info["cooltemp"]
+        ) or mode == MODE_OFF:
+            info["state"] = STATE_IDLE
+        drift = {STATE_HEATING: 0.5, STATE_COOLING: -0.5}.get(info["state"], 0)
+        drift += (self.outdoor - temp) * 0.005
+        info["spacetemp"] = round(temp + drift * minutes, 1)
+        info["fanstate"] = 1 if info["fan"] or info["state"] != STATE_IDLE else 0
+        if info["state"] != state:
+            self.revision += 1
+
+    def sensors(self):
+        thermostat = {"name": "Thermostat", "type": "Thermostat", "temp": self.info["spacetemp"]}
+        if QUIRK_T5800 not in self.quirks:
+            thermostat["hum"] = self.info["hum"]
+        sensors = [thermostat]
+        if QUIRK_NO_OUTDOOR not in self.quirks:
+            sensors.append({"name": "Outdoor", "type": "Outdoor", "temp": self.outdoor})
+        return {"sensors": sensors}
+
+    def control(self, params):
+        info = self.info
+        new = dict(info)
+        for key in ("mode", "fan", "heattemp", "cooltemp"):
+            if key in params:
+                new[key] = _number(params[key])
+        if new["mode"] == MODE_AUTO and new["heattemp"] + new["setpointdelta"] > new["cooltemp"]:
+            return {"error": True, "reason": "setpoints violate setpointdelta"}
+        info.update(new)
+        self.revision += 1
+        return {"success": True}
+
+    def settings(self, params):
+        info = self.info
+        if "schedule" in params:
+            info["schedule"] = _number(params["schedule"])
+        for key in ("tempunits", "away", "hum_setpoint", "dehum_setpoint"):
+            if key in params and params[key] not in ("", "None"):
+                if key.endswith("_setpoint") and QUIRK_T5800 in self.quirks:
+                    continue
+                if info["schedule"] and key != "away":
+                    return {"error": True, "reason": "schedule is active"}
+                info[key] = _number(params[key])
+        self.revision += 1
+        return {"success": True}
+
+
+def _number(value):
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+class DeviceServer(ThreadingHTTPServer):
+    """HTTP(S) front end for one SimulatedThermostat."""
+
+    daemon_threads = True
+
+    def __init__(self, address, thermostat, user=None, password=None, latency=0.0,
+                 jitter=0.0, loss=0.0, ssl_context=None):
+        super().__init__(address, _Handler)
+        self.thermostat = thermostat
+        self.user = user
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.realm = "venstar"
+        self.nonce = os.urandom(16).hex()
+        self.requests = 0
+        if ssl_context is not None:
+            self.socket = ssl_context.wrap_socket(self.socket, server_side=True)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        proto = "https" if isinstance(self.socket, ssl.SSLSocket) else "http"
+        return "{0}://{1}:{2}".format(proto, host, port)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "VenstarSim/1.0"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        server = self.server
+        server.requests += 1
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else ""
+
+        if server.loss and random.random() < server.loss:
+            # Packet loss as the client sees it: the request goes unanswered.
+            self.close_connection = True
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            return
+        delay = server.latency + random.uniform(-server.jitter, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if server.user is not None and not self._authorized(method):
+            challenge = 'Digest realm="{0}", nonce="{1}", qop="auth", algorithm=MD5'.format(
+                server.realm, server.nonce)
+            self._send(401, {"error": True, "reason": "unauthorized"},
+                       {"WWW-Authenticate": challenge})
+            return
+
+        path = urllib.parse.urlsplit(self.path).path.strip("/")
+        thermostat = server.thermostat
+        with thermostat.lock:
+            thermostat.step()
+            if method == "GET" and path == "":
+                self._send(200, {"api_ver": 7, "type": "residential", "model": "COLORTOUCH",
+                                 "firmware": "5.28"})
+            elif method == "GET" and path == "query/info":
+                self._send(200, thermostat.info)
+            elif method == "GET" and path == "query/sensors":
+                self._send(200, thermostat.sensors())
+            elif method == "GET" and path == "query/runtimes":
+                self._send(200, {"runtimes": thermostat.runtimes})
+            elif method == "GET" and path == "query/alerts":
+                self._send(200, {"alerts": thermostat.alerts})
+            elif method == "POST" and path == "control":
+                self._send(200, thermostat.control(dict(urllib.parse.parse_qsl(body))))
+            elif method == "POST" and path == "settings":
+                self._send(200, thermostat.settings(dict(urllib.parse.parse_qsl(body))))
+            else:
+                self._send(404, {"error": True, "reason": "not found"})
+
+    def _authorized(self, method):
+        header = self.headers.get("Authorization") or ""
+        if not header.startswith("Digest "):
+            return False
+        fields = urllib.request.parse_keqv_list(urllib.request.parse_http_list(header[7:]))
+        server = self.server
+
+        def H(value):
+            return hashlib.md5(value.encode()).hexdigest()
+
+        ha1 = H("{0}:{1}:{2}".format(server.user, server.realm, server.password))
+        ha2 = H("{0}:{1}".format(method, fields.get("uri", "")))
+        expected = H("{0}:{1}:{2}:{3}:auth:{4}".format(
+            ha1, fields.get("nonce"), fields.get("nc"), fields.get("cnonce"), ha2))
+        return fields.get("nonce") == server.nonce and fields.get("response") == expected
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class SsdpAnnouncer(threading.Thread):
+    """Send SSDP NOTIFYs for a fleet to one UDP address.
+
+    Each device announces itself every ``interval`` seconds, and within
+    ``check`` seconds of its state changing.
+    """
+
+    def __init__(self, servers, address, interval=300.0, check=0.2):
+        super().__init__(daemon=True)
+        self.servers = servers
+        self.address = address
+        self.interval = interval
+        self.check = check
+        self.sent = 0
+        self._done = threading.Event()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def notify(self, server):
+        thermostat = server.thermostat
+        usn = "ecp:{0}:name:{1}:type:residential".format(
+            thermostat.mac, urllib.parse.quote(thermostat.info["name"]))
+        message = ("NOTIFY * HTTP/1.1\r\n"
+                   "HOST: 239.255.255.250:1900\r\n"
+                   "CACHE-CONTROL: max-age={0}\r\n"
+                   "LOCATION: {1}/\r\n"
+                   "NT: {2}\r\n"
+                   "NTS: ssdp:alive\r\n"
+                   "USN: {3}\r\n"
+                   "\r\n").format(int(self.interval), server.url, SSDP_ST, usn)
+        self._sock.sendto(message.encode(), self.address)
+        self.sent += 1
+
+    def run(self):
+        seen = {}
+        last = {}
+        while not self._done.wait(self.check):
+            now = time.monotonic()
+            for server in self.servers:
+                revision = server.thermostat.revision
+                if seen.get(server) != revision or now - last.get(server, 0) >= self.interval:
+                    seen[server] = revision
+                    last[server] = now
+                    self.notify(server)
+
+    def stop(self):
+        self._done.set()
+        self._sock.close()
+
+
+def make_ssl_context(certfile, keyfile=None):
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+def start_fleet(count, host="127.0.0.1", port=0, quirks=(), **server_kwargs):
+    """Start ``count`` simulated devices on background threads; return their servers.
+
+    With ``port`` 0 every device gets a free port; otherwise ports count up
+    from ``port``. ``server_kwargs`` go to DeviceServer (auth, latency, loss, TLS).
+    """
+    servers = []
+    for index in range(count):
+        thermostat = SimulatedThermostat("Sim {0}".format(index + 1), quirks,
+                                         mac="00:23:a7:00:{0:02x}:{1:02x}".format(
+                                             index // 256, index % 256))
+        server = DeviceServer((host, port + index if port else 0), thermostat, **server_kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+
+def stop_fleet(servers):
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1, help="number of devices")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100, help="port of the first device")
+    parser.add_argument("--user", help="require Digest auth with this user")
+    parser.add_argument("--password", help="password for --user")
+    parser.add_argument("--certfile", help="serve HTTPS with this certificate")
+    parser.add_argument("--keyfile", help="private key for --certfile")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random latency")
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of requests left unanswered")
+    parser.add_argument("--quirk", action="append", choices=QUIRKS, default=[],
+                        help="firmware quirk to simulate (repeatable)")
+    parser.add_argument("--announce", metavar="HOST:PORT",
+                        help="send SSDP NOTIFYs to this UDP address")
+    parser.add_argument("--announce-interval", type=float, default=300.0,
+                        help="seconds between periodic NOTIFYs")
+    args = parser.parse_args()
+
+    ssl_context = make_ssl_context(args.certfile, args.keyfile) if args.certfile else None
+    servers = start_fleet(args.count, args.host, args.port, args.quirk, user=args.user,
+                          password=args.password, latency=args.latency, jitter=args.jitter,
+                          loss=args.loss, ssl_context=ssl_context)
+    for server in servers:
+        print("{0} at {1}".format(server.thermostat.info["name"], server.url))
+    announcer = None
+    if args.announce:
+        host, _, port = args.announce.rpartition(":")
+        announcer = SsdpAnnouncer(servers, (host, int(port)), args.announce_interval)
+        announcer.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        if announcer is not None:
+            announcer.stop()
+        stop_fleet(servers)
+
+
+if __name__ == "__main__":
+    main()
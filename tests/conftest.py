@@ -0,0 +1,44 @@
+"""Shared fixtures: a bare Home Assistant core and simulated thermostats."""
+import asyncio
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+from homeassistant.core import HomeAssistant  # noqa: E402
+import venstar_sim  # noqa: E402
+
+from venstar.coordinator import VenstarCoordinator  # noqa: E402
+
+
+@pytest.fixture
+def thermostat():
+    """Start a simulated thermostat; yield its host:port."""
+    (server,) = venstar_sim.start_fleet(1)
+    yield "127.0.0.1:{0}".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def run(tmp_path):
+    """Run a coroutine function with a coordinator on a fresh Home Assistant core."""
+
+    def run(test):
+        async def main():
+            hass = HomeAssistant(str(tmp_path))
+            coordinator = VenstarCoordinator(hass)
+            try:
+                await test(hass, coordinator)
+            finally:
+                for device in list(coordinator.devices):
+                    device.async_stop()
+                    await device.client.close()
+
+        asyncio.run(main())
+
+    return run
@@ -0,0 +1,282 @@
+"""Tests for the client's request layer: digest auth, breaker, lanes and write batches."""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import urllib.request
+import warnings
+
+import pytest
+
+from venstar import venstarcolortouch
+from venstar.venstarcolortouch import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_COMMAND,
+    PRIORITY_POLL,
+    Alert,
+    AsyncVenstarColorTouch,
+    CircuitBreaker,
+    RequestScheduler,
+    SyncRequestScheduler,
+    VenstarColorTouch,
+    _DigestAuth,
+)
+
+
+def md5(value):
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def fields(header):
+    assert header.startswith("Digest ")
+    return urllib.request.parse_keqv_list(urllib.request.parse_http_list(header[7:]))
+
+
+def test_digest_without_qop():
+    auth = _DigestAuth("admin", "secret")
+    assert auth.header("GET", "/query/info") is None
+    assert auth.challenge('Digest realm="ColorTouch", nonce="n1"')
+
+    sent = fields(auth.header("GET", "/query/info"))
+    ha1 = md5("admin:ColorTouch:secret")
+    ha2 = md5("GET:/query/info")
+    assert sent["response"] == md5("{0}:n1:{1}".format(ha1, ha2))
+    assert sent["uri"] == "/query/info"
+    assert "qop" not in sent
+
+
+def test_digest_qop_auth_counts_nonce_uses():
+    auth = _DigestAuth("admin", "secret")
+    assert auth.challenge('Digest realm="ColorTouch", qop="auth,auth-int", nonce="n1", '
+                          'opaque="op"')
+
+    first = fields(auth.header("POST", "/control"))
+    second = fields(auth.header("POST", "/control"))
+    assert (first["nc"], second["nc"]) == ("00000001", "00000002")
+    assert first["opaque"] == "op"
+    assert first["qop"] == "auth"
+    ha1 = md5("admin:ColorTouch:secret")
+    ha2 = md5("POST:/control")
+    assert first["response"] == md5(
+        "{0}:n1:00000001:{1}:auth:{2}".format(ha1, first["cnonce"], ha2))
+
+    # A new nonce starts counting again.
+    assert auth.challenge('Digest realm="ColorTouch", qop="auth", nonce="n2"')
+    assert fields(auth.header("GET", "/"))["nc"] == "00000001"
+
+
+def test_digest_stale_nonce():
+    auth = _DigestAuth("admin", "wrong")
+    assert auth.challenge('Digest realm="r", nonce="n1"')
+    # Refused with the nonce it signed with: the credentials are wrong.
+    assert not auth.challenge('Digest realm="r", nonce="n1"', sent_nonce="n1")
+    # Flagged stale: answer again rather than giving up.
+    assert auth.challenge('Digest realm="r", nonce="n1", stale=TRUE', sent_nonce="n1")
+    assert auth.challenge('Digest realm="r", nonce="n2", stale=true', sent_nonce="n1")
+    assert auth.nonce == "n2"
+
+
+def test_digest_unanswerable_challenges():
+    auth = _DigestAuth("admin", "secret")
+    assert not auth.challenge(None)
+    assert not auth.challenge('Basic realm="r"')
+    assert not auth.challenge('Digest realm="r"')
+    assert auth.challenge('Digest realm="r", nonce="n", qop="auth-int"')
+    assert auth.header("GET", "/") is None
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(venstarcolortouch.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(venstarcolortouch.random, "uniform", lambda low, high: 1.0)
+    return now
+
+
+def test_breaker_opens_probes_and_closes(clock):
+    breaker = CircuitBreaker("host", threshold=2, base_delay=5, max_delay=20)
+    breaker.record_failure()
+    assert not breaker.is_open and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+
+    # Half-open after the back-off: one probe, then held off again.
+    clock[0] += 5
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed probe doubles the back-off.
+    breaker.record_failure()
+    clock[0] += 5
+    assert not breaker.allow()
+    clock[0] += 5
+    assert breaker.allow()
+
+    breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_back_off_is_capped(clock):
+    breaker = CircuitBreaker("host", threshold=1, base_delay=5, max_delay=20)
+    for _ in range(6):
+        breaker.record_failure()
+    assert breaker.delay == 20
+
+
+def test_scheduler_serves_lanes_in_priority_order():
+    async def main():
+        scheduler = RequestScheduler(1)
+        order = []
+
+        async def request(name, priority):
+            async with scheduler.slot(priority):
+                order.append(name)
+
+        await scheduler.acquire(PRIORITY_POLL)
+        tasks = []
+        for name, priority in (("runtimes", PRIORITY_BACKGROUND), ("poll1", PRIORITY_POLL),
+                               ("command", PRIORITY_COMMAND), ("poll2", PRIORITY_POLL)):
+            tasks.append(asyncio.ensure_future(request(name, priority)))
+            await asyncio.sleep(0)
+        assert scheduler.waiting == 4
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        assert order == ["command", "poll1", "poll2", "runtimes"]
+        assert scheduler.in_flight == 0
+
+    asyncio.run(main())
+
+
+def test_scheduler_skips_cancelled_waiters():
+    async def main():
+        scheduler = RequestScheduler(1)
+        await scheduler.acquire(PRIORITY_POLL)
+        cancelled = asyncio.ensure_future(scheduler.acquire(PRIORITY_COMMAND))
+        waiting = asyncio.ensure_future(scheduler.acquire(PRIORITY_POLL))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.wait_for(waiting, 1)
+        assert scheduler.in_flight == 1
+
+    asyncio.run(main())
+
+
+def test_sync_scheduler_serves_lanes_in_priority_order():
+    scheduler = SyncRequestScheduler(1)
+    order = []
+
+    def request(name, priority):
+        with scheduler.slot(priority):
+            order.append(name)
+
+    scheduler.acquire(PRIORITY_POLL)
+    threads = []
+    for name, priority in (("runtimes", PRIORITY_BACKGROUND), ("poll", PRIORITY_POLL),
+                           ("command", PRIORITY_COMMAND)):
+        thread = threading.Thread(target=request, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        deadline = time.monotonic() + 5
+        while scheduler.waiting < len(threads) and time.monotonic() < deadline:
+            time.sleep(0.001)
+    scheduler.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == ["command", "poll", "runtimes"]
+
+
+def test_queued_writes_resolve_when_flush_is_cancelled(thermostat):
+    async def main():
+        client = AsyncVenstarColorTouch(addr=thermostat, timeout=5)
+        await client.update_info()
+        client.write_debounce = 0
+        started = asyncio.Event()
+
+        async def hang(changes):
+            started.set()
+            await asyncio.sleep(60)
+
+        client._write_control = hang
+        future = client.queue_control(fan=1)
+        await started.wait()
+        for task in list(client._flushes):
+            task.cancel()
+        assert await asyncio.wait_for(future, 1) is False
+        await client.close()
+
+    asyncio.run(main())
+
+
+def test_close_fails_queued_writes(thermostat):
+    async def main():
+        client = AsyncVenstarColorTouch(addr=thermostat, timeout=5)
+        await client.update_info()
+        client.write_debounce = 60
+        future = client.queue_control(fan=1)
+        await client.close()
+        assert future.result() is False
+        assert client._batches == {}
+
+        client.write_debounce = 0
+        started = asyncio.Event()
+
+        async def hang(changes):
+            started.set()
+            await asyncio.sleep(60)
+
+        client._write_control = hang
+        future = client.queue_control(fan=1)
+        await started.wait()
+        await asyncio.wait_for(client.close(), 1)
+        assert future.result() is False
+        assert not client._flushes
+
+    asyncio.run(main())
+
+
+def test_alert_polls_return_transitions_and_keep_changed():
+    client = AsyncVenstarColorTouch(addr="127.0.0.1:1", timeout=5)
+    client.changed = {"spacetemp"}
+
+    def body(**active):
+        return json.dumps({"alerts": [{"name": name, "active": value}
+                                      for name, value in active.items()]}).encode()
+
+    assert client._apply_alerts_body(body(Filter=0, Service=1)) == (
+        Alert(name="Service", active=1),)
+    assert client._apply_alerts_body(body(Filter=0, Service=1)) == ()
+    assert client._apply_alerts_body(body(Filter=1)) == (
+        Alert(name="Filter", active=1), Alert(name="Service", active=False))
+    assert client._apply_alerts_body(b"{") is False
+    assert client.changed == {"spacetemp"}
+
+
+def test_check_setpoints_with_unknown_values():
+    client = AsyncVenstarColorTouch(addr="127.0.0.1:1", timeout=5)
+    auto = client.MODE_AUTO
+    assert client._check_setpoints(None, None, client.MODE_HEAT)
+    assert not client._check_setpoints(68, 74, auto)
+
+    client.info = client.info.replace(setpointdelta=2)
+    assert client._check_setpoints(68, 70, auto)
+    assert not client._check_setpoints(68, 69, auto)
+    assert not client._check_setpoints(None, 74, auto)
+    assert not client._check_setpoints(68, None, auto)
+
+
+def test_insecure_warning_is_filtered_once_per_host():
+    # Importing requests and urllib3 adds filters of their own.
+    VenstarColorTouch(addr="10.0.0.4", timeout=5)
+    with warnings.catch_warnings():
+        before = len(warnings.filters)
+        for _ in range(3):
+            client = VenstarColorTouch(addr="10.0.0.5", timeout=5, proto="https")
+            client.move("10.0.0.6")
+            client.move("10.0.0.5")
+        assert len(warnings.filters) == before + 2
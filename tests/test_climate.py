@@ -0,0 +1,61 @@
+"""Tests for how venstar.bulk_control turns one call into each unit's Program."""
+import pytest
+import voluptuous as vol
+
+from homeassistant.components.climate import (
+    ATTR_HVAC_MODE,
+    ATTR_TARGET_TEMP_HIGH,
+    ATTR_TARGET_TEMP_LOW,
+)
+from homeassistant.const import ATTR_TEMPERATURE
+
+from venstar.climate import ATTR_SETBACK, BULK_CONTROL_SCHEMA, _bulk_program
+from venstar.venstarcolortouch import AsyncVenstarColorTouch, Mode
+
+
+def unit(mode, heattemp, cooltemp):
+    client = AsyncVenstarColorTouch(addr="127.0.0.1:1", timeout=5)
+    client.info = client.info.replace(
+        mode=mode, heattemp=heattemp, cooltemp=cooltemp, setpointdelta=4,
+        heattempmin=40, heattempmax=80, cooltempmin=60, cooltempmax=90,
+    )
+    return client
+
+
+def setpoints(program):
+    return program.heattemp, program.cooltemp
+
+
+def test_auto_keeps_the_delta_within_the_limits():
+    client = unit(Mode.AUTO, 68, 74)
+    assert setpoints(_bulk_program(client, {ATTR_TARGET_TEMP_LOW: 72})) == (72, 76)
+    program = _bulk_program(client, {ATTR_TARGET_TEMP_LOW: 88, ATTR_TARGET_TEMP_HIGH: 82})
+    assert setpoints(program) == (80, 84)
+
+    # Raising the cool setpoint would pass cooltempmax; lower the heat one.
+    client.info = client.info.replace(heattempmax=90)
+    program = _bulk_program(client, {ATTR_TARGET_TEMP_LOW: 90, ATTR_TARGET_TEMP_HIGH: 95})
+    assert setpoints(program) == (86, 90)
+
+    client.info = client.info.replace(cooltempmax=42)
+    assert _bulk_program(client, {ATTR_TARGET_TEMP_HIGH: 42}) is None
+
+
+def test_temperature_needs_heat_or_cool():
+    assert setpoints(_bulk_program(unit(Mode.HEAT, 68, 74), {ATTR_TEMPERATURE: 70})) == (70, 74)
+    assert setpoints(_bulk_program(unit(Mode.COOL, 68, 74), {ATTR_TEMPERATURE: 70})) == (68, 70)
+    assert _bulk_program(unit(Mode.AUTO, 68, 74), {ATTR_TEMPERATURE: 70}) is None
+    assert _bulk_program(unit(Mode.OFF, 68, 74), {ATTR_TEMPERATURE: 70}) is None
+
+    with pytest.raises(vol.Invalid):
+        BULK_CONTROL_SCHEMA({ATTR_HVAC_MODE: "auto", ATTR_TEMPERATURE: 70})
+    BULK_CONTROL_SCHEMA({ATTR_HVAC_MODE: "heat", ATTR_TEMPERATURE: 70})
+
+
+def test_setback():
+    client = unit(Mode.AUTO, 68, 76)
+    assert setpoints(_bulk_program(client, {ATTR_SETBACK: 3})) == (65, 79)
+    assert setpoints(_bulk_program(client, {ATTR_SETBACK: -2})) == (70, 74)
+    assert _bulk_program(client, {ATTR_SETBACK: -3}) is None
+    # Outside auto mode there is no delta to keep.
+    assert setpoints(_bulk_program(unit(Mode.HEAT, 68, 76), {ATTR_SETBACK: -5})) == (73, 71)
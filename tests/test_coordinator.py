@@ -0,0 +1,62 @@
+"""Tests for the poll coordinator and its devices."""
+import asyncio
+import time
+
+from venstar.history import ThermostatHistory
+from venstar.runtimes import RuntimesStore
+from venstar.venstarcolortouch import AsyncVenstarColorTouch
+
+
+def add_device(coordinator, host, tmp_path):
+    client = AsyncVenstarColorTouch(addr=host, timeout=5)
+    runtimes = RuntimesStore(str(tmp_path / "runtimes"), 30)
+    history = ThermostatHistory(str(tmp_path / "history"), 16)
+    return coordinator.async_add_client(client, 3600, runtimes, history)
+
+
+def test_remove_device_saves_and_stops(run, thermostat, tmp_path):
+    async def test(hass, coordinator):
+        device = add_device(coordinator, thermostat, tmp_path)
+        await device.async_refresh()
+        # Let the poll loop load the runtimes and open the history.
+        while device.history._map is None:
+            await asyncio.sleep(0.01)
+        now = time.time()
+        device.runtimes.record_outdoor(5.0, now)
+        device.runtimes.record_outdoor(6.0, now + 3600)
+        task = device._task
+
+        await coordinator.async_remove_device(device)
+        await device.client.close()
+        await asyncio.wait([task], timeout=1)
+
+        assert device not in coordinator.devices
+        assert task.done()
+        assert device._refresh_task is None
+        assert device.history._map is None
+        saved = RuntimesStore(device.runtimes.path, 30)
+        saved.load()
+        assert len(saved.outdoor_ts) == 1
+        assert list(saved.outdoor_temp) == list(device.runtimes.outdoor_temp)
+
+    run(test)
+
+
+def test_poll_without_history_when_it_cant_open(run, thermostat, tmp_path):
+    async def test(hass, coordinator):
+        # A regular file where the history's directory should be.
+        (tmp_path / "blocked").write_bytes(b"")
+        client = AsyncVenstarColorTouch(addr=thermostat, timeout=5)
+        history = ThermostatHistory(str(tmp_path / "blocked" / "history"), 16)
+        device = coordinator.async_add_client(client, 0.05, history=history)
+
+        for _ in range(100):
+            if client.info.mode is not None:
+                break
+            await asyncio.sleep(0.05)
+
+        assert device.history is None
+        assert client.info.mode is not None
+        assert not device._task.done()
+
+    run(test)
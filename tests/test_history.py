@@ -0,0 +1,91 @@
+"""Tests for the memory-mapped state history ring buffer."""
+from collections import namedtuple
+
+from venstar.history import ThermostatHistory
+from venstar.venstarcolortouch import State, TempUnits
+
+Info = namedtuple(
+    "Info", ("spacetemp", "heattemp", "cooltemp", "hum", "tempunits", "mode", "state", "fanstate")
+)
+START = 1700000000
+
+
+def info(spacetemp, state=State.IDLE, hum=40):
+    return Info(spacetemp, 68, 74, hum, TempUnits.F, 3, state, 0)
+
+
+def opened(tmp_path, capacity):
+    history = ThermostatHistory(str(tmp_path / "history"), capacity)
+    history.open()
+    return history
+
+
+def test_wraparound_evicts_the_oldest(tmp_path):
+    history = opened(tmp_path, 4)
+    for minute in range(10):
+        history.append(START + 60 * minute, info(70 + minute / 10), outdoor=50 - minute)
+    samples = history.samples()
+    assert len(history) == 4
+    assert [sample.ts for sample in samples] == [START + 60 * minute for minute in range(6, 10)]
+    assert [sample.spacetemp for sample in samples] == [70.6, 70.7, 70.8, 70.9]
+    assert [sample.outdoor for sample in samples] == [44, 43, 42, 41]
+    assert history.last_ts == START + 540
+    assert [sample.ts for sample in history.samples(since=START + 480)] == [START + 480, START + 540]
+    history.close()
+
+
+def test_reopen_keeps_samples_with_the_same_capacity(tmp_path):
+    history = opened(tmp_path, 4)
+    for minute in range(6):
+        history.append(START + 60 * minute, info(70 + minute), outdoor=50)
+    before = history.samples()
+    history.close()
+
+    history = opened(tmp_path, 4)
+    assert history.samples() == before
+    history.append(START + 600, info(80), outdoor=50)
+    assert [sample.spacetemp for sample in history.samples()] == [73, 74, 75, 80]
+    history.close()
+
+
+def test_reopen_with_another_capacity_starts_over(tmp_path):
+    history = opened(tmp_path, 4)
+    history.append(START, info(70))
+    history.close()
+
+    history = opened(tmp_path, 8)
+    assert len(history) == 0 and history.samples() == []
+    history.append(START + 60, info(71))
+    history.close()
+    assert len(opened(tmp_path, 8)) == 1
+
+
+def test_missing_readings_stay_missing(tmp_path):
+    history = opened(tmp_path, 3)
+    history.append(START, info(70, hum=40), outdoor=50)
+    history.append(START + 60, info(None, hum=None))
+    history.append(START + 120, info(71, hum=42), outdoor=51.5)
+    # Evicting the sample without readings must not throw off the rest.
+    history.append(START + 180, info(72, hum=None), outdoor=52)
+    samples = history.samples()
+    assert [(sample.spacetemp, sample.hum, sample.outdoor) for sample in samples] == [
+        (None, None, None),
+        (71, 42, 51.5),
+        (72, None, 52),
+    ]
+    history.append(START + 240, info(70), outdoor=50)
+    assert [sample.spacetemp for sample in history.samples()] == [71, 72, 70]
+    history.close()
+
+
+def test_out_of_order_samples_are_dropped(tmp_path):
+    history = opened(tmp_path, 4)
+    history.append(START + 60, info(70, State.HEATING))
+    history.append(START, info(71))
+    history.append(START + 60, info(72, State.IDLE))
+    history.append(START + 120, info(73, State.HEATING))
+    assert [(sample.ts, sample.spacetemp) for sample in history.samples()] == [
+        (START + 60, 70), (START + 60, 72), (START + 120, 73)]
+    assert [tuple(cycle) for cycle in history.cycles()] == [
+        (State.HEATING, START + 60, START + 60), (State.HEATING, START + 120, None)]
+    history.close()
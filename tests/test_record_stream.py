@@ -0,0 +1,53 @@
+"""Tests for the incremental query/runtimes parser."""
+import json
+
+import pytest
+
+from venstar.venstarcolortouch import RecordStream
+
+RECORDS = [
+    {"ts": 100, "heat1": 10, "cool1": 0},
+    {"ts": 200, "heat1": 0, "cool1": 20, "note": "a } and a { in a string"},
+    {"ts": 300, "heat1": 5, "cool1": 5, "note": '}{"}'},
+]
+BODY = json.dumps({"runtimes": RECORDS}, indent=1).encode()
+
+
+def parse(chunks, since=None):
+    stream = RecordStream(since)
+    for chunk in chunks:
+        stream.feed(chunk)
+    return stream.close()
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, len(BODY)])
+def test_chunks_split_anywhere(size):
+    chunks = [BODY[start:start + size] for start in range(0, len(BODY), size)]
+    assert parse(chunks) == RECORDS
+
+
+def test_since_drops_older_records():
+    assert parse([BODY], since=200) == RECORDS[1:]
+
+
+def test_empty_array():
+    assert parse([b'{"runtimes": [', b" ]}"]) == []
+
+
+def test_truncated_array():
+    with pytest.raises(ValueError, match="truncated"):
+        parse([BODY[:BODY.rindex(b"]")]])
+    with pytest.raises(ValueError, match="truncated"):
+        parse([BODY[:40]])
+
+
+def test_no_array():
+    with pytest.raises(ValueError, match="no record array"):
+        parse([b'{"error": true, "reason": "busy"}'])
+    with pytest.raises(ValueError, match="no record array"):
+        parse([])
+
+
+def test_garbage_in_array():
+    with pytest.raises(ValueError, match="unexpected byte"):
+        parse([b'{"runtimes": [1, 2]}'])
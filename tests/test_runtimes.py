@@ -0,0 +1,120 @@
+"""Tests for the on-disk runtime records cache."""
+from array import array
+import struct
+
+from venstar import runtimes
+from venstar.runtimes import RUNTIME_FIELDS, RUNTIME_PERIOD, RuntimesStore
+
+DAY0 = 20000 * RUNTIME_PERIOD
+
+
+def records(days):
+    return [
+        {"ts": DAY0 + day * RUNTIME_PERIOD, **{
+            field: day * 10 + index for index, field in enumerate(RUNTIME_FIELDS)}}
+        for day in days
+    ]
+
+
+def filled_store(path):
+    store = RuntimesStore(str(path), 30)
+    store.merge(records(range(5)), DAY0 + 5 * RUNTIME_PERIOD)
+    store.record_outdoor(5.0, DAY0)
+    store.record_outdoor(7.0, DAY0 + 60)
+    store.record_outdoor(-2.5, DAY0 + 3600)
+    store.record_outdoor(0.0, DAY0 + 7200)
+    return store
+
+
+def assert_same(loaded, store):
+    assert list(loaded.ts) == list(store.ts)
+    for field in RUNTIME_FIELDS:
+        assert list(loaded.columns[field]) == list(store.columns[field])
+        assert loaded.columns[field].typecode == "q"
+    assert list(loaded.outdoor_ts) == list(store.outdoor_ts)
+    assert list(loaded.outdoor_temp) == list(store.outdoor_temp)
+
+
+def test_round_trip(tmp_path):
+    store = filled_store(tmp_path / "runtimes")
+    assert list(store.outdoor_temp) == [6.0, -2.5]
+    store.save()
+
+    loaded = RuntimesStore(store.path, 30)
+    loaded.load()
+    assert_same(loaded, store)
+    with open(store.path, "rb") as fp:
+        header = fp.read(13)
+    assert header == b"VRT3" + struct.pack("<IIB", 5, 2, 8)
+
+
+def test_round_trip_on_big_endian_host(tmp_path, monkeypatch):
+    store = filled_store(tmp_path / "runtimes")
+    store.save()
+    with open(store.path, "rb") as fp:
+        little = fp.read()
+
+    # A big-endian host swaps on the way out and back in.
+    monkeypatch.setattr(runtimes, "_SWAP", True)
+    store.save()
+    loaded = RuntimesStore(store.path, 30)
+    loaded.load()
+    with open(store.path, "rb") as fp:
+        swapped = fp.read()
+    assert swapped[:13] == little[:13] and swapped[13:] != little[13:]
+    assert_same(loaded, store)
+
+
+def write_old(path, magic, store, typecode="l", itemsize=None):
+    with open(path, "wb") as fp:
+        fp.write(magic + struct.pack("<I", len(store.ts)))
+        if magic != b"VRT1":
+            fp.write(struct.pack("<I", len(store.outdoor_ts)))
+        if itemsize is not None:
+            fp.write(struct.pack("<B", itemsize))
+        store.ts.tofile(fp)
+        for field in RUNTIME_FIELDS:
+            array(typecode, store.columns[field]).tofile(fp)
+        if magic != b"VRT1":
+            store.outdoor_ts.tofile(fp)
+            store.outdoor_temp.tofile(fp)
+
+
+def test_loads_vrt2(tmp_path):
+    store = filled_store(tmp_path / "runtimes")
+    write_old(store.path, b"VRT2", store)
+    loaded = RuntimesStore(store.path, 30)
+    loaded.load()
+    assert_same(loaded, store)
+
+
+def test_loads_vrt1_without_outdoor_hours(tmp_path):
+    store = filled_store(tmp_path / "runtimes")
+    write_old(store.path, b"VRT1", store)
+    loaded = RuntimesStore(store.path, 30)
+    loaded.load()
+    assert list(loaded.ts) == list(store.ts)
+    assert list(loaded.columns["cool1"]) == list(store.columns["cool1"])
+    assert len(loaded.outdoor_ts) == 0
+
+
+def test_loads_vrt3_with_four_byte_values(tmp_path):
+    store = filled_store(tmp_path / "runtimes")
+    write_old(store.path, b"VRT3", store, typecode="i", itemsize=4)
+    loaded = RuntimesStore(store.path, 30)
+    loaded.load()
+    assert_same(loaded, store)
+
+
+def test_unreadable_files_leave_the_store_empty(tmp_path):
+    path = tmp_path / "runtimes"
+    for body in (b"junk", b"VRT3" + struct.pack("<IIB", 1, 0, 3) + bytes(64),
+                 b"VRT3" + struct.pack("<IIB", 5, 0, 8)):
+        path.write_bytes(body)
+        store = RuntimesStore(str(path), 30)
+        store.load()
+        assert len(store) == 0
+
+    store = RuntimesStore(str(tmp_path / "missing"), 30)
+    store.load()
+    assert len(store) == 0
@@ -1 +1,112 @@
 """The venstar component."""
+import asyncio
+
+from homeassistant.const import (
+    CONF_HOST,
+    CONF_PASSWORD,
+    CONF_SSL,
+    CONF_TIMEOUT,
+    CONF_USERNAME,
+)
+from homeassistant.core import callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.storage import STORAGE_DIR
+from homeassistant.util import slugify
+
+from .const import (
+    CONF_DISCOVERY,
+    CONF_IDENTITY,
+    CONF_RUNTIMES_MAX_AGE,
+    DEFAULT_RUNTIMES_MAX_AGE,
+    DEFAULT_SCAN_INTERVAL,
+    DEFAULT_TIMEOUT,
+    HISTORY_RECORDS,
+)
+from .coordinator import async_get_coordinator
+from .discovery import SSDP_ADDRESS
+from .history import ThermostatHistory
+from .runtimes import RuntimesStore
+from .venstarcolortouch import AsyncVenstarColorTouch
+
+PLATFORMS = ["climate", "sensor", "binary_sensor"]
+
+
+@callback
+def async_create_device(hass, config, interval):
+    """Create the client for a thermostat's config and start polling it."""
+    host = config[CONF_HOST]
+    client = AsyncVenstarColorTouch(
+        addr=host,
+        timeout=config.get(CONF_TIMEOUT, DEFAULT_TIMEOUT),
+        user=config.get(CONF_USERNAME),
+        password=config.get(CONF_PASSWORD),
+        proto="https" if config.get(CONF_SSL) else "http",
+        session=async_get_clientsession(hass),
+    )
+    runtimes = RuntimesStore(
+        hass.config.path(STORAGE_DIR, "venstar_runtimes_{}".format(slugify(host))),
+        config.get(CONF_RUNTIMES_MAX_AGE, DEFAULT_RUNTIMES_MAX_AGE),
+    )
+    history = ThermostatHistory(
+        hass.config.path(STORAGE_DIR, "venstar_history_{}".format(slugify(host))),
+        HISTORY_RECORDS,
+    )
+    return async_get_coordinator(hass).async_add_client(client, interval, runtimes, history)
+
+
+async def async_setup(hass, config):
+    """Set up the Venstar component; thermostats come from YAML or config entries."""
+    return True
+
+
+async def async_setup_entry(hass, entry):
+    """Set up a thermostat from a config entry without waiting for it.
+
+    The entities come up right away from the identity cached in the entry; the
+    first refresh runs in the background, so a unit that is down at startup
+    doesn't hold up setup.
+    """
+    coordinator = async_get_coordinator(hass)
+    device = async_create_device(hass, entry.data, DEFAULT_SCAN_INTERVAL)
+    device.unique_id = entry.unique_id or entry.entry_id
+    device.client.restore_identity(entry.data.get(CONF_IDENTITY, {}))
+    coordinator.entries[entry.entry_id] = device
+
+    @callback
+    def _async_save_identity():
+        """Keep the cached identity current (renames, unit changes)."""
+        if device.client.info.mode is None:
+            return
+        identity = device.client.identity
+        if identity != entry.data.get(CONF_IDENTITY):
+            hass.config_entries.async_update_entry(
+                entry, data={**entry.data, CONF_IDENTITY: identity}
+            )
+
+    entry.async_on_unload(device.async_add_listener(_async_save_identity))
+    hass.async_create_task(device.async_refresh())
+
+    if entry.data.get(CONF_DISCOVERY, True):
+        await coordinator.async_start_discovery(SSDP_ADDRESS)
+
+    for platform in PLATFORMS:
+        hass.async_create_task(
+            hass.config_entries.async_forward_entry_setup(entry, platform)
+        )
+    return True
+
+
+async def async_unload_entry(hass, entry):
+    """Unload a config entry."""
+    unloaded = all(
+        await asyncio.gather(
+            *(
+                hass.config_entries.async_forward_entry_unload(entry, platform)
+                for platform in PLATFORMS
+            )
+        )
+    )
+    if unloaded:
+        coordinator = async_get_coordinator(hass)
+        await coordinator.async_remove_device(coordinator.entries.pop(entry.entry_id))
+    return unloaded
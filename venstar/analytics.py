@@ -0,0 +1,193 @@
+"""Fleet-wide runtime analytics over every thermostat's cached runtimes.
+
+The daily records and hourly outdoor means of all units are laid out as
+unit-by-day NumPy matrices, so duty cycles, degree-day normalization, outlier
+scores and weekly trends for the whole fleet are a handful of array passes
+rather than a Python loop over unit-days. NumPy is optional: without it the
+analytics are simply not offered. It is imported by the first analyze() call,
+in the executor, rather than with the integration.
+"""
+import importlib.util
+
+from .runtimes import RUNTIME_PERIOD
+
+np = None
+AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+HEAT_FIELDS = ("heat1", "heat2", "aux1", "aux2")
+COOL_FIELDS = ("cool1", "cool2")
+DAY_MINUTES = 1440
+
+# Days of records analyzed, as whole weeks for the weekly trend.
+ANALYTICS_WEEKS = 4
+ANALYTICS_DAYS = ANALYTICS_WEEKS * 7
+# Degree-days are counted from 18.3 C (65 F).
+DEGREE_DAY_BASE = 18.3
+# A day's degree-days are only used when the outdoor sensor covered this many
+# of its hours.
+MIN_OUTDOOR_HOURS = 18
+# Units whose modified z-score (median/MAD based) of runtime per degree-day,
+# or of duty cycle without outdoor data, is above this run well above their
+# peers. Scoring needs at least MIN_PEERS comparable units.
+OUTLIER_SCORE = 3.5
+MIN_PEERS = 3
+
+
+class RuntimeAnalytics:
+    """What the analytics found for one unit; None where there isn't enough data.
+
+    Duty cycles are fractions of the day a stage ran. Runtime per degree-day is
+    in minutes per Celsius degree-day. ``weekly`` is the average runtime per
+    week in each of the last ANALYTICS_WEEKS weeks, oldest first, and ``trend``
+    its least-squares change per week as a fraction of the mean.
+    """
+
+    __slots__ = (
+        "days",
+        "heat_duty",
+        "cool_duty",
+        "heating_degree_days",
+        "cooling_degree_days",
+        "heat_per_degree_day",
+        "cool_per_degree_day",
+        "score",
+        "outlier",
+        "weekly",
+        "trend",
+    )
+
+    def __init__(self, **fields):
+        """Initialize from keyword arguments, one per slot."""
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return "RuntimeAnalytics({0})".format(
+            ", ".join("{0}={1!r}".format(name, getattr(self, name)) for name in self.__slots__)
+        )
+
+
+def _number(value):
+    """Return a NumPy scalar as a float, or None if it isn't finite."""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def _fill_row(row, window, now, heat, cool, hdd, cdd):
+    # Day 0 starts on the unit's own record boundary, so outdoor hours land in
+    # the same day as the record they belong to whatever its midnight is.
+    days = heat.shape[1]
+    ts = np.frombuffer(window.ts, dtype=np.int64)
+    phase = int(ts[-1]) % RUNTIME_PERIOD if len(ts) else 0
+    start = (now - phase) // RUNTIME_PERIOD * RUNTIME_PERIOD + phase - (days - 1) * RUNTIME_PERIOD
+
+    index = (ts - start) // RUNTIME_PERIOD
+    keep = (index >= 0) & (index < days)
+    index = index[keep]
+    heat[row, index] = sum(np.frombuffer(window.columns[field], dtype=window.columns[field].typecode)
+                           for field in HEAT_FIELDS)[keep]
+    cool[row, index] = sum(np.frombuffer(window.columns[field], dtype=window.columns[field].typecode)
+                           for field in COOL_FIELDS)[keep]
+
+    hours = np.frombuffer(window.outdoor_ts, dtype=np.int64)
+    temps = np.frombuffer(window.outdoor_temp, dtype=np.float64)
+    index = (hours - start) // RUNTIME_PERIOD
+    keep = (index >= 0) & (index < days)
+    index, temps = index[keep], temps[keep]
+    covered = np.bincount(index, minlength=days)
+    enough = covered >= MIN_OUTDOOR_HOURS
+    # Mean hourly degree deficit (excess) over the hours seen, as degree-days.
+    heating = np.bincount(index, np.maximum(DEGREE_DAY_BASE - temps, 0), minlength=days)
+    cooling = np.bincount(index, np.maximum(temps - DEGREE_DAY_BASE, 0), minlength=days)
+    hdd[row, enough] = heating[enough] / covered[enough]
+    cdd[row, enough] = cooling[enough] / covered[enough]
+
+
+def _scores(metric):
+    """Return the modified z-score of each finite value against the others."""
+    scores = np.full(metric.shape, np.nan)
+    valid = np.isfinite(metric)
+    if valid.sum() < MIN_PEERS:
+        return scores
+    values = metric[valid]
+    median = np.median(values)
+    spread = np.median(np.abs(values - median))
+    if spread > 0:
+        scores[valid] = 0.6745 * (values - median) / spread
+    else:
+        # Most units identical: fall back to the mean absolute deviation.
+        spread = np.mean(np.abs(values - median))
+        scores[valid] = 0.7979 * (values - median) / spread if spread > 0 else 0.0
+    return scores
+
+
+def analyze(windows, now, days=ANALYTICS_DAYS):
+    """Analyze the RuntimeWindow of every unit; return a RuntimeAnalytics per key.
+
+    ``days`` must be a whole number of weeks.
+    """
+    global np
+    if np is None:
+        import numpy as np
+    keys = list(windows)
+    shape = (len(keys), days)
+    heat, cool, hdd, cdd = (np.full(shape, np.nan) for _ in range(4))
+    for row, key in enumerate(keys):
+        _fill_row(row, windows[key], int(now), heat, cool, hdd, cdd)
+
+    reported = np.isfinite(heat)
+    report_days = reported.sum(axis=1)
+    total = heat + cool
+    with np.errstate(invalid="ignore", divide="ignore"):
+        heat_duty = np.nansum(heat, axis=1) / (report_days * DAY_MINUTES)
+        cool_duty = np.nansum(cool, axis=1) / (report_days * DAY_MINUTES)
+
+        # Runtime per degree-day, over the days with both a record and outdoor data.
+        both = reported & np.isfinite(hdd)
+        measured = np.where(both.any(axis=1), 1.0, np.nan)
+        hdd_sum = np.where(both, hdd, 0).sum(axis=1) * measured
+        cdd_sum = np.where(both, cdd, 0).sum(axis=1) * measured
+        heat_per_dd = np.where(both, heat, 0).sum(axis=1) / hdd_sum
+        cool_per_dd = np.where(both, cool, 0).sum(axis=1) / cdd_sum
+        intensity = np.where(both, total, 0).sum(axis=1) / (hdd_sum + cdd_sum)
+        intensity[~np.isfinite(intensity)] = np.nan
+
+        scores = _scores(intensity)
+        if not np.isfinite(scores).any():
+            scores = _scores(heat_duty + cool_duty)
+
+        # Average runtime per week (mean day times seven, so a week with a
+        # missing record isn't undercounted), then its least-squares slope.
+        weeks = days // 7
+        by_week = total.reshape(len(keys), weeks, 7)
+        weekly = np.nansum(by_week, axis=2) / np.isfinite(by_week).sum(axis=2) * 7
+        seen = np.isfinite(weekly)
+        x = np.arange(weeks, dtype=np.float64)
+        n = seen.sum(axis=1)
+        sum_x = np.where(seen, x, 0).sum(axis=1)
+        sum_y = np.where(seen, weekly, 0).sum(axis=1)
+        sum_xx = np.where(seen, x * x, 0).sum(axis=1)
+        sum_xy = np.where(seen, x * weekly, 0).sum(axis=1)
+        slope = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x * sum_x)
+        trend = np.where(n >= 2, slope / (sum_y / n), np.nan)
+
+    results = {}
+    for row, key in enumerate(keys):
+        score = _number(scores[row])
+        results[key] = RuntimeAnalytics(
+            days=int(report_days[row]),
+            heat_duty=_number(heat_duty[row]),
+            cool_duty=_number(cool_duty[row]),
+            heating_degree_days=_number(hdd_sum[row]),
+            cooling_degree_days=_number(cdd_sum[row]),
+            heat_per_degree_day=_number(heat_per_dd[row]),
+            cool_per_degree_day=_number(cool_per_dd[row]),
+            score=score,
+            outlier=score is not None and score > OUTLIER_SCORE,
+            weekly=tuple(_number(value) for value in weekly[row]),
+            trend=_number(trend[row]),
+        )
+    return results
@@ -0,0 +1,77 @@
+"""Alert binary sensors for Venstar WiFi Thermostats."""
+import logging
+
+from homeassistant.components.binary_sensor import (
+    DEVICE_CLASS_PROBLEM,
+    BinarySensorEntity,
+)
+from homeassistant.const import CONF_HOST
+from homeassistant.core import callback
+
+from .coordinator import async_get_coordinator
+from .sensor import VenstarDeviceSensor
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    """Set up a binary sensor per alert of a thermostat set up by the climate platform."""
+    if discovery_info is None:
+        return
+
+    device = async_get_coordinator(hass).async_get_device(discovery_info[CONF_HOST])
+    if device is None:
+        return
+    _async_setup_device(device, async_add_entities)
+
+
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Set up the alert binary sensors of a config entry's thermostat."""
+    entry.async_on_unload(
+        _async_setup_device(async_get_coordinator(hass).entries[entry.entry_id], async_add_entities)
+    )
+
+
+@callback
+def _async_setup_device(device, async_add_entities):
+    """Add the device's alert sensors; return a callback that stops adding new ones."""
+    known = set()
+
+    @callback
+    def _async_add_alerts():
+        """Add an entity for every alert not seen before."""
+        entities = []
+        for alert in device.client.alerts:
+            if alert.name in known:
+                continue
+            known.add(alert.name)
+            entities.append(VenstarAlertSensor(device, alert.name))
+        if entities:
+            async_add_entities(entities)
+
+    # The alert list arrives with the device's first alerts poll.
+    _async_add_alerts()
+    return device.async_add_listener(_async_add_alerts)
+
+
+class VenstarAlertSensor(VenstarDeviceSensor, BinarySensorEntity):
+    """On while the thermostat reports the alert (filter change, UV lamp, service)."""
+
+    def __init__(self, device, alert):
+        """Initialize the binary sensor for the alert named ``alert``."""
+        super().__init__(device)
+        self._alert = alert
+        self._suffix = alert
+
+    @property
+    def is_on(self):
+        """Return True if the alert is active."""
+        for alert in self._client.alerts:
+            if alert.name == self._alert:
+                return bool(alert.active)
+        return False
+
+    @property
+    def device_class(self):
+        """Return the device class of the binary sensor."""
+        return DEVICE_CLASS_PROBLEM
@@ -5,6 +5,8 @@ import voluptuous as vol
 
 from homeassistant.components.climate import ClimateEntity, PLATFORM_SCHEMA
 from homeassistant.components.climate.const import (
+    ATTR_FAN_MODE,
+    ATTR_HUMIDITY,
     ATTR_HVAC_MODE,
     ATTR_TARGET_TEMP_HIGH,
     ATTR_TARGET_TEMP_LOW,
@@ -21,91 +23,422 @@ from homeassistant.components.climate.const import (
     HVAC_MODE_OFF,
 )
 from homeassistant.const import (
+    ATTR_ENTITY_ID,
     ATTR_TEMPERATURE,
     CONF_HOST,
     CONF_PASSWORD,
+    CONF_SCAN_INTERVAL,
     CONF_SSL,
     CONF_TIMEOUT,
     CONF_USERNAME,
+    ENTITY_MATCH_ALL,
     PRECISION_HALVES,
     STATE_ON,
     TEMP_CELSIUS,
     TEMP_FAHRENHEIT,
 )
+from homeassistant.core import callback
+from homeassistant.helpers import entity_platform
 import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.discovery import async_load_platform
+
+from . import analytics, async_create_device
+from .const import (
+    CONF_DISCOVERY,
+    CONF_DISCOVERY_ADDRESS,
+    CONF_HUMIDIFIER,
+    CONF_RUNTIMES_MAX_AGE,
+    DEFAULT_CYCLE_REPORT_HOURS,
+    DEFAULT_RUNTIMES_MAX_AGE,
+    DEFAULT_SCAN_INTERVAL,
+    DEFAULT_SHORT_CYCLE,
+    DEFAULT_TIMEOUT,
+    DOMAIN,
+    SERVICE_BULK_CONTROL,
+    SERVICE_CYCLE_REPORT,
+    SERVICE_RUNTIME_REPORT,
+    SERVICE_SET_PROGRAM,
+    SERVICE_TRACE_START,
+    SERVICE_TRACE_STOP,
+)
+from .coordinator import async_get_coordinator
+from .discovery import SSDP_ADDRESS, parse_address
+from .venstarcolortouch import Fan, Mode, Program, SchedulePart
 
 _LOGGER = logging.getLogger(__name__)
 
 ATTR_FAN_STATE = "fan_state"
 ATTR_HVAC_STATE = "hvac_mode"
-
-CONF_HUMIDIFIER = "humidifier"
+ATTR_POLL_INTERVAL = "poll_interval"
+ATTR_HEAT_RUNTIME = "heat_runtime"
+ATTR_COOL_RUNTIME = "cool_runtime"
+ATTR_SCHEDULE_PART = "schedule_part"
+ATTR_SCHEDULE = "schedule"
+ATTR_AWAY = "away"
+ATTR_DEHUMIDITY = "dehumidity"
+ATTR_SETBACK = "setback"
+ATTR_HOURS = "hours"
+ATTR_MIN_RUN = "min_run"
+ATTR_PROFILE = "profile"
 
 DEFAULT_SSL = False
 
 VALID_FAN_STATES = [STATE_ON, HVAC_MODE_AUTO]
 VALID_THERMOSTAT_MODES = [HVAC_MODE_HEAT, HVAC_MODE_COOL, HVAC_MODE_OFF, HVAC_MODE_AUTO]
 
+CLIENT_MODES = {
+    HVAC_MODE_HEAT: Mode.HEAT,
+    HVAC_MODE_COOL: Mode.COOL,
+    HVAC_MODE_AUTO: Mode.AUTO,
+    HVAC_MODE_OFF: Mode.OFF,
+}
+
 HOLD_MODE_OFF = "off"
 HOLD_MODE_TEMPERATURE = "temperature"
 
+SCHEDULE_PARTS = {part.value: part.name.lower() for part in SchedulePart}
+
+# Client fields the thermostat entity's state and attributes are built from.
+EXPOSED_FIELDS = frozenset(
+    [
+        "name",
+        "mode",
+        "fan",
+        "fanstate",
+        "state",
+        "heattemp",
+        "cooltemp",
+        "tempunits",
+        "schedule",
+        "schedulepart",
+        "away",
+        "hum_setpoint",
+        "hum_active",
+        "sensors.thermostat.temp",
+        "sensors.thermostat.hum",
+    ]
+)
+
+# Fields of venstar.set_program; temperatures are in the thermostat's own units.
+SET_PROGRAM_SCHEMA = {
+    vol.Optional(ATTR_SCHEDULE): cv.boolean,
+    vol.Optional(ATTR_AWAY): cv.boolean,
+    vol.Optional(ATTR_HVAC_MODE): vol.In(VALID_THERMOSTAT_MODES),
+    vol.Optional(ATTR_FAN_MODE): vol.In(VALID_FAN_STATES),
+    vol.Optional(ATTR_TARGET_TEMP_LOW): vol.Coerce(float),
+    vol.Optional(ATTR_TARGET_TEMP_HIGH): vol.Coerce(float),
+    vol.Optional(ATTR_HUMIDITY): vol.All(vol.Coerce(int), vol.Range(min=0, max=60)),
+    vol.Optional(ATTR_DEHUMIDITY): vol.All(vol.Coerce(int), vol.Range(min=0, max=100)),
+}
+
+RUNTIME_REPORT_SCHEMA = vol.Schema({vol.Optional(ATTR_ENTITY_ID): cv.comp_entity_ids})
+
+CYCLE_REPORT_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_ENTITY_ID): cv.comp_entity_ids,
+        vol.Optional(ATTR_HOURS, default=DEFAULT_CYCLE_REPORT_HOURS): vol.All(
+            vol.Coerce(float), vol.Range(min=0, min_included=False)
+        ),
+        vol.Optional(ATTR_MIN_RUN, default=DEFAULT_SHORT_CYCLE): cv.positive_int,
+    }
+)
+
+TRACE_START_SCHEMA = vol.Schema({vol.Optional(ATTR_PROFILE, default=False): cv.boolean})
+
+
+def _single_setpoint_mode(data):
+    """Reject a single temperature for a mode that has two setpoints or none."""
+    if ATTR_TEMPERATURE in data and data.get(ATTR_HVAC_MODE) in (HVAC_MODE_AUTO, HVAC_MODE_OFF):
+        raise vol.Invalid(
+            "{0} needs hvac_mode heat or cool; use {1} and {2} instead".format(
+                ATTR_TEMPERATURE, ATTR_TARGET_TEMP_LOW, ATTR_TARGET_TEMP_HIGH
+            )
+        )
+    return data
+
+
+# venstar.bulk_control: one change for many thermostats at once. "setback" moves
+# the heat setpoint down and the cool setpoint up by that many degrees (negative
+# to move them the other way), on top of any absolute setpoints given.
+BULK_CONTROL_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional(ATTR_ENTITY_ID): cv.comp_entity_ids,
+            vol.Optional(ATTR_HVAC_MODE): vol.In(VALID_THERMOSTAT_MODES),
+            vol.Optional(ATTR_FAN_MODE): vol.In(VALID_FAN_STATES),
+            vol.Optional(ATTR_TEMPERATURE): vol.Coerce(float),
+            vol.Optional(ATTR_TARGET_TEMP_LOW): vol.Coerce(float),
+            vol.Optional(ATTR_TARGET_TEMP_HIGH): vol.Coerce(float),
+            vol.Optional(ATTR_SETBACK): vol.Coerce(float),
+        }
+    ),
+    _single_setpoint_mode,
+)
+
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
     {
         vol.Required(CONF_HOST): cv.string,
         vol.Optional(CONF_PASSWORD): cv.string,
         vol.Optional(CONF_HUMIDIFIER, default=True): cv.boolean,
         vol.Optional(CONF_SSL, default=DEFAULT_SSL): cv.boolean,
-        vol.Optional(CONF_TIMEOUT, default=5): vol.All(
+        vol.Optional(CONF_TIMEOUT, default=DEFAULT_TIMEOUT): vol.All(
             vol.Coerce(int), vol.Range(min=1)
         ),
         vol.Optional(CONF_USERNAME): cv.string,
+        vol.Optional(
+            CONF_RUNTIMES_MAX_AGE, default=DEFAULT_RUNTIMES_MAX_AGE
+        ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Optional(CONF_DISCOVERY, default=True): cv.boolean,
+        vol.Optional(CONF_DISCOVERY_ADDRESS): cv.string,
     }
 )
 
 
-def setup_platform(hass, config, add_entities, discovery_info=None):
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the Venstar thermostat."""
-    #import venstarcolortouch
-
-    username = config.get(CONF_USERNAME)
-    password = config.get(CONF_PASSWORD)
     host = config.get(CONF_HOST)
-    timeout = config.get(CONF_TIMEOUT)
-    humidifier = config.get(CONF_HUMIDIFIER)
+    interval = config.get(CONF_SCAN_INTERVAL)
+    interval = interval.total_seconds() if interval else DEFAULT_SCAN_INTERVAL
+
+    coordinator = async_get_coordinator(hass)
+    device = async_create_device(hass, config, interval)
+
+    async_add_entities([VenstarThermostat(device, config.get(CONF_HUMIDIFIER))], True)
+
+    if config.get(CONF_DISCOVERY):
+        address = config.get(CONF_DISCOVERY_ADDRESS)
+        await coordinator.async_start_discovery(
+            parse_address(address) if address else SSDP_ADDRESS
+        )
+
+    _async_register_services(hass, coordinator)
+
+    for component in ("sensor", "binary_sensor"):
+        hass.async_create_task(
+            async_load_platform(hass, component, DOMAIN, {CONF_HOST: host}, {})
+        )
+
 
-    if config.get(CONF_SSL):
-        proto = "https"
-    else:
-        proto = "http"
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Set up the thermostat of a config entry.
 
-    client = VenstarColorTouch(
-        addr=host, timeout=timeout, user=username, password=password, proto=proto
+    The entity is added without waiting for an update; it shows the cached
+    identity until the background refresh started by the entry lands.
+    """
+    coordinator = async_get_coordinator(hass)
+    device = coordinator.entries[entry.entry_id]
+    async_add_entities(
+        [VenstarThermostat(device, entry.data.get(CONF_HUMIDIFIER, True))]
     )
+    _async_register_services(hass, coordinator)
 
-    add_entities([VenstarThermostat(client, humidifier)], True)
+
+@callback
+def _async_register_services(hass, coordinator):
+    platform = entity_platform.current_platform.get()
+    platform.async_register_entity_service(
+        SERVICE_SET_PROGRAM, SET_PROGRAM_SCHEMA, "async_set_program"
+    )
+
+    if hass.services.has_service(DOMAIN, SERVICE_BULK_CONTROL):
+        return
+
+    def selected_devices(call):
+        entity_ids = call.data.get(ATTR_ENTITY_ID)
+        return [
+            device
+            for device in coordinator.devices
+            if entity_ids in (None, ENTITY_MATCH_ALL) or device.entity_id in entity_ids
+        ]
+
+    async def async_bulk_control(call):
+        """Apply one change to every selected thermostat in parallel."""
+        await coordinator.async_bulk_apply(
+            selected_devices(call), lambda client: _bulk_program(client, call.data)
+        )
+
+    async def async_runtime_report(call):
+        """Recompute the runtime analytics and fire them as an event."""
+        if not analytics.AVAILABLE:
+            _LOGGER.error("%s.%s needs numpy", DOMAIN, SERVICE_RUNTIME_REPORT)
+            return
+        await coordinator.async_runtime_report(selected_devices(call))
+
+    async def async_cycle_report(call):
+        """Summarize the recent heating and cooling cycles as an event."""
+        await coordinator.async_cycle_report(
+            selected_devices(call), call.data[ATTR_HOURS], call.data[ATTR_MIN_RUN]
+        )
+
+    async def async_trace_start(call):
+        """Start timing client calls and entity properties."""
+        coordinator.tracer.start(call.data[ATTR_PROFILE])
+        _LOGGER.info("Venstar trace started")
+
+    async def async_trace_stop(call):
+        """Stop the trace, save it and fire its summary as an event."""
+        if coordinator.tracer.started is None:
+            _LOGGER.error("%s.%s: no trace was started", DOMAIN, SERVICE_TRACE_STOP)
+            return
+        await coordinator.async_stop_trace()
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_BULK_CONTROL, async_bulk_control, schema=BULK_CONTROL_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_CYCLE_REPORT, async_cycle_report, schema=CYCLE_REPORT_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_RUNTIME_REPORT, async_runtime_report, schema=RUNTIME_REPORT_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_TRACE_START, async_trace_start, schema=TRACE_START_SCHEMA
+    )
+    hass.services.async_register(DOMAIN, SERVICE_TRACE_STOP, async_trace_stop)
+
+
+def _bulk_program(client, data):
+    """Return the Program a bulk_control call means for one thermostat.
+
+    Setpoints are clamped to the unit's limits. In auto mode the cool setpoint
+    is raised, or failing that the heat setpoint lowered, to keep the unit's
+    setpointdelta. Returns None, after logging why, if the call can't be
+    applied to this unit.
+    """
+    info = client.info
+    mode = info.mode
+    if ATTR_HVAC_MODE in data:
+        mode = CLIENT_MODES[data[ATTR_HVAC_MODE]]
+    fan = None
+    if ATTR_FAN_MODE in data:
+        fan = Fan.ON if data[ATTR_FAN_MODE] == STATE_ON else Fan.AUTO
+
+    heattemp = data.get(ATTR_TARGET_TEMP_LOW, info.heattemp)
+    cooltemp = data.get(ATTR_TARGET_TEMP_HIGH, info.cooltemp)
+    if ATTR_TEMPERATURE in data:
+        if mode == Mode.HEAT:
+            heattemp = data[ATTR_TEMPERATURE]
+        elif mode == Mode.COOL:
+            cooltemp = data[ATTR_TEMPERATURE]
+        else:
+            _LOGGER.error(
+                "Bulk control: %s is not in heat or cool mode, so %s doesn't "
+                "say which setpoint to set; use %s or %s",
+                client.addr,
+                ATTR_TEMPERATURE,
+                ATTR_TARGET_TEMP_LOW,
+                ATTR_TARGET_TEMP_HIGH,
+            )
+            return None
+    delta = info.setpointdelta if mode == Mode.AUTO else None
+    if heattemp is None or cooltemp is None:
+        delta = None
+    setback = data.get(ATTR_SETBACK)
+    if setback and heattemp is not None and cooltemp is not None:
+        if delta is not None and cooltemp - heattemp + 2 * setback < delta:
+            _LOGGER.error(
+                "Bulk control: a setback of %s would bring %s's setpoints closer "
+                "than its setpointdelta of %s",
+                setback,
+                client.addr,
+                delta,
+            )
+            return None
+        heattemp -= setback
+        cooltemp += setback
+
+    if heattemp is not None and info.heattempmin is not None:
+        heattemp = min(max(heattemp, info.heattempmin), info.heattempmax)
+    if cooltemp is not None and info.cooltempmin is not None:
+        cooltemp = min(max(cooltemp, info.cooltempmin), info.cooltempmax)
+    if delta is not None and heattemp + delta > cooltemp:
+        cooltemp = heattemp + delta
+        if info.cooltempmax is not None and cooltemp > info.cooltempmax:
+            cooltemp = info.cooltempmax
+            heattemp = cooltemp - delta
+            if info.heattempmin is not None and heattemp < info.heattempmin:
+                _LOGGER.error(
+                    "Bulk control: %s's setpoint limits leave no room for its "
+                    "setpointdelta of %s",
+                    client.addr,
+                    delta,
+                )
+                return None
+
+    return Program(mode=mode, fan=fan, heattemp=heattemp, cooltemp=cooltemp)
 
 
 class VenstarThermostat(ClimateEntity):
     """Representation of a Venstar thermostat."""
 
-    def __init__(self, client, humidifier):
+    def __init__(self, device, humidifier):
         """Initialize the thermostat."""
-        self._client = client
+        self._device = device
+        self._client = device.client
         self._humidifier = humidifier
+        self._written_extras = None
+
+    async def async_added_to_hass(self):
+        """Subscribe to the coordinator's snapshots."""
+        self._device.entity_id = self.entity_id
+        self.async_on_remove(self._device.async_add_listener(self._async_handle_update))
+
+    @callback
+    def _async_handle_update(self):
+        """Write the state only when something this entity shows has changed."""
+        changed = self._client.changed
+        extras = (
+            self._client.available,
+            self._device.current_interval,
+            self._device.runtime_totals,
+        )
+        if (
+            changed is None
+            or not changed.isdisjoint(EXPOSED_FIELDS)
+            or extras != self._written_extras
+        ):
+            self._written_extras = extras
+            self.async_write_ha_state()
+
+    @property
+    def should_poll(self):
+        """Polling is done by the coordinator, not per entity."""
+        return False
+
+    @property
+    def available(self):
+        """Return False while the thermostat is unreachable.
+
+        Also until query/info first answers: a config entry's entity is added
+        from the cached identity alone, with no mode to report yet.
+        """
+        return self._client.available and self._client.info.mode is not None
 
-    def update(self):
+    @property
+    def unique_id(self):
+        """Return the config entry's id for the thermostat, if it has one."""
+        return self._device.unique_id
+
+    @property
+    def device_info(self):
+        """Return the device registry entry of the thermostat."""
+        return self._device.device_info
+
+    async def async_update(self):
         """Update the data from the thermostat."""
-        info_success = self._client.update_info()
-        sensor_success = self._client.update_sensors()
-        if not info_success or not sensor_success:
-            _LOGGER.error("Failed to update data")
+        await self._device.async_refresh()
+
+    @callback
+    def _async_command_done(self):
+        """Show the new state now; the device verifies it shortly after."""
+        self._device.async_command_sent()
 
     @property
     def supported_features(self):
         """Return the list of supported features."""
         features = SUPPORT_TARGET_TEMPERATURE | SUPPORT_FAN_MODE | SUPPORT_PRESET_MODE
 
-        if self._client.mode == self._client.MODE_AUTO:
+        if self._client.info.mode == self._client.MODE_AUTO:
             features |= SUPPORT_TARGET_TEMPERATURE_RANGE
 
         if self._humidifier and hasattr(self._client, "hum_active"):
@@ -116,7 +449,7 @@ class VenstarThermostat(ClimateEntity):
     @property
     def name(self):
         """Return the name of the thermostat."""
-        return self._client.name
+        return self._client.info.name
 
     @property
     def precision(self):
@@ -130,7 +463,7 @@ class VenstarThermostat(ClimateEntity):
     @property
     def temperature_unit(self):
         """Return the unit of measurement, as defined by the API."""
-        if self._client.tempunits == self._client.TEMPUNITS_F:
+        if self._client.info.tempunits == self._client.TEMPUNITS_F:
             return TEMP_FAHRENHEIT
         return TEMP_CELSIUS
 
@@ -147,66 +480,75 @@ class VenstarThermostat(ClimateEntity):
     @property
     def current_temperature(self):
         """Return the current temperature."""
-        return self._client.get_indoor_temp()
+        return self._client.sensors.thermostat.temp
 
     @property
     def current_humidity(self):
         """Return the current humidity."""
-        return self._client.get_indoor_humidity()
+        return self._client.sensors.thermostat.hum
 
     @property
     def hvac_mode(self):
         """Return current operation ie. heat, cool, idle."""
-        if self._client.mode == self._client.MODE_HEAT:
+        if self._client.info.mode == self._client.MODE_HEAT:
             return HVAC_MODE_HEAT
-        if self._client.mode == self._client.MODE_COOL:
+        if self._client.info.mode == self._client.MODE_COOL:
             return HVAC_MODE_COOL
-        if self._client.mode == self._client.MODE_AUTO:
+        if self._client.info.mode == self._client.MODE_AUTO:
             return HVAC_MODE_AUTO
         return HVAC_MODE_OFF
 
     @property
     def fan_mode(self):
         """Return the fan setting."""
-        if self._client.fan == self._client.FAN_AUTO:
+        if self._client.info.fan == self._client.FAN_AUTO:
             return HVAC_MODE_AUTO
         return STATE_ON
 
     @property
-    def device_state_attributes(self):
+    def extra_state_attributes(self):
         """Return the optional state attributes."""
-        return {
-            ATTR_FAN_STATE: self._client.fanstate,
-            ATTR_HVAC_STATE: self._client.state,
+        attributes = {
+            ATTR_FAN_STATE: self._client.info.fanstate,
+            ATTR_HVAC_STATE: self._client.info.state,
+            ATTR_POLL_INTERVAL: self._device.current_interval,
         }
+        schedulepart = self._client.info.schedulepart
+        if schedulepart in SCHEDULE_PARTS:
+            attributes[ATTR_SCHEDULE_PART] = SCHEDULE_PARTS[schedulepart]
+        totals = self._device.runtime_totals
+        if totals is not None:
+            attributes[ATTR_HEAT_RUNTIME] = totals["heat"]
+            attributes[ATTR_COOL_RUNTIME] = totals["cool"]
+        return attributes
 
     @property
     def target_temperature(self):
         """Return the target temperature we try to reach."""
-        if self._client.mode == self._client.MODE_HEAT:
-            return self._client.heattemp
-        if self._client.mode == self._client.MODE_COOL:
-            return self._client.cooltemp
+        if self._client.info.mode == self._client.MODE_HEAT:
+            return self._client.info.heattemp
+        if self._client.info.mode == self._client.MODE_COOL:
+            return self._client.info.cooltemp
         return None
 
     @property
     def target_temperature_low(self):
         """Return the lower bound temp if auto mode is on."""
-        if self._client.mode == self._client.MODE_AUTO:
-            return self._client.heattemp
+        if self._client.info.mode == self._client.MODE_AUTO:
+            return self._client.info.heattemp
         return None
 
     @property
     def target_temperature_high(self):
         """Return the upper bound temp if auto mode is on."""
-        if self._client.mode == self._client.MODE_AUTO:
-            return self._client.cooltemp
+        if self._client.info.mode == self._client.MODE_AUTO:
+            return self._client.info.cooltemp
         return None
 
     @property
     def target_humidity(self):
         """Return the humidity we try to reach."""
-        return self._client.hum_setpoint
+        return self._client.info.hum_setpoint
 
     @property
     def min_humidity(self):
@@ -223,7 +565,7 @@ class VenstarThermostat(ClimateEntity):
         """Return current preset."""
         #if self._client.away:
         #    return PRESET_AWAY
-        if self._client.schedule == 0:
+        if self._client.info.schedule == 0:
             return HOLD_MODE_TEMPERATURE
 
     @property
@@ -231,395 +573,122 @@ class VenstarThermostat(ClimateEntity):
         """Return valid preset modes."""
         return [PRESET_NONE, HOLD_MODE_TEMPERATURE]
 
-    def _set_operation_mode(self, operation_mode):
+    def _client_mode(self, operation_mode):
+        """Return the API mode for a Home Assistant HVAC mode."""
+        return CLIENT_MODES.get(operation_mode, Mode.OFF)
+
+    def _client_fan(self, fan_mode):
+        if fan_mode == STATE_ON:
+            return self._client.FAN_ON
+        return self._client.FAN_AUTO
+
+    async def _async_set_operation_mode(self, operation_mode):
         """Change the operation mode (internal)."""
-        if operation_mode == HVAC_MODE_HEAT:
-            success = self._client.set_mode(self._client.MODE_HEAT)
-        elif operation_mode == HVAC_MODE_COOL:
-            success = self._client.set_mode(self._client.MODE_COOL)
-        elif operation_mode == HVAC_MODE_AUTO:
-            success = self._client.set_mode(self._client.MODE_AUTO)
-        else:
-            success = self._client.set_mode(self._client.MODE_OFF)
+        success = await self._client.set_mode(self._client_mode(operation_mode))
 
         if not success:
             _LOGGER.error("Failed to change the operation mode")
         return success
 
-    def set_temperature(self, **kwargs):
-        """Set a new target temperature."""
-        set_temp = True
-        operation_mode = kwargs.get(ATTR_HVAC_MODE, self._client.mode)
+    async def async_set_temperature(self, **kwargs):
+        """Set a new target temperature.
+
+        A mode change and the new setpoints are queued together, so they reach
+        the thermostat as a single /control write.
+        """
+        changes = {}
+        operation_mode = self._client.info.mode
+        if ATTR_HVAC_MODE in kwargs:
+            operation_mode = self._client_mode(kwargs[ATTR_HVAC_MODE])
+            if operation_mode != self._client.info.mode:
+                changes["mode"] = operation_mode
         temp_low = kwargs.get(ATTR_TARGET_TEMP_LOW)
         temp_high = kwargs.get(ATTR_TARGET_TEMP_HIGH)
         temperature = kwargs.get(ATTR_TEMPERATURE)
 
-        if operation_mode != self._client.mode:
-            set_temp = self._set_operation_mode(operation_mode)
-
-        if set_temp:
-            if operation_mode == self._client.MODE_HEAT:
-                success = self._client.set_setpoints(temperature, self._client.cooltemp)
-            elif operation_mode == self._client.MODE_COOL:
-                success = self._client.set_setpoints(self._client.heattemp, temperature)
-            elif operation_mode == self._client.MODE_AUTO:
-                success = self._client.set_setpoints(temp_low, temp_high)
-            else:
-                success = False
-                _LOGGER.error(
-                    "The thermostat is currently not in a mode "
-                    "that supports target temperature: %s",
-                    operation_mode,
-                )
-
+        if operation_mode == self._client.MODE_HEAT:
+            changes["heattemp"] = temperature
+        elif operation_mode == self._client.MODE_COOL:
+            changes["cooltemp"] = temperature
+        elif operation_mode == self._client.MODE_AUTO:
+            changes["heattemp"] = temp_low
+            changes["cooltemp"] = temp_high
+        else:
+            _LOGGER.error(
+                "The thermostat is currently not in a mode "
+                "that supports target temperature: %s",
+                operation_mode,
+            )
+        changes = {key: value for key, value in changes.items() if value is not None}
+
+        if changes:
+            success = await self._client.queue_control(**changes)
             if not success:
                 _LOGGER.error("Failed to change the temperature")
 
-    def set_fan_mode(self, fan_mode):
+        self._async_command_done()
+
+    async def async_set_fan_mode(self, fan_mode):
         """Set new target fan mode."""
-        if fan_mode == STATE_ON:
-            success = self._client.set_fan(self._client.FAN_ON)
-        else:
-            success = self._client.set_fan(self._client.FAN_AUTO)
+        success = await self._client.set_fan(self._client_fan(fan_mode))
 
         if not success:
             _LOGGER.error("Failed to change the fan mode")
+        self._async_command_done()
 
-    def set_hvac_mode(self, hvac_mode):
+    async def async_set_hvac_mode(self, hvac_mode):
         """Set new target operation mode."""
-        self._set_operation_mode(hvac_mode)
+        await self._async_set_operation_mode(hvac_mode)
+        self._async_command_done()
 
-    def set_humidity(self, humidity):
+    async def async_set_humidity(self, humidity):
         """Set new target humidity."""
-        success = self._client.set_hum_setpoint(humidity)
+        success = await self._client.set_hum_setpoint(humidity)
 
         if not success:
             _LOGGER.error("Failed to change the target humidity level")
+        self._async_command_done()
 
-    def set_preset_mode(self, preset_mode):
+    async def async_set_preset_mode(self, preset_mode):
         """Set the hold mode."""
         if preset_mode == HOLD_MODE_TEMPERATURE:
-            success = self._client.set_schedule(0)
+            success = await self._client.set_schedule(0)
         elif preset_mode == PRESET_NONE:
             success = False
-            if self._client.schedule == 0:
-                success = success and self._client.set_schedule(1)
+            if self._client.info.schedule == 0:
+                success = success and await self._client.set_schedule(1)
         else:
             _LOGGER.error("Unknown hold mode: %s", preset_mode)
             success = False
 
         if not success:
             _LOGGER.error("Failed to change the schedule/hold state")
-			
-import json
-import requests
-import urllib3
-import urllib
-import logging
-from requests.auth import HTTPDigestAuth
-
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-MIN_API_VER=3
-
-class VenstarColorTouch:
-    def __init__(self, addr, timeout, user=None, password=None, proto='http', SSLCert=False):
-        #API Constants
-        self.MODE_OFF = 0
-        self.MODE_HEAT = 1
-        self.MODE_COOL = 2
-        self.MODE_AUTO = 3
-        self.STATE_IDLE = 0
-        self.STATE_HEATING = 1
-        self.STATE_COOLING = 2
-        self.STATE_LOCKOUT = 3
-        self.STATE_ERROR = 4
-        self.FAN_AUTO = 0
-        self.FAN_ON = 1
-        self.FANSTATE_OFF = 0
-        self.FANSTATE_ON = 1
-        self.TEMPUNITS_F = 0
-        self.TEMPUNITS_C = 1
-        self.SCHED_F = 0
-        self.SCHED_C = 1
-        self.SCHEDPART_MORNING = 0
-        self.SCHEDPART_DAY = 1
-        self.SCHEDPART_EVENING = 2
-        self.SCHEDPART_NIGHT = 3
-        self.SCHEDPART_INACTIVE = 255
-        #self.AWAY_HOME = 0
-        #self.AWAY_AWAY = 1
-
-        #Input parameters
-        self.addr = addr
-        self.timeout = timeout
-
-        if user != None and password != None:
-            self.auth = HTTPDigestAuth(user, password)
-        else:
-            self.auth = None
-
-        self.proto = proto 
-        self.SSLCert = SSLCert
-
-        #Initialize State
-        self.status = {}
-        self._api_ver = None
-        self._type = None
-        self._info = None
-        self._sensors = None
-        #
-        # /control
-        #
-        self.setpointdelta = None
-        self.heattemp = None
-        self.cooltemp = None
-        self.fan = None
-        self.mode = None
-        self.fanstate = None
-        self.state = None
-        #
-        # /settings
-        #
-        self.name = None
-        self.tempunits = None
-        #self.away = None
-        self.schedule = None
-        self.hum_setpoint = None
-        self.dehum_setpoint = None
-        self.hum_active = None
-
-    def login(self):
-        r = self._request("/")
-        if r is False:
-            return r
-        j = r.json()
-        if j["api_ver"] >= MIN_API_VER:
-            self._api_ver = j["api_ver"]
-            self._type = j["type"]
-            return True
-        else:
-            return False
-
-    def _request(self, path, data=None):
-        uri = "{proto}://{addr}/{path}".format(proto=self.proto, addr=self.addr, path=path)
-        try:
-            if data is not None:
-                req = requests.post(uri, 
-                                    verify=self.SSLCert,
-                                    timeout=self.timeout,
-                                    data=data,
-                                    auth=self.auth)
-            else:
-                req = requests.get(uri,
-                                   verify=self.SSLCert,
-                                   timeout=self.timeout,
-                                   auth=self.auth)
-        except Exception as ex:
-            print("Error requesting {uri} from Venstar ColorTouch.".format(uri=uri))
-            print(ex)
-            return False
-
-        if not req.ok:
-            print("Connection error logging into Venstar ColorTouch. Status Code: {status}".format(status=req.status_code))
-            return False
-       
-        return req
-
-    def update_info(self):
-        r = self._request("query/info")
-
-        if r is False:
-            return r
-
-        self._info=r.json()
-
-        #
-        # Populate /control stuff
-        #
-        self.setpointdelta=self.get_info("setpointdelta")
-        self.heattemp=self.get_info("heattemp")
-        self.cooltemp=self.get_info("cooltemp")
-        self.fan=self.get_info("fan")
-        self.fanstate=self.get_info("fanstate")
-        self.mode=self.get_info("mode")
-        self.state=self.get_info("state")
-
-        #
-        # Populate /settings stuff
-        #
-        self.name = self.get_info("name")
-        self.tempunits = self.get_info("tempunits")
-        #self.away = None #self.get_info("away")
-        self.schedule = self.get_info("schedule")
-        # T5800 thermostat will not have hum_setpoint/dehum_setpoint in the JSON, so make
-        # it optional
-        if 'hum_setpoint' in self._info:
-          self.hum_setpoint = self.get_info("hum_setpoint")
-        else:
-          self.hum_setpoint = None
-        if 'dehum_setpoint' in self._info:
-          self.dehum_setpoint = self.get_info("dehum_setpoint")
-        else:
-          self.dehum_setpoint = None
-        #
-        if 'hum_active' in self._info:
-            self.hum_active = self.get_info("hum_active")
-        else:
-            self.hum_active = 0
-
-        return True
+        self._async_command_done()
 
-    def update_sensors(self):
-        r = self._request("query/sensors")
-
-        if r is False:
-            return r
-        self._sensors = r.json()
-        return True
-
-    # returns a list of all runtime records. get_runtimes()[-1] should be the last one.
-    # runtimes are updated every day (86400 seconds).
-    def get_runtimes(self):
-        r = self._request("query/runtimes")
-        if r is False:
-            return r
-        else:
-            runtimes=r.json()
-            return runtimes["runtimes"]
-
-    def get_info(self, attr):
-        return self._info[attr]
-
-    def get_thermostat_sensor(self, attr):
-        if self._sensors != None and self._sensors["sensors"] != None and len(self._sensors["sensors"]) > 0:
-            # 'hum' (humidity) sensor is not present on T5800 series
-            if attr in self._sensors["sensors"][0]:
-              return self._sensors["sensors"][0][attr]
-            else:
-              return None
-        else:
-            return None
+    async def async_set_program(self, **kwargs):
+        """Bring the thermostat to a program, writing only what differs.
 
-    def get_outdoor_sensor(self, attr):
-        if self._sensors != None and self._sensors["sensors"] != None and len(self._sensors["sensors"]) > 0:
-            return self._sensors["sensors"][1][attr]
-        else:
-            return None
-
-    def get_indoor_temp(self):
-        return self.get_thermostat_sensor('temp')
+        Fields left out of the service call are left as they are.
+        """
+        hvac_mode = kwargs.get(ATTR_HVAC_MODE)
+        fan_mode = kwargs.get(ATTR_FAN_MODE)
+        program = Program(
+            schedule=_flag(kwargs.get(ATTR_SCHEDULE)),
+            away=_flag(kwargs.get(ATTR_AWAY)),
+            mode=None if hvac_mode is None else self._client_mode(hvac_mode),
+            fan=None if fan_mode is None else self._client_fan(fan_mode),
+            heattemp=kwargs.get(ATTR_TARGET_TEMP_LOW),
+            cooltemp=kwargs.get(ATTR_TARGET_TEMP_HIGH),
+            hum_setpoint=kwargs.get(ATTR_HUMIDITY),
+            dehum_setpoint=kwargs.get(ATTR_DEHUMIDITY),
+        )
+        success = await self._client.apply_program(program)
 
-    def get_outdoor_temp(self):
-        return self.get_outdoor_sensor('temp')
+        if not success:
+            _LOGGER.error("Failed to apply the program to %s", self.name)
+        self._async_command_done()
 
-    def get_indoor_humidity(self):
-        return self.get_thermostat_sensor('hum')
 
-    def get_alerts(self):
-        r = self._request("query/alerts")
-        if r is False:
-            return r
-        else:
-            alerts=r.json()
-            return alerts["alerts"][0]
-
-    # The /control endpoint requires heattemp/cooltemp in each message, even if you're just turning
-    # the fan on/off or setting the mode. So we retrieve everything from self and use accessors
-    # to set them.
-    def set_control(self):
-        if self.mode is None:
-            return False
-        path="/control"
-        data = urllib.parse.urlencode({'mode':self.mode, 'fan':self.fan, 'heattemp':self.heattemp, 'cooltemp':self.cooltemp})
-        print("Path is: {0}".format(path))
-        r = self._request(path, data)
-        if r is False:
-            return r
-        else:
-            if r is not None:
-                if "success" in r.json():
-                    print("set_control Success!")
-                    return True
-                else:
-                    print("set_control Fail {0}.".format(r.json()))
-                    return False
-
-    def set_setpoints(self, heattemp, cooltemp):
-        # Must not violate setpointdelta if we're in auto mode.
-        if self.mode == self.MODE_AUTO and heattemp + self.setpointdelta > cooltemp:
-            print("In auto mode, the cool temp must be {0} " 
-                  "degrees warmer than the heat temp.".format(self.setpointdelta))
-            return False
-        self.heattemp = heattemp
-        self.cooltemp = cooltemp
-        return self.set_control()
-
-    def set_mode(self, mode):
-        self.mode = mode
-        return self.set_control()
-
-    def set_fan(self, fan):
-        self.fan = fan
-        return self.set_control()
-
-    #
-    # set_settings can't change the schedule or away while schedule is on, so no point in trying.
-    #
-    def set_settings(self):
-        if self.tempunits is None:
-            return False
-        path="/settings"
-        data = urllib.parse.urlencode({'tempunits':self.tempunits, 'hum_setpoint':self.hum_setpoint, 'dehum_setpoint':self.dehum_setpoint})
-        r = self._request(path, data)
-        print("url is: {0} json is: {1}".format(data, r.text))
-        if r is False:
-            return r
-        else:
-            if r is not None:
-                if "success" in r.json():
-                    print("set_settings Success!")
-                    return True
-                else:
-                    print("set_settings Fail {0}.".format(r.text))
-                    return False
-
-    def set_tempunits(self, tempunits):
-        self.tempunits = tempunits
-        return self.set_settings()
-
-    #
-    # We can't change any settings while the schedule is active so we can't use set_settings()
-    #
-    def set_schedule(self, schedule):
-        if (self.schedule == schedule):
-            return True
-        #
-        # If thermostat is in away mode, then can't enable schedule.
-        #
-        #if (self.away == 1):
-        #    return False
-        self.schedule = schedule
-        path="/settings"
-        data = urllib.parse.urlencode({'schedule':self.schedule})
-        r = self._request(path, data)
-        if r is False:
-            ret = False
-        else:
-            if r is not None:
-                if "success" in r.json():
-                    print("set_schedule Success!")
-                    self.update_info()
-                    ret = True
-                else:
-                    print("set_schedule Fail {0}.".format(r.json()))
-                    ret = False
-        return ret
-
-    def set_hum_setpoint(self, hum_setpoint):
-        self.hum_setpoint = hum_setpoint
-        return self.set_settings()
-
-    def set_dehum_setpoint(self, dehum_setpoint):
-        self.dehum_setpoint = dehum_setpoint
-        return self.set_settings()
+def _flag(value):
+    """Map an optional boolean to the API's 0/1."""
+    return None if value is None else int(value)
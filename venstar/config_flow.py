@@ -0,0 +1,65 @@
+"""Config flow for Venstar WiFi Thermostats."""
+import logging
+
+import voluptuous as vol
+
+from homeassistant import config_entries
+from homeassistant.const import CONF_HOST, CONF_PASSWORD, CONF_SSL, CONF_USERNAME
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .const import CONF_HUMIDIFIER, CONF_IDENTITY, DEFAULT_TIMEOUT, DOMAIN
+from .venstarcolortouch import AsyncVenstarColorTouch
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_HOST): str,
+        vol.Optional(CONF_USERNAME): str,
+        vol.Optional(CONF_PASSWORD): str,
+        vol.Optional(CONF_SSL, default=False): bool,
+        vol.Optional(CONF_HUMIDIFIER, default=True): bool,
+    }
+)
+
+
+async def async_read_identity(hass, data):
+    """Log in to the thermostat and return its identity, or None if that fails.
+
+    Checks the API version (login() refuses anything older than the client
+    supports) and reads the name and units from query/info.
+    """
+    client = AsyncVenstarColorTouch(
+        addr=data[CONF_HOST],
+        timeout=DEFAULT_TIMEOUT,
+        user=data.get(CONF_USERNAME),
+        password=data.get(CONF_PASSWORD),
+        proto="https" if data.get(CONF_SSL) else "http",
+        session=async_get_clientsession(hass),
+    )
+    if not await client.login() or not await client.update_info():
+        return None
+    return client.identity
+
+
+class VenstarConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
+    """Add a thermostat after checking that it answers."""
+
+    VERSION = 1
+    CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_POLL
+
+    async def async_step_user(self, user_input=None):
+        """Handle a thermostat entered by the user."""
+        errors = {}
+        if user_input is not None:
+            await self.async_set_unique_id(user_input[CONF_HOST].lower())
+            self._abort_if_unique_id_configured()
+            identity = await async_read_identity(self.hass, user_input)
+            if identity is None:
+                errors["base"] = "cannot_connect"
+            else:
+                return self.async_create_entry(
+                    title=identity["name"] or user_input[CONF_HOST],
+                    data={**user_input, CONF_IDENTITY: identity},
+                )
+        return self.async_show_form(step_id="user", data_schema=DATA_SCHEMA, errors=errors)
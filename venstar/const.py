@@ -0,0 +1,91 @@
+"""Constants for the Venstar component."""
+DOMAIN = "venstar"
+
+DEFAULT_SCAN_INTERVAL = 60
+DEFAULT_TIMEOUT = 5
+CONF_HUMIDIFIER = "humidifier"
+# Config entry key of the cached device identity (api_ver, type, model,
+# firmware, name, tempunits), restored at startup before the first refresh.
+CONF_IDENTITY = "identity"
+# Upper bound on thermostats being polled at the same moment across the whole
+# integration, however many are configured.
+DEFAULT_MAX_CONCURRENT_POLLS = 4
+# Each poll lands within +/- this fraction of the interval, so devices that
+# start together drift apart instead of firing in lockstep.
+POLL_JITTER = 0.1
+
+# Adaptive polling: poll at FAST_POLL_INTERVAL while the unit is heating or
+# cooling and for FAST_POLL_WINDOW seconds after a command. Once nothing has
+# changed for BACKOFF_AFTER_POLLS polls in a row, the interval doubles each
+# poll, up to MAX_BACKOFF_FACTOR times the configured scan interval.
+FAST_POLL_INTERVAL = 15
+FAST_POLL_WINDOW = 120
+BACKOFF_AFTER_POLLS = 3
+MAX_BACKOFF_FACTOR = 4
+
+# After a command the new state is shown optimistically right away; a single
+# verification refresh follows this many seconds after the last command.
+VERIFY_DELAY = 3
+
+SERVICE_SET_PROGRAM = "set_program"
+SERVICE_BULK_CONTROL = "bulk_control"
+# Thermostats written to at once by venstar.bulk_control.
+DEFAULT_BULK_CONCURRENCY = 16
+# Fired when a bulk_control call finishes, with per-thermostat results.
+EVENT_BULK_CONTROL_RESULT = "venstar_bulk_control_result"
+
+CONF_RUNTIMES_MAX_AGE = "runtimes_max_age"
+# Days of daily runtime records kept in each thermostat's runtimes cache.
+DEFAULT_RUNTIMES_MAX_AGE = 60
+# Window, in days, of the heat/cool runtime totals shown on the entity.
+RUNTIMES_SUMMARY_DAYS = 7
+# Fleet runtime analytics (duty cycle, runtime per degree-day, outliers, weekly
+# trend; needs numpy) are recomputed this many seconds after any unit's
+# runtimes change, so units fetching at about the same time share one pass.
+ANALYTICS_DELAY = 30
+SERVICE_RUNTIME_REPORT = "runtime_report"
+# Fired by venstar.runtime_report with every selected unit's analytics.
+EVENT_RUNTIME_REPORT = "venstar_runtime_report"
+
+# Local state history: one compact sample per refresh that changed anything,
+# and at least every HISTORY_HEARTBEAT seconds, kept in a ring of HISTORY_RECORDS
+# (two weeks at one a minute).
+HISTORY_RECORDS = 20160
+HISTORY_HEARTBEAT = 300
+SERVICE_CYCLE_REPORT = "cycle_report"
+# Fired by venstar.cycle_report with every selected unit's cycle summary.
+EVENT_CYCLE_REPORT = "venstar_cycle_report"
+# Heating or cooling cycles shorter than this many seconds count as short cycles.
+DEFAULT_SHORT_CYCLE = 300
+DEFAULT_CYCLE_REPORT_HOURS = 24
+
+# Opt-in trace of client calls and entity properties, for finding what an
+# update cycle spends its time on. venstar.trace_stop writes the timings to
+# TRACE_FILE (and a cProfile dump to TRACE_PROFILE_FILE if asked for) in the
+# config directory; the diagnostics dump includes them too.
+SERVICE_TRACE_START = "trace_start"
+SERVICE_TRACE_STOP = "trace_stop"
+# Fired by venstar.trace_stop with the trace summary.
+EVENT_TRACE = "venstar_trace"
+TRACE_FILE = "venstar_trace.json"
+TRACE_PROFILE_FILE = "venstar_trace.prof"
+
+# query/alerts (filter change, UV lamp, service due) changes rarely; it is
+# polled on its own, much slower schedule.
+ALERTS_INTERVAL = 900
+# Fired when an alert turns on or clears.
+EVENT_ALERT = "venstar_alert"
+
+# SSDP discovery: units announce themselves and answer searches. Announcements
+# find new units, follow units to new addresses and act as change hints that
+# trigger an immediate refresh. CONF_DISCOVERY_ADDRESS replaces the SSDP
+# multicast group with a local UDP address, for testing.
+CONF_DISCOVERY = "discovery"
+CONF_DISCOVERY_ADDRESS = "discovery_address"
+DISCOVERY_SEARCH_INTERVAL = 600
+# Hints closer together than this share one refresh.
+HINT_MIN_INTERVAL = 5
+# While a unit has sent a hint within HINT_TRUST_WINDOW seconds, its steady-state
+# polling may back off to HINTED_MAX_BACKOFF_FACTOR times the scan interval.
+HINT_TRUST_WINDOW = 1800
+HINTED_MAX_BACKOFF_FACTOR = 10
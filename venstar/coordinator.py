@@ -0,0 +1,667 @@
+"""Shared poll scheduler for all configured Venstar thermostats."""
+import asyncio
+from datetime import timedelta
+import json
+import logging
+import random
+import time
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from . import analytics
+from .const import (
+    ALERTS_INTERVAL,
+    ANALYTICS_DELAY,
+    BACKOFF_AFTER_POLLS,
+    DEFAULT_BULK_CONCURRENCY,
+    DEFAULT_MAX_CONCURRENT_POLLS,
+    DISCOVERY_SEARCH_INTERVAL,
+    DOMAIN,
+    EVENT_ALERT,
+    EVENT_BULK_CONTROL_RESULT,
+    EVENT_CYCLE_REPORT,
+    EVENT_RUNTIME_REPORT,
+    EVENT_TRACE,
+    FAST_POLL_INTERVAL,
+    FAST_POLL_WINDOW,
+    HINT_MIN_INTERVAL,
+    HINT_TRUST_WINDOW,
+    HINTED_MAX_BACKOFF_FACTOR,
+    HISTORY_HEARTBEAT,
+    MAX_BACKOFF_FACTOR,
+    POLL_JITTER,
+    RUNTIMES_SUMMARY_DAYS,
+    TRACE_FILE,
+    TRACE_PROFILE_FILE,
+    VERIFY_DELAY,
+)
+from .discovery import SsdpListener
+from .runtimes import RUNTIME_PERIOD
+from .trace import Tracer
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@callback
+def async_get_coordinator(hass):
+    """Return the integration-wide coordinator, creating it on first use."""
+    coordinator = hass.data.get(DOMAIN)
+    if coordinator is None:
+        coordinator = hass.data[DOMAIN] = VenstarCoordinator(hass)
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, coordinator.async_stop)
+    return coordinator
+
+
+class VenstarCoordinator:
+    """Own every configured client and poll them through a bounded worker set."""
+
+    def __init__(self, hass, max_concurrent=DEFAULT_MAX_CONCURRENT_POLLS):
+        """Initialize the coordinator."""
+        self.hass = hass
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.devices = []
+        # Devices set up from config entries, by entry id.
+        self.entries = {}
+        # Units heard over SSDP that aren't configured, by MAC.
+        self.discovered = {}
+        self._listener = None
+        self._unsub_search = None
+        self._analytics_handle = None
+        self.tracer = Tracer()
+
+    @callback
+    def async_add_client(self, client, interval, runtimes=None, history=None):
+        """Start polling a client around every ``interval`` seconds and return its device.
+
+        ``runtimes`` is an optional RuntimesStore and ``history`` an optional
+        ThermostatHistory the device keeps up to date.
+        """
+        device = VenstarDevice(self, client, interval, runtimes, history)
+        self.devices.append(device)
+        device.async_start()
+        return device
+
+    async def async_remove_device(self, device):
+        """Stop polling a device, save what it has gathered and forget it."""
+        device.async_stop()
+        self.devices.remove(device)
+        await self._async_close_devices([device])
+
+    async def _async_close_devices(self, devices):
+        """Close the devices' clients and histories and save their runtimes.
+
+        Closing a client fails its queued writes. Saving keeps the outdoor hours
+        gathered since the last daily save.
+        """
+        for device in devices:
+            if device.history is not None:
+                device.history.close()
+        stores = [
+            device.runtimes
+            for device in devices
+            if device.runtimes is not None and device.runtimes.outdoor_ts
+        ]
+        await asyncio.gather(
+            *(device.client.close() for device in devices),
+            *(self.hass.async_add_executor_job(store.save) for store in stores),
+        )
+
+    @callback
+    def async_get_device(self, host):
+        """Return the device polling ``host``, if any."""
+        for device in self.devices:
+            if device.client.addr == host:
+                return device
+        return None
+
+    async def async_bulk_apply(self, devices, make_program, concurrency=DEFAULT_BULK_CONCURRENCY):
+        """Apply a Program to many devices in parallel and report how each went.
+
+        ``make_program(client)`` builds each device's Program from its current
+        state, or None to skip the device, which is then reported as failed.
+        At most ``concurrency`` devices are written to at once; these writes
+        don't wait for the poll semaphore. Returns, and fires as an event, a
+        result per device with its success and time taken.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def apply(device):
+            client = device.client
+            async with semaphore:
+                start = time.monotonic()
+                try:
+                    program = make_program(client)
+                    success = program is not None and await client.apply_program(program)
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception("Bulk control of %s failed", client.addr)
+                    success = False
+                elapsed = time.monotonic() - start
+            device.async_command_sent()
+            return {
+                "entity_id": device.entity_id,
+                "host": client.addr,
+                "success": bool(success),
+                "elapsed": round(elapsed, 3),
+            }
+
+        start = time.monotonic()
+        results = await asyncio.gather(*(apply(device) for device in devices))
+        elapsed = round(time.monotonic() - start, 3)
+        succeeded = sum(result["success"] for result in results)
+        _LOGGER.info(
+            "Bulk control: %d of %d thermostats updated in %.2f s",
+            succeeded,
+            len(results),
+            elapsed,
+        )
+        self.hass.bus.async_fire(
+            EVENT_BULK_CONTROL_RESULT, {"results": results, "elapsed": elapsed}
+        )
+        return results
+
+    @callback
+    def async_schedule_analytics(self):
+        """Recompute the runtime analytics soon, if numpy is available."""
+        if not analytics.AVAILABLE or self._analytics_handle is not None:
+            return
+        self._analytics_handle = self.hass.loop.call_later(
+            ANALYTICS_DELAY,
+            lambda: self.hass.async_create_task(self.async_update_analytics()),
+        )
+
+    async def async_update_analytics(self):
+        """Recompute the runtime analytics of every device keeping runtimes.
+
+        The arrays are copied on the event loop and analyzed in the executor.
+        Each device's ``analytics`` is updated and its listeners called.
+        Returns the RuntimeAnalytics per device.
+        """
+        if self._analytics_handle is not None:
+            self._analytics_handle.cancel()
+            self._analytics_handle = None
+        now = time.time()
+        since = now - (analytics.ANALYTICS_DAYS + 1) * RUNTIME_PERIOD
+        windows = {
+            device: device.runtimes.window(since)
+            for device in self.devices
+            if device.runtimes is not None
+        }
+        results = await self.hass.async_add_executor_job(analytics.analyze, windows, now)
+        for device, result in results.items():
+            device.analytics = result
+            device.async_update_listeners()
+        return results
+
+    async def async_runtime_report(self, devices):
+        """Recompute the analytics and fire them as an event for ``devices``."""
+        results = await self.async_update_analytics()
+        units = {
+            device.entity_id or device.client.addr: results[device].as_dict()
+            for device in devices
+            if device in results
+        }
+        outliers = [key for key, result in units.items() if result["outlier"]]
+        if outliers:
+            _LOGGER.info("Runtime outliers: %s", ", ".join(outliers))
+        self.hass.bus.async_fire(
+            EVENT_RUNTIME_REPORT, {"units": units, "outliers": outliers}
+        )
+        return units
+
+    async def async_cycle_report(self, devices, hours, min_run):
+        """Summarize the last ``hours`` of cycles of ``devices`` and fire it as an event.
+
+        Each history is copied on the event loop and decoded in the executor.
+        """
+        since = time.time() - hours * 3600
+        snapshots = {
+            device.entity_id or device.client.addr: device.history.snapshot()
+            for device in devices
+            if device.history is not None
+        }
+
+        def summarize():
+            return {
+                key: history.cycle_summary(since, min_run)
+                for key, history in snapshots.items()
+            }
+
+        units = await self.hass.async_add_executor_job(summarize)
+        self.hass.bus.async_fire(EVENT_CYCLE_REPORT, {"units": units, "hours": hours})
+        return units
+
+    async def async_stop_trace(self):
+        """Stop the trace, save its results and fire its summary as an event.
+
+        The summary goes to TRACE_FILE in the config directory and the profile,
+        if the trace ran one, to TRACE_PROFILE_FILE for pstats or snakeviz.
+        """
+        if self.tracer.running:
+            self.tracer.stop()
+        summary = self.tracer.summary()
+        profiler = self.tracer.profiler
+        path = self.hass.config.path(TRACE_FILE)
+        profile_path = self.hass.config.path(TRACE_PROFILE_FILE) if profiler else None
+
+        def save():
+            with open(path, "w") as fp:
+                json.dump(summary, fp, indent=2)
+            if profiler is not None:
+                profiler.dump_stats(profile_path)
+
+        await self.hass.async_add_executor_job(save)
+        _LOGGER.info("Venstar trace saved to %s", path)
+        self.hass.bus.async_fire(
+            EVENT_TRACE, {**summary, "file": path, "profile_file": profile_path}
+        )
+        return summary
+
+    async def async_start_discovery(self, address):
+        """Listen for SSDP announcements on ``address`` and search periodically.
+
+        Only the first call does anything; all thermostats share one listener.
+        """
+        if self._listener is not None:
+            return
+        self._listener = SsdpListener(self._async_announced, address)
+        if not await self._listener.async_start(self.hass.loop):
+            return
+        self._listener.search()
+        self._unsub_search = async_track_time_interval(
+            self.hass,
+            lambda now: self._listener.search(),
+            timedelta(seconds=DISCOVERY_SEARCH_INTERVAL),
+        )
+
+    @callback
+    def _async_announced(self, announcement):
+        """Match an announcement to its device: follow moves, pass on the hint."""
+        device = self._device_for(announcement)
+        if device is None:
+            if announcement.mac not in self.discovered:
+                _LOGGER.info(
+                    "Found unconfigured Venstar thermostat %s at %s",
+                    announcement.name,
+                    announcement.host,
+                )
+            self.discovered[announcement.mac] = announcement
+            return
+        device.mac = announcement.mac
+        if device.client.addr != announcement.host:
+            device.client.move(announcement.host)
+        if announcement.alive:
+            device.async_hint()
+
+    def _device_for(self, announcement):
+        for device in self.devices:
+            if device.mac == announcement.mac:
+                return device
+        for device in self.devices:
+            # A unit with another MAC on record has handed this address on.
+            if device.client.addr == announcement.host and device.mac in (None, announcement.mac):
+                return device
+        # A configured unit we haven't matched yet, announcing from a new
+        # address. Names aren't unique, so only a unit that can't be reached
+        # where it was is followed, and only if no other configured unit
+        # shares the name.
+        named = [
+            device for device in self.devices if device.client.info.name == announcement.name
+        ]
+        if len(named) == 1:
+            device = named[0]
+            if device.mac is None and not device.client.available:
+                return device
+        return None
+
+    async def async_stop(self, event=None):
+        """Stop all poll loops and the discovery listener."""
+        if self._unsub_search is not None:
+            self._unsub_search()
+            self._unsub_search = None
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if self._analytics_handle is not None:
+            self._analytics_handle.cancel()
+            self._analytics_handle = None
+        for device in self.devices:
+            device.async_stop()
+        await self._async_close_devices(self.devices)
+        if self.tracer.running:
+            self.tracer.stop()
+        self.devices = []
+        self.entries = {}
+
+
+class VenstarDevice:
+    """One thermostat's poll loop and the entities listening to its snapshot."""
+
+    def __init__(self, coordinator, client, interval, runtimes=None, history=None):
+        """Initialize the device."""
+        self.coordinator = coordinator
+        self.client = client
+        self.runtimes = runtimes
+        self.history = history
+        # The values last written to the history, to skip unchanged samples.
+        self._history_key = None
+        # Entity id of the thermostat's climate entity, once it has been added.
+        self.entity_id = None
+        # Stable id for entity unique ids and the device registry; only devices
+        # set up from a config entry have one.
+        self.unique_id = None
+        # MAC address, once the unit has been heard over SSDP.
+        self.mac = None
+        self._last_hint = None
+        self._last_refresh = None
+        self._hint_handle = None
+        self.runtime_totals = None
+        # This unit's RuntimeAnalytics from the last fleet-wide pass.
+        self.analytics = None
+        self._runtimes_task = None
+        self._alerts_task = None
+        self._next_alerts = 0
+        self._alerts_polled = False
+        self.interval = interval
+        self.current_interval = interval
+        self.last_results = None
+        self._listeners = []
+        self._task = None
+        self._refresh_task = None
+        self._reschedule = asyncio.Event()
+        self._last_command = None
+        self._unchanged_polls = 0
+        self._verify_handle = None
+
+    @property
+    def device_info(self):
+        """Return the device registry entry, for devices with a unique id."""
+        if self.unique_id is None:
+            return None
+        return {
+            "identifiers": {(DOMAIN, self.unique_id)},
+            "name": self.client.info.name,
+            "manufacturer": "Venstar",
+            "model": self.client.model,
+            "sw_version": self.client.firmware,
+        }
+
+    @callback
+    def async_add_listener(self, update_callback):
+        """Call ``update_callback`` after every refresh; return a remover."""
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove_listener():
+            self._listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def async_start(self):
+        """Start the poll loop."""
+        # Created on the loop directly: a tracked hass task would keep
+        # async_block_till_done() waiting on a loop that never ends.
+        self._task = self.coordinator.hass.loop.create_task(self._async_poll_loop())
+
+    @callback
+    def async_stop(self):
+        """Cancel the poll loop, any pending verification or hinted refresh and
+        the refresh, runtimes and alerts fetches in flight."""
+        for handle in (self._verify_handle, self._hint_handle):
+            if handle is not None:
+                handle.cancel()
+        self._verify_handle = self._hint_handle = None
+        for task in (self._task, self._refresh_task, self._runtimes_task, self._alerts_task):
+            if task is not None:
+                task.cancel()
+        self._task = self._refresh_task = None
+        self._runtimes_task = self._alerts_task = None
+
+    @callback
+    def async_update_listeners(self):
+        """Push the client's current state to every listener."""
+        for update_callback in list(self._listeners):
+            update_callback()
+
+    @callback
+    def async_command_sent(self):
+        """Show a command's result now and confirm it with one delayed refresh.
+
+        The client has already applied the accepted change locally, so listeners
+        are updated straight away. Commands in quick succession share a single
+        verification read, timed from the last of them; the device then polls
+        fast for a while so follow-on state changes (heating starting) show up.
+        """
+        self._last_command = time.monotonic()
+        self.async_update_listeners()
+        if self._verify_handle is not None:
+            self._verify_handle.cancel()
+        self._verify_handle = self.coordinator.hass.loop.call_later(
+            VERIFY_DELAY, self._async_verify
+        )
+
+    @callback
+    def async_hint(self):
+        """Refresh soon: the unit announced itself, so something may have changed.
+
+        The refresh waits until HINT_MIN_INTERVAL after the previous one, and
+        hints arriving in the meantime share it.
+        """
+        now = time.monotonic()
+        self._last_hint = now
+        if self._hint_handle is not None:
+            return
+        delay = 0
+        if self._last_refresh is not None:
+            delay = max(0, self._last_refresh + HINT_MIN_INTERVAL - now)
+        self._hint_handle = self.coordinator.hass.loop.call_later(
+            delay, self._async_hinted_refresh
+        )
+
+    @callback
+    def _async_hinted_refresh(self):
+        self._hint_handle = None
+        self.coordinator.hass.async_create_task(self.async_refresh())
+
+    @callback
+    def _async_verify(self):
+        self._verify_handle = None
+        self.coordinator.hass.async_create_task(self.async_refresh())
+
+    def _update_interval(self):
+        if self.client.changed:
+            self._unchanged_polls = 0
+        else:
+            self._unchanged_polls += 1
+
+        client = self.client
+        recent_command = (
+            self._last_command is not None
+            and time.monotonic() - self._last_command < FAST_POLL_WINDOW
+        )
+        if recent_command or client.info.state in (client.STATE_HEATING, client.STATE_COOLING):
+            self.current_interval = min(FAST_POLL_INTERVAL, self.interval)
+        elif self._unchanged_polls >= BACKOFF_AFTER_POLLS:
+            # A unit that announces itself will hint at changes, so polling
+            # is only the fallback and can back off further.
+            hinted = (
+                self._last_hint is not None
+                and time.monotonic() - self._last_hint < HINT_TRUST_WINDOW
+            )
+            factor = HINTED_MAX_BACKOFF_FACTOR if hinted else MAX_BACKOFF_FACTOR
+            self.current_interval = min(
+                max(self.current_interval, self.interval) * 2,
+                self.interval * factor,
+            )
+        else:
+            self.current_interval = self.interval
+
+    def _next_delay(self):
+        return self.current_interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+    async def _async_poll_loop(self):
+        # A random phase within the first interval spreads devices evenly over
+        # the whole period rather than polling them all at startup.
+        delay = random.uniform(0, self.interval)
+        if self.runtimes is not None:
+            await self.coordinator.hass.async_add_executor_job(self.runtimes.load)
+            self._update_runtime_totals()
+            self.coordinator.async_schedule_analytics()
+        if self.history is not None:
+            try:
+                await self.coordinator.hass.async_add_executor_job(self.history.open)
+            except (OSError, ValueError) as ex:
+                _LOGGER.warning(
+                    "Polling %s without a local history, %s can't be opened: %s",
+                    self.client.addr,
+                    self.history.path,
+                    ex,
+                )
+                self.history = None
+        # Also checked rather than relying on the cancel alone: wait_for drops
+        # a cancellation that arrives as the event is set (before Python 3.12).
+        while self._task is asyncio.current_task():
+            self._reschedule.clear()
+            try:
+                # Any refresh made outside the loop (startup, a command) wakes it
+                # early, so the next poll is timed from that refresh instead.
+                await asyncio.wait_for(self._reschedule.wait(), delay)
+            except asyncio.TimeoutError:
+                try:
+                    await self.async_refresh()
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception("Unexpected error polling %s", self.client.addr)
+            delay = self._next_delay()
+
+    async def async_refresh(self):
+        """Refresh now, or join the refresh already in flight."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = self.coordinator.hass.async_create_task(
+                self._async_do_refresh()
+            )
+        # Shielded so a cancelled caller doesn't abort a refresh others joined.
+        return await asyncio.shield(self._refresh_task)
+
+    @callback
+    def _async_maybe_fetch_runtimes(self):
+        if (
+            self.runtimes is None
+            or self._runtimes_task is not None
+            or not self.runtimes.fetch_due(time.time())
+        ):
+            return
+        self._runtimes_task = self.coordinator.hass.async_create_task(
+            self._async_fetch_runtimes()
+        )
+
+    async def _async_fetch_runtimes(self):
+        """Merge in any daily runtime records we don't have yet."""
+        try:
+            async with self.coordinator.semaphore:
+                records = await self.client.get_runtimes(self.runtimes.last_ts)
+            if records is False:
+                return
+            if self.runtimes.merge(records, time.time()):
+                await self.coordinator.hass.async_add_executor_job(self.runtimes.save)
+                self._update_runtime_totals()
+                self.coordinator.async_schedule_analytics()
+                self.async_update_listeners()
+        finally:
+            self._runtimes_task = None
+
+    @callback
+    def _async_maybe_fetch_alerts(self):
+        if self._alerts_task is not None or time.monotonic() < self._next_alerts:
+            return
+        self._alerts_task = self.coordinator.hass.async_create_task(
+            self._async_fetch_alerts()
+        )
+
+    async def _async_fetch_alerts(self):
+        """Update the cached alerts and fire an event for each that changed."""
+        try:
+            async with self.coordinator.semaphore:
+                transitions = await self.client.update_alerts()
+            if transitions is False:
+                return
+            self._next_alerts = time.monotonic() + ALERTS_INTERVAL
+            first_poll = not self._alerts_polled
+            self._alerts_polled = True
+            if first_poll:
+                # Alerts already on at startup are state, not news.
+                self.async_update_listeners()
+                return
+            for alert in transitions:
+                _LOGGER.info(
+                    "Alert %s on %s %s",
+                    alert.name,
+                    self.client.addr,
+                    "turned on" if alert.active else "cleared",
+                )
+                self.coordinator.hass.bus.async_fire(
+                    EVENT_ALERT,
+                    {
+                        "host": self.client.addr,
+                        "name": self.client.info.name,
+                        "alert": alert.name,
+                        "active": bool(alert.active),
+                    },
+                )
+            if transitions:
+                self.async_update_listeners()
+        finally:
+            self._alerts_task = None
+
+    def _update_runtime_totals(self):
+        totals = self.runtimes.totals(time.time() - RUNTIMES_SUMMARY_DAYS * RUNTIME_PERIOD)
+        self.runtime_totals = {
+            "heat": totals["heat1"] + totals["heat2"] + totals["aux1"] + totals["aux2"],
+            "cool": totals["cool1"] + totals["cool2"],
+        }
+
+    def _record_outdoor(self):
+        """Add the outdoor reading, in Celsius, to the runtimes' hourly means."""
+        temp = self.client.sensors.outdoor.temp
+        if temp is None:
+            return
+        if self.client.info.tempunits == self.client.TEMPUNITS_F:
+            temp = (temp - 32) * 5 / 9
+        self.runtimes.record_outdoor(temp, time.time())
+
+    def _record_history(self):
+        """Add a history sample if anything changed or the heartbeat is due."""
+        info = self.client.info
+        outdoor = self.client.sensors.outdoor.temp
+        key = (info.spacetemp, info.heattemp, info.cooltemp, info.hum, outdoor,
+               info.mode, info.state, info.fanstate, info.tempunits)
+        now = time.time()
+        last_ts = self.history.last_ts
+        if key == self._history_key and last_ts is not None and now - last_ts < HISTORY_HEARTBEAT:
+            return
+        self._history_key = key
+        self.history.append(now, info, outdoor)
+
+    async def _async_do_refresh(self):
+        async with self.coordinator.semaphore:
+            results = await self.client.refresh()
+        self._last_refresh = time.monotonic()
+        self.last_results = results
+        if results["sensors"] and self.runtimes is not None:
+            self._record_outdoor()
+        if results["info"] and self.history is not None:
+            self._record_history()
+        if results["info"]:
+            self._update_interval()
+            self._async_maybe_fetch_runtimes()
+            self._async_maybe_fetch_alerts()
+        self._reschedule.set()
+        # While the circuit breaker is open the client already logged the
+        # outage once; don't repeat it for every short-circuited poll.
+        log = _LOGGER.error if self.client.available else _LOGGER.debug
+        for endpoint, success in results.items():
+            if not success:
+                log("Failed to update %s from %s", endpoint, self.client.addr)
+        self.async_update_listeners()
+        return results
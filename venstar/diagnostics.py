@@ -0,0 +1,36 @@
+"""Diagnostics for Venstar thermostats."""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+
+from .coordinator import async_get_coordinator
+
+TO_REDACT = {CONF_PASSWORD, CONF_USERNAME}
+
+
+async def async_get_config_entry_diagnostics(hass, entry):
+    """Return the state, request stats and scheduler of an entry's thermostat.
+
+    The last trace's timings (venstar.trace_start/trace_stop), or those of the
+    one still running, are included for the whole integration.
+    """
+    coordinator = async_get_coordinator(hass)
+    device = coordinator.entries.get(entry.entry_id)
+    data = {"entry": async_redact_data(dict(entry.data), TO_REDACT)}
+    if device is not None:
+        client = device.client
+        data["device"] = {
+            "identity": client.identity,
+            "info": client.info.as_dict(),
+            "interval": device.interval,
+            "current_interval": device.current_interval,
+            "stats": client.stats.as_dict(),
+            "scheduler": {
+                "max_in_flight": client.scheduler.max_in_flight,
+                "in_flight": client.scheduler.in_flight,
+                "waiting": client.scheduler.waiting,
+            },
+            "analytics": device.analytics.as_dict() if device.analytics else None,
+        }
+    if coordinator.tracer.started is not None:
+        data["trace"] = coordinator.tracer.summary()
+    return data
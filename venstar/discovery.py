@@ -0,0 +1,154 @@
+"""SSDP discovery of Venstar thermostats on the local network.
+
+ColorTouch units answer M-SEARCH requests for ``venstar:thermostat:ecp`` and
+announce themselves with NOTIFY messages. Each response or announcement names
+the unit (MAC and name in the USN) and where to reach it (LOCATION), which is
+enough to find new units, follow a unit to a new IP address, and treat the
+announcement as a hint that its state may have changed.
+"""
+import asyncio
+import ipaddress
+import logging
+import socket
+import struct
+from urllib.parse import unquote, urlsplit
+
+_LOGGER = logging.getLogger(__name__)
+
+SSDP_ST = "venstar:thermostat:ecp"
+SSDP_ADDRESS = ("239.255.255.250", 1900)
+
+_M_SEARCH = (
+    "M-SEARCH * HTTP/1.1\r\n"
+    "HOST: {0}:{1}\r\n"
+    'MAN: "ssdp:discover"\r\n'
+    "MX: 2\r\n"
+    "ST: " + SSDP_ST + "\r\n"
+    "\r\n"
+)
+
+
+class Announcement:
+    """One SSDP response or NOTIFY from a thermostat."""
+
+    __slots__ = ("mac", "name", "host", "alive")
+
+    def __init__(self, mac, name, host, alive=True):
+        """Initialize the announcement."""
+        self.mac = mac
+        self.name = name
+        self.host = host
+        self.alive = alive
+
+    def __repr__(self):
+        return "Announcement(mac={0!r}, name={1!r}, host={2!r}, alive={3!r})".format(
+            self.mac, self.name, self.host, self.alive
+        )
+
+
+def parse_address(address):
+    """Parse "host:port" into a (host, port) tuple; the port defaults to 1900."""
+    host, _, port = address.rpartition(":")
+    if not host:
+        return (port, SSDP_ADDRESS[1])
+    return (host, int(port))
+
+
+def parse_announcement(data):
+    """Return the Announcement in an SSDP datagram, or None if it isn't one.
+
+    The USN looks like ``ecp:00:23:a7:12:34:56:name:Living%20Room:type:residential``.
+    """
+    lines = data.decode("utf-8", "replace").split("\r\n")
+    start = lines[0].upper()
+    if not (start.startswith("NOTIFY") or start.startswith("HTTP/")):
+        return None
+    headers = {}
+    for line in lines[1:]:
+        key, sep, value = line.partition(":")
+        if sep:
+            headers[key.strip().upper()] = value.strip()
+    if headers.get("ST", headers.get("NT")) != SSDP_ST:
+        return None
+    host = urlsplit(headers.get("LOCATION", "")).netloc
+    usn = headers.get("USN", "")
+    if not host or not usn.startswith("ecp:"):
+        return None
+    fields = usn[len("ecp:") :].split(":")
+    # Six octets of MAC, then key:value pairs.
+    mac = ":".join(fields[:6]).lower()
+    extra = dict(zip(fields[6::2], fields[7::2]))
+    return Announcement(
+        mac,
+        unquote(extra.get("name", "")) or None,
+        host,
+        headers.get("NTS", "ssdp:alive") != "ssdp:byebye",
+    )
+
+
+class SsdpListener(asyncio.DatagramProtocol):
+    """Listen for thermostat announcements and search for thermostats.
+
+    With the default multicast address the listener joins the SSDP group on
+    port 1900. Any other address (a local stand-in for tests) is bound as a
+    plain unicast UDP socket. ``callback`` is called with each Announcement.
+    """
+
+    def __init__(self, callback, address=SSDP_ADDRESS):
+        """Initialize the listener."""
+        self.callback = callback
+        self.address = address
+        self.transport = None
+
+    @property
+    def multicast(self):
+        return ipaddress.ip_address(self.address[0]).is_multicast
+
+    async def async_start(self, loop):
+        """Bind the socket; return False if that isn't possible."""
+        try:
+            sock = self._make_socket()
+        except OSError as ex:
+            _LOGGER.warning("Can't listen for Venstar thermostats on %s:%s: %s", *self.address, ex)
+            return False
+        await loop.create_datagram_endpoint(lambda: self, sock=sock)
+        return True
+
+    def _make_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            except OSError:
+                pass
+        sock.setblocking(False)
+        if self.multicast:
+            # Home Assistant's own SSDP integration may share this port.
+            sock.bind(("", self.address[1]))
+            membership = struct.pack("4sl", socket.inet_aton(self.address[0]), socket.INADDR_ANY)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        else:
+            sock.bind(self.address)
+        return sock
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        announcement = parse_announcement(data)
+        if announcement is not None:
+            self.callback(announcement)
+
+    def error_received(self, exc):
+        _LOGGER.debug("SSDP socket error: %s", exc)
+
+    def search(self):
+        """Send an M-SEARCH; thermostats answer to this socket."""
+        if self.transport is not None:
+            self.transport.sendto(_M_SEARCH.format(*self.address).encode(), self.address)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
@@ -0,0 +1,282 @@
+"""Compact local history of a thermostat's state, for cycle analysis.
+
+Each sample is a fixed-width record in a memory-mapped ring buffer, one file
+per thermostat. Temperatures and humidity are stored as deltas from the
+previous sample, in tenths; mode, state and fan state as their values. The
+header keeps the absolute values just before the oldest record (the base) and
+those of the newest, so appending never reads the ring and evicting the oldest
+record only folds its deltas into the base.
+"""
+from collections import namedtuple
+import logging
+import mmap
+import os
+import struct
+
+from .venstarcolortouch import State, TempUnits
+
+_LOGGER = logging.getLogger(__name__)
+
+# Delta-encoded fields, in record order; None readings are flagged, not stored.
+DELTA_FIELDS = ("spacetemp", "heattemp", "cooltemp", "outdoor", "hum")
+# dt (seconds since the previous sample), a delta per DELTA_FIELDS in tenths
+# (humidity in whole percent), mode, state, fanstate and flags.
+_RECORD = struct.Struct("<Ihhhhb4B")
+# Flag bits: one per DELTA_FIELDS entry that had no reading, and the unit.
+_FLAG_CELSIUS = 0x80
+
+_MAGIC = b"VTS1"
+# magic, capacity, next slot, count, then base and last as (ts, five values).
+_STATE = struct.Struct("<qiiiii")
+_HEADER = struct.Struct("<4sIII")
+_HEADER_SIZE = _HEADER.size + 2 * _STATE.size
+
+Sample = namedtuple(
+    "Sample",
+    ("ts", "spacetemp", "heattemp", "cooltemp", "outdoor", "hum",
+     "mode", "state", "fanstate", "celsius"),
+)
+Cycle = namedtuple("Cycle", ("state", "start", "end"))
+
+
+def _fixed(field, value):
+    return int(round(value)) if field == "hum" else int(round(value * 10))
+
+
+def _unfixed(field, value):
+    return value if field == "hum" else value / 10
+
+
+def _cycles(samples):
+    cycles = []
+    current = None
+    for sample in samples:
+        if current is not None and sample.state != current[0]:
+            cycles.append(Cycle(current[0], current[1], sample.ts))
+            current = None
+        if current is None and sample.state in (State.HEATING, State.COOLING):
+            current = (sample.state, sample.ts)
+    if current is not None:
+        cycles.append(Cycle(current[0], current[1], None))
+    return cycles
+
+
+class ThermostatHistory:
+    """Ring buffer of up to ``capacity`` samples in the file at ``path``.
+
+    open() maps the file (creating it, or starting over if it is unreadable or
+    was made with another capacity); append() adds a sample; samples() and the
+    cycle queries decode it. Not thread-safe: use it from one thread at a time.
+    """
+
+    def __init__(self, path, capacity):
+        """Initialize a history that is not open yet."""
+        self.path = path
+        self.capacity = capacity
+        self._file = None
+        self._map = None
+        self._head = 0
+        self._count = 0
+        self._base = (0,) + (0,) * len(DELTA_FIELDS)
+        self._last = self._base
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def last_ts(self):
+        """Return the time of the newest sample, or None."""
+        return self._last[0] if self._count else None
+
+    def open(self):
+        """Map the file, creating or resetting it as needed."""
+        size = _HEADER_SIZE + self.capacity * _RECORD.size
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._file = os.fdopen(fd, "r+b")
+        try:
+            fresh = os.fstat(fd).st_size != size
+            if fresh:
+                self._file.truncate(size)
+            mapping = mmap.mmap(fd, size)
+        except BaseException:
+            self._file.close()
+            self._file = None
+            raise
+        if not fresh:
+            magic, capacity, head, count = _HEADER.unpack_from(mapping, 0)
+            if magic == _MAGIC and capacity == self.capacity and count <= capacity:
+                self._head, self._count = head, count
+                self._base = _STATE.unpack_from(mapping, _HEADER.size)
+                self._last = _STATE.unpack_from(mapping, _HEADER.size + _STATE.size)
+                # Set last: append() does nothing until the map is in place.
+                self._map = mapping
+                return
+            _LOGGER.warning("Starting over with unreadable history file %s", self.path)
+        self._map = mapping
+        self._write_header()
+
+    def close(self):
+        """Unmap the file.
+
+        The pages are shared with the file, so the kernel writes them back;
+        there is nothing to flush first, and this is cheap enough for the
+        event loop.
+        """
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+    def snapshot(self):
+        """Return a read-only copy, safe to query from another thread."""
+        copy = ThermostatHistory(self.path, self.capacity)
+        if self._map is not None:
+            copy._map = bytes(self._map)
+            copy._head, copy._count = self._head, self._count
+            copy._base, copy._last = self._base, self._last
+        return copy
+
+    def _write_header(self):
+        _HEADER.pack_into(self._map, 0, _MAGIC, self.capacity, self._head, self._count)
+        _STATE.pack_into(self._map, _HEADER.size, *self._base)
+        _STATE.pack_into(self._map, _HEADER.size + _STATE.size, *self._last)
+
+    def _offset(self, slot):
+        return _HEADER_SIZE + slot * _RECORD.size
+
+    def append(self, ts, info, outdoor=None):
+        """Add a sample taken at ``ts`` from an InfoSnapshot and the outdoor temp."""
+        if self._map is None:
+            return
+        ts = int(ts)
+        values = dict(
+            spacetemp=info.spacetemp,
+            heattemp=info.heattemp,
+            cooltemp=info.cooltemp,
+            outdoor=outdoor,
+            hum=info.hum,
+        )
+        if self._count and ts < self._last[0]:
+            return
+        if self._count == self.capacity:
+            self._evict_oldest()
+        flags = _FLAG_CELSIUS if info.tempunits == TempUnits.C else 0
+        deltas = []
+        last = list(self._last)
+        for index, field in enumerate(DELTA_FIELDS, 1):
+            value = values[field]
+            if value is None:
+                flags |= 1 << (index - 1)
+                deltas.append(0)
+                continue
+            fixed = _fixed(field, value)
+            deltas.append(fixed - last[index])
+            last[index] = fixed
+        dt = ts - last[0]
+        last[0] = ts
+        _RECORD.pack_into(
+            self._map, self._offset((self._head + self._count) % self.capacity),
+            dt, *deltas, info.mode or 0, info.state or 0, info.fanstate or 0, flags,
+        )
+        self._count += 1
+        self._last = tuple(last)
+        self._write_header()
+
+    def _evict_oldest(self):
+        # A missing reading was stored as a zero delta, so it adds nothing.
+        record = _RECORD.unpack_from(self._map, self._offset(self._head))
+        self._base = tuple(
+            value + delta for value, delta in zip(self._base, record[:1 + len(DELTA_FIELDS)])
+        )
+        self._count -= 1
+        self._head = (self._head + 1) % self.capacity
+
+    def samples(self, since=None):
+        """Return the Samples from ``since`` on (all of them by default), oldest first."""
+        running = list(self._base)
+        result = []
+        for position in range(self._count):
+            record = _RECORD.unpack_from(
+                self._map, self._offset((self._head + position) % self.capacity)
+            )
+            flags = record[-1]
+            running[0] += record[0]
+            values = []
+            for index, field in enumerate(DELTA_FIELDS):
+                running[index + 1] += record[1 + index]
+                if flags & (1 << index):
+                    values.append(None)
+                else:
+                    values.append(_unfixed(field, running[index + 1]))
+            if since is not None and running[0] < since:
+                continue
+            mode, state, fanstate = record[1 + len(DELTA_FIELDS):-1]
+            result.append(
+                Sample(running[0], *values, mode, state, fanstate, bool(flags & _FLAG_CELSIUS))
+            )
+        return result
+
+    def cycles(self, since=None):
+        """Return the heating and cooling Cycles from ``since`` on.
+
+        A cycle runs from the first sample in that state to the first sample in
+        another; one still running has an ``end`` of None. Times are only as
+        precise as the polling.
+        """
+        return _cycles(self.samples(since))
+
+    def short_cycles(self, min_run, since=None):
+        """Return the finished cycles that ran for less than ``min_run`` seconds."""
+        return [
+            cycle
+            for cycle in self.cycles(since)
+            if cycle.end is not None and cycle.end - cycle.start < min_run
+        ]
+
+    def time_to_setpoint(self, since=None):
+        """Return (cycle, seconds) for each cycle, seconds being how long it took
+        the space temperature to reach the setpoint, or None if it didn't."""
+        samples = self.samples(since)
+        results = []
+        position = 0
+        for cycle in _cycles(samples):
+            while samples[position].ts < cycle.start:
+                position += 1
+            reached = None
+            for sample in samples[position:]:
+                if cycle.end is not None and sample.ts >= cycle.end:
+                    break
+                heating = cycle.state == State.HEATING
+                setpoint = sample.heattemp if heating else sample.cooltemp
+                if sample.spacetemp is None or setpoint is None:
+                    continue
+                if sample.spacetemp >= setpoint if heating else sample.spacetemp <= setpoint:
+                    reached = sample.ts - cycle.start
+                    break
+            results.append((cycle, reached))
+        return results
+
+    def cycle_summary(self, since, min_run):
+        """Summarize the cycles from ``since`` on; see short_cycles for ``min_run``."""
+        results = self.time_to_setpoint(since)
+        cycles = [cycle for cycle, _ in results]
+        finished = [cycle for cycle in cycles if cycle.end is not None]
+        short = [cycle for cycle in finished if cycle.end - cycle.start < min_run]
+        times = [seconds for _, seconds in results if seconds is not None]
+        samples = self.samples(since)
+        span = samples[-1].ts - samples[0].ts if samples else 0
+        return {
+            "samples": len(samples),
+            "cycles": len(cycles),
+            "short_cycles": len(short),
+            "short": [[cycle.state, cycle.start, cycle.end] for cycle in short],
+            "cycles_per_hour": round(len(cycles) * 3600 / span, 2) if span else None,
+            "mean_run": round(sum(cycle.end - cycle.start for cycle in finished) / len(finished))
+            if finished
+            else None,
+            "mean_time_to_setpoint": round(sum(times) / len(times)) if times else None,
+            "setpoint_not_reached": sum(
+                1 for cycle, seconds in results if seconds is None and cycle.end is not None
+            ),
+        }
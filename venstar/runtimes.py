@@ -0,0 +1,218 @@
+"""Incremental on-disk cache of a thermostat's daily runtime records."""
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+import logging
+import os
+import struct
+import sys
+
+_LOGGER = logging.getLogger(__name__)
+
+# Minutes per day each stage ran, as reported in query/runtimes.
+RUNTIME_FIELDS = ("heat1", "heat2", "cool1", "cool2", "aux1", "aux2", "fc")
+# The device adds one record per day.
+RUNTIME_PERIOD = 86400
+# When a due fetch brings nothing new, wait this long before asking again.
+RUNTIME_RETRY = 3600
+# Outdoor temperature is kept as one mean per hour, in degrees Celsius.
+OUTDOOR_PERIOD = 3600
+
+# VRT1 files hold only runtime records; VRT2 adds a second count and the
+# outdoor hourly means after them. Both wrote the runtime columns as the host's
+# C long, whatever its size. VRT3 adds the size in bytes of a runtime column
+# value after the counts, and everything is little-endian, so a store can move
+# between hosts.
+_MAGIC_V1 = b"VRT1"
+_MAGIC_V2 = b"VRT2"
+_MAGIC = b"VRT3"
+_COUNT = struct.Struct("<I")
+_ITEMSIZE = struct.Struct("<B")
+_COLUMN_TYPECODES = {4: "i", 8: "q"}
+_SWAP = sys.byteorder != "little"
+
+
+def _read_array(fp, typecode, count, swap):
+    values = array(typecode)
+    values.fromfile(fp, count)
+    if swap:
+        values.byteswap()
+    return values
+
+
+def _write_array(fp, values):
+    if _SWAP:
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(fp)
+
+
+# Copies of a store's arrays from some time on, safe to hand to another thread.
+RuntimeWindow = namedtuple("RuntimeWindow", ("ts", "columns", "outdoor_ts", "outdoor_temp"))
+
+
+class RuntimesStore:
+    """Daily runtime records kept as parallel arrays, sorted by timestamp.
+
+    ``ts`` holds each record's start time and ``columns`` one array of minutes
+    per field in RUNTIME_FIELDS, so range sums are a bisect plus a slice sum.
+    ``outdoor_ts`` and ``outdoor_temp`` hold hourly outdoor temperature means,
+    which the analytics turn into degree-days. Records older than
+    ``max_age_days`` are dropped whenever new ones merge in.
+    """
+
+    def __init__(self, path, max_age_days):
+        """Initialize an empty store backed by ``path``."""
+        self.path = path
+        self.max_age = max_age_days * RUNTIME_PERIOD
+        self.ts = array("q")
+        self.columns = {field: array("q") for field in RUNTIME_FIELDS}
+        self.outdoor_ts = array("q")
+        self.outdoor_temp = array("d")
+        self._hour = None
+        self._hour_sum = 0.0
+        self._hour_count = 0
+        self._next_fetch = 0
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def last_ts(self):
+        """Return the start time of the newest record, or None."""
+        return self.ts[-1] if self.ts else None
+
+    def load(self):
+        """Read the store from disk; a missing or unreadable file leaves it empty."""
+        try:
+            with open(self.path, "rb") as fp:
+                magic = fp.read(len(_MAGIC))
+                if magic not in (_MAGIC, _MAGIC_V2, _MAGIC_V1):
+                    raise ValueError("not a runtimes file")
+                (count,) = _COUNT.unpack(fp.read(_COUNT.size))
+                outdoor_count = 0
+                if magic != _MAGIC_V1:
+                    (outdoor_count,) = _COUNT.unpack(fp.read(_COUNT.size))
+                # Older files were written on this host, in its byte order and
+                # its own C long.
+                typecode = "l"
+                swap = magic == _MAGIC and _SWAP
+                if magic == _MAGIC:
+                    (itemsize,) = _ITEMSIZE.unpack(fp.read(_ITEMSIZE.size))
+                    typecode = _COLUMN_TYPECODES.get(itemsize)
+                    if typecode is None:
+                        raise ValueError("unsupported value size {}".format(itemsize))
+                ts = _read_array(fp, "q", count, swap)
+                columns = {
+                    field: array("q", _read_array(fp, typecode, count, swap))
+                    for field in RUNTIME_FIELDS
+                }
+                outdoor_ts = _read_array(fp, "q", outdoor_count, swap)
+                outdoor_temp = _read_array(fp, "d", outdoor_count, swap)
+        except FileNotFoundError:
+            return
+        except (OSError, EOFError, ValueError, struct.error) as ex:
+            _LOGGER.warning("Discarding unreadable runtimes cache %s: %s", self.path, ex)
+            return
+        self.ts = ts
+        self.columns = columns
+        self.outdoor_ts = outdoor_ts
+        self.outdoor_temp = outdoor_temp
+
+    def save(self):
+        """Write the store to disk atomically."""
+        tmp_path = self.path + ".tmp"
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(tmp_path, "wb") as fp:
+            fp.write(
+                _MAGIC
+                + _COUNT.pack(len(self.ts))
+                + _COUNT.pack(len(self.outdoor_ts))
+                + _ITEMSIZE.pack(array("q").itemsize)
+            )
+            _write_array(fp, self.ts)
+            for field in RUNTIME_FIELDS:
+                _write_array(fp, self.columns[field])
+            _write_array(fp, self.outdoor_ts)
+            _write_array(fp, self.outdoor_temp)
+        os.replace(tmp_path, self.path)
+
+    def fetch_due(self, now):
+        """Return True if the device should have a record we don't have yet."""
+        if now < self._next_fetch:
+            return False
+        return self.last_ts is None or now >= self.last_ts + RUNTIME_PERIOD
+
+    def merge(self, records, now):
+        """Merge device records newer than (or equal to) our last one.
+
+        Returns the number of records added. The newest stored record is
+        replaced rather than duplicated if the device re-reports it.
+        """
+        last_ts = self.last_ts
+        fresh = sorted(
+            (record for record in records
+             if last_ts is None or record.get("ts", 0) >= last_ts),
+            key=lambda record: record["ts"],
+        )
+        replaced = bool(fresh) and fresh[0]["ts"] == last_ts
+        if replaced:
+            self._pop()
+        for record in fresh:
+            self.ts.append(record["ts"])
+            for field in RUNTIME_FIELDS:
+                self.columns[field].append(record.get(field) or 0)
+        added = len(fresh) - replaced
+        # Ask again in an hour if nothing new showed up, instead of every poll.
+        self._next_fetch = 0 if added else now + RUNTIME_RETRY
+        self.evict(now)
+        return added
+
+    def record_outdoor(self, temp, now):
+        """Add an outdoor temperature reading (Celsius) to the current hour's mean."""
+        hour = int(now) // OUTDOOR_PERIOD * OUTDOOR_PERIOD
+        if hour != self._hour:
+            self._close_hour()
+            self._hour = hour
+        self._hour_sum += temp
+        self._hour_count += 1
+
+    def _close_hour(self):
+        if self._hour_count and (not self.outdoor_ts or self._hour > self.outdoor_ts[-1]):
+            self.outdoor_ts.append(self._hour)
+            self.outdoor_temp.append(self._hour_sum / self._hour_count)
+        self._hour_sum = 0.0
+        self._hour_count = 0
+
+    def evict(self, now):
+        """Drop records that started more than max_age before ``now``."""
+        cut = bisect_left(self.ts, now - self.max_age)
+        if cut:
+            del self.ts[:cut]
+            for column in self.columns.values():
+                del column[:cut]
+        cut = bisect_left(self.outdoor_ts, now - self.max_age)
+        if cut:
+            del self.outdoor_ts[:cut]
+            del self.outdoor_temp[:cut]
+
+    def totals(self, since):
+        """Return minutes per field summed over records starting at or after ``since``."""
+        start = bisect_left(self.ts, since)
+        return {field: sum(column[start:]) for field, column in self.columns.items()}
+
+    def window(self, since):
+        """Return a RuntimeWindow of the records and outdoor hours from ``since`` on."""
+        start = bisect_left(self.ts, since)
+        outdoor_start = bisect_left(self.outdoor_ts, since)
+        return RuntimeWindow(
+            self.ts[start:],
+            {field: column[start:] for field, column in self.columns.items()},
+            self.outdoor_ts[outdoor_start:],
+            self.outdoor_temp[outdoor_start:],
+        )
+
+    def _pop(self):
+        self.ts.pop()
+        for column in self.columns.values():
+            column.pop()
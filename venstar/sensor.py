@@ -0,0 +1,331 @@
+"""Diagnostic sensors for Venstar WiFi Thermostats."""
+import logging
+
+from homeassistant.const import (
+    CONF_HOST,
+    DEVICE_CLASS_HUMIDITY,
+    DEVICE_CLASS_TEMPERATURE,
+    DEVICE_CLASS_TIMESTAMP,
+    PERCENTAGE,
+    TEMP_CELSIUS,
+    TEMP_FAHRENHEIT,
+)
+from homeassistant.core import callback
+from homeassistant.helpers.entity import Entity
+from homeassistant.util import slugify
+import homeassistant.util.dt as dt_util
+
+from . import analytics
+from .coordinator import async_get_coordinator
+from .venstarcolortouch import (
+    OUTCOME_CONNECTION_ERROR,
+    OUTCOME_HTTP_ERROR,
+    OUTCOME_TIMEOUT,
+    OUTCOMES,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+ERROR_OUTCOMES = (OUTCOME_TIMEOUT, OUTCOME_HTTP_ERROR, OUTCOME_CONNECTION_ERROR)
+
+ATTR_SENSOR_TYPE = "sensor_type"
+ATTR_BATTERY = "battery"
+ATTR_DAYS = "days"
+ATTR_OUTLIER = "outlier"
+ATTR_WEEKLY = "weekly"
+
+# RuntimeAnalytics field, name suffix and extra attributes of each analytics sensor.
+ANALYTICS_SENSORS = (
+    ("heat_duty", "Heat Duty Cycle", ()),
+    ("cool_duty", "Cool Duty Cycle", ()),
+    ("heat_per_degree_day", "Heat Runtime per Degree Day", ()),
+    ("cool_per_degree_day", "Cool Runtime per Degree Day", ()),
+    ("trend", "Runtime Trend", (ATTR_WEEKLY,)),
+    ("score", "Runtime Outlier Score", (ATTR_OUTLIER,)),
+)
+
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    """Set up the sensors of a thermostat set up by the climate platform."""
+    if discovery_info is None:
+        return
+
+    device = async_get_coordinator(hass).async_get_device(discovery_info[CONF_HOST])
+    if device is None:
+        return
+    if device.client.info.name is None:
+        # Joins the climate entity's first refresh, so the names are known.
+        await device.async_refresh()
+    _async_setup_device(device, async_add_entities)
+
+
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Set up the sensors of a config entry's thermostat."""
+    entry.async_on_unload(
+        _async_setup_device(async_get_coordinator(hass).entries[entry.entry_id], async_add_entities)
+    )
+
+
+@callback
+def _async_setup_device(device, async_add_entities):
+    """Add the device's sensors; return a callback that stops adding new ones."""
+    known = set()
+
+    @callback
+    def _async_add_readings():
+        """Add an entity for every sensor reading not seen before."""
+        entities = []
+        for key, reading in device.client.sensors.by_key.items():
+            for field in ("temp", "hum"):
+                if (key, field) in known or getattr(reading, field) is None:
+                    continue
+                known.add((key, field))
+                entities.append(VenstarReadingSensor(device, key, field))
+        if entities:
+            async_add_entities(entities)
+
+    entities = [
+        VenstarLatencySensor(device),
+        VenstarErrorsSensor(device),
+        VenstarLastPollSensor(device),
+    ]
+    if device.runtimes is not None and analytics.AVAILABLE:
+        entities.extend(
+            VenstarAnalyticsSensor(device, field, suffix, attributes)
+            for field, suffix, attributes in ANALYTICS_SENSORS
+        )
+    async_add_entities(entities)
+    _async_add_readings()
+    # Sensors that pair with the thermostat later show up on a later poll.
+    return device.async_add_listener(_async_add_readings)
+
+
+class VenstarDeviceSensor(Entity):
+    """Base class for sensors fed by a thermostat's coordinator device."""
+
+    _suffix = None
+
+    def __init__(self, device):
+        """Initialize the sensor."""
+        self._device = device
+        self._client = device.client
+        self._written_state = None
+
+    async def async_added_to_hass(self):
+        """Subscribe to the coordinator's snapshots."""
+        self.async_on_remove(self._device.async_add_listener(self._async_handle_update))
+
+    @callback
+    def _async_handle_update(self):
+        """Write the state only when it has changed."""
+        state = (self.state, self._state_key())
+        if state != self._written_state:
+            self._written_state = state
+            self.async_write_ha_state()
+
+    def _state_key(self):
+        """Return anything besides the state that should trigger a write."""
+        return None
+
+    @property
+    def should_poll(self):
+        """Polling is done by the coordinator, not per entity."""
+        return False
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return "{} {}".format(self._client.info.name or self._client.addr, self._suffix)
+
+    @property
+    def unique_id(self):
+        """Return a unique id for thermostats set up from a config entry."""
+        if self._device.unique_id is None:
+            return None
+        return "{}_{}".format(self._device.unique_id, slugify(self._suffix))
+
+    @property
+    def device_info(self):
+        """Return the device registry entry of the thermostat."""
+        return self._device.device_info
+
+
+class VenstarLatencySensor(VenstarDeviceSensor):
+    """Latency of the last query/info request, with per-endpoint histograms."""
+
+    _suffix = "Request Latency"
+
+    @property
+    def state(self):
+        """Return the last query/info latency in milliseconds."""
+        stats = self._client.stats.endpoints.get("query/info")
+        if stats is None or stats.last_latency is None:
+            return None
+        return round(stats.last_latency * 1000)
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement."""
+        return "ms"
+
+    @property
+    def extra_state_attributes(self):
+        """Return the per-endpoint histograms and counters."""
+        return self._client.stats.as_dict()["endpoints"]
+
+    def _state_key(self):
+        return sum(stats.count for stats in self._client.stats.endpoints.values())
+
+
+class VenstarErrorsSensor(VenstarDeviceSensor):
+    """Total failed requests, broken down by outcome in the attributes."""
+
+    _suffix = "Request Errors"
+
+    @property
+    def state(self):
+        """Return the number of failed requests."""
+        stats = self._client.stats
+        return sum(stats.total(outcome) for outcome in ERROR_OUTCOMES)
+
+    @property
+    def extra_state_attributes(self):
+        """Return the request totals per outcome."""
+        stats = self._client.stats
+        return {outcome: stats.total(outcome) for outcome in OUTCOMES}
+
+
+class VenstarLastPollSensor(VenstarDeviceSensor):
+    """Time of the last successful query/info poll."""
+
+    _suffix = "Last Good Poll"
+
+    @property
+    def state(self):
+        """Return the time of the last successful poll."""
+        last_good_poll = self._client.stats.last_good_poll
+        if last_good_poll is None:
+            return None
+        return dt_util.utc_from_timestamp(last_good_poll).isoformat()
+
+    @property
+    def device_class(self):
+        """Return the device class of the sensor."""
+        return DEVICE_CLASS_TIMESTAMP
+
+
+class VenstarReadingSensor(VenstarDeviceSensor):
+    """One measurement of one physical sensor, from the shared query/sensors poll."""
+
+    def __init__(self, device, key, field):
+        """Initialize the sensor for ``field`` of the reading keyed ``key``."""
+        super().__init__(device)
+        self._key = key
+        self._field = field
+        self._suffix = "{} {}".format(key, "Temperature" if field == "temp" else "Humidity")
+
+    @property
+    def _reading(self):
+        return self._client.sensors.by_key.get(self._key)
+
+    @property
+    def available(self):
+        """Return True while the thermostat is reachable and reports this sensor."""
+        return self._client.available and self._reading is not None
+
+    @property
+    def state(self):
+        """Return the current reading."""
+        reading = self._reading
+        return None if reading is None else getattr(reading, self._field)
+
+    @property
+    def unit_of_measurement(self):
+        """Return the thermostat's temperature unit, or percent for humidity."""
+        if self._field == "hum":
+            return PERCENTAGE
+        if self._client.info.tempunits == self._client.TEMPUNITS_C:
+            return TEMP_CELSIUS
+        return TEMP_FAHRENHEIT
+
+    @property
+    def device_class(self):
+        """Return the device class of the sensor."""
+        if self._field == "hum":
+            return DEVICE_CLASS_HUMIDITY
+        return DEVICE_CLASS_TEMPERATURE
+
+    @property
+    def extra_state_attributes(self):
+        """Return the sensor type and battery level, if reported."""
+        reading = self._reading
+        if reading is None:
+            return None
+        attributes = {ATTR_SENSOR_TYPE: reading.type}
+        if reading.battery is not None:
+            attributes[ATTR_BATTERY] = reading.battery
+        return attributes
+
+    def _state_key(self):
+        reading = self._reading
+        return (
+            self.available,
+            self._client.info.tempunits,
+            None if reading is None else (reading.type, reading.battery),
+        )
+
+
+class VenstarAnalyticsSensor(VenstarDeviceSensor):
+    """One figure of the thermostat's fleet runtime analytics."""
+
+    def __init__(self, device, field, suffix, attributes):
+        """Initialize the sensor for ``field`` of the device's RuntimeAnalytics."""
+        super().__init__(device)
+        self._field = field
+        self._suffix = suffix
+        self._attributes = attributes
+
+    @property
+    def state(self):
+        """Return the figure: a percentage, minutes per degree-day or a score."""
+        result = self._device.analytics
+        value = None if result is None else getattr(result, self._field)
+        if value is None:
+            return None
+        if self._field == "score":
+            return round(value, 2)
+        if self._field.endswith("_per_degree_day"):
+            if self._client.info.tempunits != self._client.TEMPUNITS_C:
+                # A Fahrenheit degree-day is 5/9 of a Celsius one.
+                value = value * 5 / 9
+            return round(value, 1)
+        return round(value * 100, 1)
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement."""
+        if self._field == "score":
+            return None
+        if self._field.endswith("_per_degree_day"):
+            if self._client.info.tempunits == self._client.TEMPUNITS_C:
+                return "min/{}".format(TEMP_CELSIUS)
+            return "min/{}".format(TEMP_FAHRENHEIT)
+        return PERCENTAGE
+
+    @property
+    def extra_state_attributes(self):
+        """Return the days analyzed and any figures that go with this one."""
+        result = self._device.analytics
+        if result is None:
+            return None
+        attributes = {ATTR_DAYS: result.days}
+        if ATTR_WEEKLY in self._attributes:
+            attributes[ATTR_WEEKLY] = [
+                None if minutes is None else round(minutes) for minutes in result.weekly
+            ]
+        if ATTR_OUTLIER in self._attributes:
+            attributes[ATTR_OUTLIER] = result.outlier
+        return attributes
+
+    def _state_key(self):
+        return self._device.analytics, self._client.info.tempunits
@@ -0,0 +1,206 @@
+"""Opt-in timing of client calls and entity property evaluation.
+
+While a trace runs, the methods and properties of the client and entity
+classes are replaced by timed wrappers that add each call's duration to a
+per-name total; stopping the trace puts the originals back, so there is no
+cost at all when tracing is off. A trace can also run cProfile on the event
+loop thread, for a profile that pstats, snakeviz and friends can read.
+"""
+import asyncio
+import functools
+import time
+import types
+
+from .venstarcolortouch import AsyncVenstarColorTouch, _VenstarColorTouchBase
+
+# One write of an entity's state evaluates its properties; timing the write
+# gives the cost of a whole update cycle per entity.
+WRITE_METHOD = "async_write_ha_state"
+
+
+class _Timing:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_us": round(self.total / self.count * 1e6, 1) if self.count else None,
+            "max_us": round(self.max * 1e6, 1),
+        }
+
+
+def _entity_classes():
+    # Imported here: the platforms import the coordinator, which imports this.
+    from .binary_sensor import VenstarAlertSensor
+    from .climate import VenstarThermostat
+    from .sensor import VenstarDeviceSensor
+
+    classes = [VenstarThermostat, VenstarAlertSensor]
+    pending = VenstarDeviceSensor.__subclasses__()
+    while pending:
+        cls = pending.pop()
+        classes.append(cls)
+        pending.extend(cls.__subclasses__())
+    return list(dict.fromkeys(classes))
+
+
+class Tracer:
+    """Timings by "Class.name" for the current or last trace."""
+
+    def __init__(self):
+        """Initialize an idle tracer."""
+        self.timings = {}
+        self.started = None
+        self.stopped = None
+        self.profiler = None
+        self._originals = []
+
+    @property
+    def running(self):
+        return self._originals != []
+
+    def start(self, profile=False):
+        """Start a new trace, discarding the last one's results."""
+        if self.running:
+            self.stop()
+        self.timings = {}
+        self.started = time.time()
+        self.stopped = None
+        # Everything is looked up before anything is wrapped, so no wrapper
+        # ends up wrapping another.
+        plan = []
+        for cls in (_VenstarColorTouchBase, AsyncVenstarColorTouch):
+            plan.extend(
+                (cls, name, attr) for name, attr in vars(cls).items() if not name.startswith("__")
+            )
+        for cls in _entity_classes():
+            # Inherited properties are timed per entity class too; wrappers for
+            # them are added to the class for the trace and deleted after.
+            names = set()
+            for klass in cls.__mro__:
+                if not klass.__module__.startswith(__package__ + "."):
+                    continue
+                for name, attr in vars(klass).items():
+                    if isinstance(attr, property) and name not in names:
+                        names.add(name)
+                        plan.append((cls, name, attr))
+            plan.append((cls, WRITE_METHOD, getattr(cls, WRITE_METHOD)))
+        for cls, name, attr in plan:
+            self._wrap(cls, name, attr)
+        self.profiler = None
+        if profile:
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self):
+        """Stop the trace and restore the original methods and properties."""
+        if self.profiler is not None:
+            self.profiler.disable()
+        for cls, name, original in reversed(self._originals):
+            if original is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, original)
+        self._originals = []
+        self.stopped = time.time()
+
+    def _timer(self, label):
+        timing = self.timings.get(label)
+        if timing is None:
+            timing = self.timings[label] = _Timing()
+        return timing
+
+    def _wrap(self, cls, name, attr):
+        label = "{}.{}".format(cls.__name__, name)
+        if isinstance(attr, property):
+            if attr.fget is None:
+                return
+            wrapped = property(self._timed(label, attr.fget), attr.fset, attr.fdel, attr.__doc__)
+        elif asyncio.iscoroutinefunction(attr):
+            wrapped = self._timed_async(label, attr)
+        elif isinstance(attr, types.FunctionType):
+            wrapped = self._timed(label, attr)
+        else:
+            return
+        self._originals.append((cls, name, vars(cls).get(name)))
+        setattr(cls, name, wrapped)
+
+    def _timed(self, label, func):
+        timing = self._timer(label)
+        perf_counter = time.perf_counter
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timing.add(perf_counter() - start)
+
+        return timed
+
+    def _timed_async(self, label, func):
+        timing = self._timer(label)
+        perf_counter = time.perf_counter
+
+        @functools.wraps(func)
+        async def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                timing.add(perf_counter() - start)
+
+        return timed
+
+    def summary(self):
+        """Return the timings, costliest first, and the cost per update cycle.
+
+        Async client calls are timed wall-clock, so they include network waits.
+        ``cycles`` gives, per entity class, the state writes and the time spent
+        in its properties per write.
+        """
+        timings = {
+            label: timing.as_dict()
+            for label, timing in sorted(
+                self.timings.items(), key=lambda item: item[1].total, reverse=True
+            )
+            if timing.count
+        }
+        cycles = {}
+        for label, timing in self.timings.items():
+            cls_name, _, name = label.partition(".")
+            if name != WRITE_METHOD or not timing.count:
+                continue
+            properties = sum(
+                other.total
+                for other_label, other in self.timings.items()
+                if other_label.startswith(cls_name + ".") and other_label != label
+            )
+            cycles[cls_name] = {
+                "writes": timing.count,
+                "write_us": round(timing.total / timing.count * 1e6, 1),
+                "properties_us": round(properties / timing.count * 1e6, 1),
+            }
+        end = self.stopped or time.time()
+        return {
+            "running": self.running,
+            "duration": round(end - self.started, 3) if self.started else None,
+            "cycles": cycles,
+            "timings": timings,
+        }
+
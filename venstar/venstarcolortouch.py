@@ -0,0 +1,1622 @@
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import ssl
+import threading
+import time
+from types import MappingProxyType
+import urllib.parse
+import urllib.request
+import logging
+import aiohttp
+import warnings
+from operator import attrgetter
+
+# requests and urllib3 are only needed by the sync client and are imported when
+# the first one is created; the async client never loads them.
+requests = urllib3 = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_LOGGER = logging.getLogger(__name__)
+
+MIN_API_VER=3
+
+# orjson decodes response bodies several times faster than the json module when
+# it is installed. Both raise a ValueError subclass on bad input.
+_loads = orjson.loads if orjson is not None else json.loads
+# query/runtimes is read in chunks of this size and parsed as it arrives.
+STREAM_CHUNK_SIZE=8192
+
+# A ColorTouch only ever talks to one client at a time, so a couple of pooled
+# keep-alive connections is plenty.
+POOL_MAXSIZE=2
+# urllib3 already discards pooled sockets the thermostat closed while idle; on
+# top of that, retry a failed (re)connect once. Reads are never retried so a
+# slow device still fails after a single timeout.
+CONNECT_RETRIES=1
+
+# Changes queued on the async client within this many seconds of each other are
+# merged into a single POST per endpoint.
+WRITE_DEBOUNCE=0.1
+CONTROL_FIELDS=("mode", "fan", "heattemp", "cooltemp")
+SETTINGS_FIELDS=("tempunits", "hum_setpoint", "dehum_setpoint")
+
+# Request outcomes counted per endpoint and passed to metrics hooks.
+OUTCOME_SUCCESS="success"
+OUTCOME_TIMEOUT="timeout"
+OUTCOME_HTTP_ERROR="http_error"
+OUTCOME_CONNECTION_ERROR="connection_error"
+OUTCOME_AUTH_CHALLENGE="auth_challenge"
+OUTCOME_CIRCUIT_OPEN="circuit_open"
+# A read that joined an identical one already queued or in flight.
+OUTCOME_MERGED="merged"
+OUTCOMES=(OUTCOME_SUCCESS, OUTCOME_TIMEOUT, OUTCOME_HTTP_ERROR, OUTCOME_CONNECTION_ERROR,
+          OUTCOME_AUTH_CHALLENGE, OUTCOME_CIRCUIT_OPEN, OUTCOME_MERGED)
+# Upper bounds, in seconds, of the request latency histogram buckets; the last
+# bucket catches everything slower.
+LATENCY_BUCKETS=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# The ColorTouch web server copes badly with concurrent requests, so each client
+# sends at most DEFAULT_MAX_IN_FLIGHT at a time. Waiting requests go out by lane:
+# commands first, then polls, then background fetches (runtimes, alerts).
+DEFAULT_MAX_IN_FLIGHT=1
+PRIORITY_COMMAND=0
+PRIORITY_POLL=1
+PRIORITY_BACKGROUND=2
+BACKGROUND_ENDPOINTS=("query/runtimes", "query/alerts")
+
+# A thermostat on the LAN accepts a connection in milliseconds; waiting longer
+# than this to connect only delays noticing that it is gone. The configured
+# timeout still applies to reading the response.
+DEFAULT_CONNECT_TIMEOUT=2
+# Circuit breaker: after BREAKER_THRESHOLD consecutive transport failures,
+# requests fail fast. One probe request is let through after a back-off that
+# starts at BREAKER_BASE_DELAY seconds and doubles (with jitter) per failed
+# probe, up to BREAKER_MAX_DELAY.
+BREAKER_THRESHOLD=3
+BREAKER_BASE_DELAY=5
+BREAKER_MAX_DELAY=300
+BREAKER_JITTER=0.2
+
+
+class CircuitBreaker:
+    """Fail fast on an unreachable thermostat and probe it with exponential back-off."""
+
+    def __init__(self, addr, threshold=BREAKER_THRESHOLD, base_delay=BREAKER_BASE_DELAY,
+                 max_delay=BREAKER_MAX_DELAY):
+        self.addr = addr
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failures = 0
+        self.delay = 0
+        self.retry_at = 0
+
+    @property
+    def is_open(self):
+        return self.failures >= self.threshold
+
+    def allow(self):
+        if not self.is_open:
+            return True
+        now = time.monotonic()
+        if now < self.retry_at:
+            return False
+        # Half-open: this request is the probe. Hold everything else off for
+        # another back-off period in case it never reports back.
+        self.retry_at = now + self.delay
+        return True
+
+    def record_success(self):
+        if self.is_open:
+            _LOGGER.info("Venstar ColorTouch at %s is reachable again", self.addr)
+        self.failures = 0
+        self.delay = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if not self.is_open:
+            return
+        self.delay = min(self.delay * 2 or self.base_delay, self.max_delay)
+        delay = self.delay * random.uniform(1 - BREAKER_JITTER, 1 + BREAKER_JITTER)
+        self.retry_at = time.monotonic() + delay
+        _LOGGER.warning("Venstar ColorTouch at %s is unreachable; next attempt in %.0f s",
+                        self.addr, delay)
+
+
+class EndpointStats:
+    """Latency histogram and outcome counters for one endpoint."""
+
+    __slots__ = ("buckets", "count", "total_latency", "last_latency", "outcomes")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total_latency = 0.0
+        self.last_latency = None
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total_latency": round(self.total_latency, 4),
+            "last_latency": self.last_latency,
+            "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], self.buckets)),
+            **self.outcomes,
+        }
+
+
+class RequestStats:
+    """Per-endpoint request instrumentation for one thermostat.
+
+    Hooks added with add_hook() are called as ``hook(addr, endpoint, outcome,
+    latency)`` for every finished request, and with a latency of None for each
+    digest auth challenge, so the numbers can be exported (to Prometheus, say)
+    as they happen.
+    """
+
+    def __init__(self, addr):
+        self.addr = addr
+        self.endpoints = {}
+        self.last_good_poll = None
+        self._hooks = []
+
+    def add_hook(self, hook):
+        self._hooks.append(hook)
+
+        def remove_hook():
+            self._hooks.remove(hook)
+
+        return remove_hook
+
+    def record(self, endpoint, outcome, latency=None):
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = EndpointStats()
+        stats.outcomes[outcome] += 1
+        if latency is not None:
+            stats.count += 1
+            stats.total_latency += latency
+            stats.last_latency = latency
+            index = 0
+            while index < len(LATENCY_BUCKETS) and latency > LATENCY_BUCKETS[index]:
+                index += 1
+            stats.buckets[index] += 1
+        for hook in self._hooks:
+            try:
+                hook(self.addr, endpoint, outcome, latency)
+            except Exception:
+                _LOGGER.exception("Error in Venstar ColorTouch metrics hook")
+
+    def total(self, outcome):
+        return sum(stats.outcomes[outcome] for stats in self.endpoints.values())
+
+    def as_dict(self):
+        return {
+            "last_good_poll": self.last_good_poll,
+            "endpoints": {endpoint: stats.as_dict() for endpoint, stats in self.endpoints.items()},
+        }
+
+
+class _Lanes:
+    """Waiting requests ordered by priority, then arrival."""
+
+    def __init__(self, max_in_flight):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._waiting = []
+        self._order = itertools.count()
+
+    @property
+    def waiting(self):
+        return len(self._waiting)
+
+    def _push(self, priority, waiter):
+        heapq.heappush(self._waiting, (priority, next(self._order), waiter))
+
+
+class RequestScheduler(_Lanes):
+    """Per-device request slots for the async client.
+
+    ``async with scheduler.slot(priority)`` waits for one of ``max_in_flight``
+    slots; when one frees up it goes to the waiting request with the lowest
+    priority number, first come first served within a lane.
+    """
+
+    async def acquire(self, priority):
+        if self.in_flight < self.max_in_flight and not self._waiting:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._push(priority, waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Granted just as we were cancelled: pass the slot on.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        while self._waiting and self.in_flight < self.max_in_flight:
+            waiter = heapq.heappop(self._waiting)[2]
+            if waiter.done():
+                continue  # cancelled while waiting
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class SyncRequestScheduler(_Lanes):
+    """Per-device request slots for the sync client, shared between threads."""
+
+    def __init__(self, max_in_flight):
+        super().__init__(max_in_flight)
+        self._cond = threading.Condition()
+
+    def acquire(self, priority):
+        with self._cond:
+            entry = object()
+            self._push(priority, entry)
+            self._cond.wait_for(lambda: self.in_flight < self.max_in_flight
+                                and self._waiting[0][2] is entry)
+            heapq.heappop(self._waiting)
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority):
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+#
+# API constants
+#
+class Mode(IntEnum):
+    OFF = 0
+    HEAT = 1
+    COOL = 2
+    AUTO = 3
+
+
+class State(IntEnum):
+    IDLE = 0
+    HEATING = 1
+    COOLING = 2
+    LOCKOUT = 3
+    ERROR = 4
+
+
+class Fan(IntEnum):
+    AUTO = 0
+    ON = 1
+
+
+class FanState(IntEnum):
+    OFF = 0
+    ON = 1
+
+
+class TempUnits(IntEnum):
+    F = 0
+    C = 1
+
+
+class SchedulePart(IntEnum):
+    MORNING = 0
+    DAY = 1
+    EVENING = 2
+    NIGHT = 3
+    INACTIVE = 255
+
+
+def _plain(value):
+    # str() of an IntEnum is its name before Python 3.11; send the number.
+    return int(value) if isinstance(value, IntEnum) else value
+
+
+#
+# Parsed device state. Each response is parsed once into an immutable snapshot
+# and swapped in whole, so readers get plain attribute reads and never see a
+# half-applied update.
+#
+class _Snapshot:
+    __slots__ = ()
+    _defaults = {}
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields.get(name, self._defaults.get(name)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{0} is read-only".format(type(self).__name__))
+
+    __delattr__ = __setattr__
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return "{0}({1})".format(type(self).__name__, ", ".join(
+            "{0}={1!r}".format(name, getattr(self, name)) for name in self.__slots__))
+
+    def replace(self, **changes):
+        fields = self.as_dict()
+        fields.update(changes)
+        return type(self)(**fields)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def diff(self, other):
+        """Return the names of the fields that differ from ``other``."""
+        return {name for name in self.__slots__ if getattr(self, name) != getattr(other, name)}
+
+
+class InfoSnapshot(_Snapshot):
+    """query/info"""
+    __slots__ = ("name", "mode", "state", "activestage", "fan", "fanstate", "tempunits",
+                 "schedule", "schedulepart", "away", "holiday", "override", "overridetime",
+                 "forceunocc", "spacetemp", "heattemp", "cooltemp", "cooltempmin",
+                 "cooltempmax", "heattempmin", "heattempmax", "setpointdelta", "hum",
+                 "hum_setpoint", "dehum_setpoint", "hum_active", "availablemodes")
+    # T5800 thermostats leave out the humidity fields entirely.
+    _defaults = {"hum_active": 0}
+
+
+# Sensor types reported by API v5+ firmware. Older firmware has no "type" and
+# always lists the thermostat's own sensor first and the outdoor one second.
+SENSOR_THERMOSTAT="Thermostat"
+SENSOR_OUTDOOR="Outdoor"
+SENSOR_REMOTE="Remote"
+SENSOR_SUPPLY="Supply"
+SENSOR_RETURN="Return"
+
+
+class SensorReading(_Snapshot):
+    """One entry of query/sensors. 'hum' is not present on T5800 series."""
+    __slots__ = ("name", "type", "id", "temp", "hum", "battery")
+
+
+class SensorsSnapshot(_Snapshot):
+    """query/sensors, indexed once so lookups are a dict or attribute read.
+
+    ``by_key`` maps a stable per-sensor key (its name, made unique) to its
+    reading and ``by_type`` maps each sensor type to its readings in device
+    order. ``thermostat`` and ``outdoor`` are EMPTY_READING when absent.
+    """
+    __slots__ = ("readings", "by_key", "by_type", "thermostat", "outdoor")
+
+    @classmethod
+    def from_readings(cls, readings):
+        readings = tuple(readings)
+        by_key = {}
+        by_type = {}
+        for index, reading in enumerate(readings):
+            key = reading.name or str(index)
+            if key in by_key:
+                key = "{0} {1}".format(key, index)
+            by_key[key] = reading
+            by_type.setdefault(reading.type or _legacy_sensor_type(index), []).append(reading)
+        return cls(readings=readings,
+                   by_key=MappingProxyType(by_key),
+                   by_type=MappingProxyType({kind: tuple(found) for kind, found in by_type.items()}),
+                   thermostat=by_type.get(SENSOR_THERMOSTAT, (EMPTY_READING,))[0],
+                   outdoor=by_type.get(SENSOR_OUTDOOR, (EMPTY_READING,))[0])
+
+    def get(self, sensor):
+        """Return the reading for a sensor key or the first of a type, or None."""
+        reading = self.by_key.get(sensor)
+        if reading is None:
+            found = self.by_type.get(sensor)
+            reading = found[0] if found else None
+        return reading
+
+
+def _legacy_sensor_type(index):
+    return {0: SENSOR_THERMOSTAT, 1: SENSOR_OUTDOOR}.get(index, SENSOR_REMOTE)
+
+
+class Alert(_Snapshot):
+    """One entry of query/alerts."""
+    __slots__ = ("name", "active")
+
+
+class Program(_Snapshot):
+    """What the thermostat should be doing: schedule on/off, away, mode, fan and
+    setpoints. In a desired program, a field left as None is left as it is.
+
+    The local API has no endpoint for the weekly schedule's own periods, so
+    this covers everything /control and /settings can change.
+    """
+    __slots__ = ("schedule", "away", "mode", "fan", "heattemp", "cooltemp",
+                 "hum_setpoint", "dehum_setpoint")
+
+
+EMPTY_INFO = InfoSnapshot()
+EMPTY_READING = SensorReading()
+EMPTY_SENSORS = SensorsSnapshot.from_readings(())
+
+
+class RecordStream:
+    """Incremental parser for a body holding one array of flat records.
+
+    query/runtimes is ``{"runtimes": [{...}, {...}, ...]}`` and can run to a
+    few hundred records. Bytes are fed in as they arrive; each record is decoded
+    as soon as its closing brace is in, so the whole body is never held or
+    parsed at once. Records with a ``ts`` older than ``since`` are dropped as
+    they're read.
+    """
+
+    _SEPARATORS = re.compile(rb"[\s,]*")
+
+    def __init__(self, since=None):
+        self.since = since
+        self.records = []
+        self._buf = bytearray()
+        self._in_array = False
+        self._done = False
+
+    def feed(self, chunk):
+        self._buf += chunk
+        buf = self._buf
+        pos = 0
+        if not self._in_array:
+            pos = buf.find(b"[")
+            if pos < 0:
+                return
+            self._in_array = True
+            pos += 1
+        while not self._done:
+            pos = self._SEPARATORS.match(buf, pos).end()
+            if pos == len(buf):
+                break
+            if buf[pos] == 0x5d:  # "]"
+                self._done = True
+                break
+            if buf[pos] != 0x7b:  # "{"
+                raise ValueError("unexpected byte at offset {0} of record array".format(pos))
+            record, end = self._next_record(buf, pos)
+            if record is None:
+                break
+            if self.since is None or record.get("ts", 0) >= self.since:
+                self.records.append(record)
+            pos = end
+        del buf[:pos]
+
+    @staticmethod
+    def _next_record(buf, start):
+        # Records are flat, so the first "}" that completes valid JSON ends
+        # one; a "}" inside a string value just means trying the next one.
+        end = buf.find(b"}", start)
+        while end >= 0:
+            try:
+                return _loads(bytes(buf[start:end + 1])), end + 1
+            except ValueError:
+                end = buf.find(b"}", end + 1)
+        return None, -1
+
+    def close(self):
+        if not self._in_array:
+            raise ValueError("no record array in body")
+        if not self._done:
+            raise ValueError("record array is truncated")
+        return self.records
+
+
+# Client attributes kept for callers of the original API; each reads through to
+# the current InfoSnapshot.
+_INFO_ATTRIBUTES = ("setpointdelta", "heattemp", "cooltemp", "fan", "mode", "fanstate",
+                    "state", "name", "tempunits", "schedule", "hum_setpoint",
+                    "dehum_setpoint", "hum_active")
+
+
+class _VenstarColorTouchBase:
+    """State and response handling shared by the sync and async clients."""
+
+    #API Constants
+    MODE_OFF = Mode.OFF
+    MODE_HEAT = Mode.HEAT
+    MODE_COOL = Mode.COOL
+    MODE_AUTO = Mode.AUTO
+    STATE_IDLE = State.IDLE
+    STATE_HEATING = State.HEATING
+    STATE_COOLING = State.COOLING
+    STATE_LOCKOUT = State.LOCKOUT
+    STATE_ERROR = State.ERROR
+    FAN_AUTO = Fan.AUTO
+    FAN_ON = Fan.ON
+    FANSTATE_OFF = FanState.OFF
+    FANSTATE_ON = FanState.ON
+    TEMPUNITS_F = TempUnits.F
+    TEMPUNITS_C = TempUnits.C
+    SCHED_F = 0
+    SCHED_C = 1
+    SCHEDPART_MORNING = SchedulePart.MORNING
+    SCHEDPART_DAY = SchedulePart.DAY
+    SCHEDPART_EVENING = SchedulePart.EVENING
+    SCHEDPART_NIGHT = SchedulePart.NIGHT
+    SCHEDPART_INACTIVE = SchedulePart.INACTIVE
+    #AWAY_HOME = 0
+    #AWAY_AWAY = 1
+
+    def __init__(self, addr, timeout, user=None, password=None, proto='http', SSLCert=False,
+                 connect_timeout=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        #Input parameters
+        self.addr = addr
+        self.timeout = timeout
+        self.user = user
+        self.password = password
+        self.proto = proto
+        self.SSLCert = SSLCert
+        self.connect_timeout = min(connect_timeout or DEFAULT_CONNECT_TIMEOUT, timeout)
+        self.max_in_flight = max_in_flight
+        self.stats = RequestStats(addr)
+        self.breaker = CircuitBreaker(addr)
+        # Reads queued or in flight, by path; an identical read joins them.
+        self._reads = {}
+
+        #Initialize State
+        self.status = {}
+        self._api_ver = None
+        self._type = None
+        self.model = None
+        self.firmware = None
+        self.info = EMPTY_INFO
+        self.sensors = EMPTY_SENSORS
+        self.alerts = ()
+        # Raw bodies of the last applied query/info and query/sensors responses;
+        # an identical body is skipped without being parsed again.
+        self._info_body = None
+        self._sensors_body = None
+        self._alerts_body = None
+        # Fields that changed in the most recent update or write: query/info keys
+        # and "sensors.<key>.<field>" for sensor readings. None until the first
+        # update. Alert polls leave it alone and return their transitions.
+        self.changed = None
+        # Bumped on every accepted write; a refresh whose requests started
+        # before a write landed must not overwrite the newer local state.
+        self._write_count = 0
+
+    @property
+    def available(self):
+        """False while the circuit breaker considers the device unreachable."""
+        return not self.breaker.is_open
+
+    def move(self, addr):
+        """Point the client at the device's new address (e.g. after a DHCP change)."""
+        _LOGGER.info("Venstar ColorTouch moved from %s to %s", self.addr, addr)
+        self.addr = addr
+        self.stats.addr = addr
+        # Failures at the old address say nothing about the new one.
+        self.breaker = CircuitBreaker(addr)
+
+    def _priority(self, path, data):
+        if data is not None:
+            return PRIORITY_COMMAND
+        if self._endpoint(path) in BACKGROUND_ENDPOINTS:
+            return PRIORITY_BACKGROUND
+        return PRIORITY_POLL
+
+    def _circuit_open(self, endpoint):
+        if self.breaker.allow():
+            return False
+        self.stats.record(endpoint, OUTCOME_CIRCUIT_OPEN)
+        return True
+
+    @staticmethod
+    def _endpoint(path):
+        return path.strip("/") or "/"
+
+    def _uri(self, path):
+        return "{proto}://{addr}/{path}".format(proto=self.proto, addr=self.addr,
+                                               path=path.lstrip("/"))
+
+    def _parse_login(self, j):
+        if j["api_ver"] >= MIN_API_VER:
+            self._api_ver = j["api_ver"]
+            self._type = j["type"]
+            self.model = j.get("model")
+            self.firmware = j.get("firmware")
+            return True
+        else:
+            return False
+
+    #
+    # Identity: what login() and the first query/info establish about a unit and
+    # what rarely changes. Saving it lets a restart show the unit (name, units)
+    # before the device has answered.
+    #
+    @property
+    def identity(self):
+        return {
+            "api_ver": self._api_ver,
+            "type": self._type,
+            "model": self.model,
+            "firmware": self.firmware,
+            "name": self.info.name,
+            "tempunits": self.info.tempunits,
+        }
+
+    def restore_identity(self, identity):
+        self._api_ver = identity.get("api_ver")
+        self._type = identity.get("type")
+        self.model = identity.get("model")
+        self.firmware = identity.get("firmware")
+        self.info = self.info.replace(name=identity.get("name"),
+                                      tempunits=identity.get("tempunits"))
+
+    def _parse_info(self, j):
+        info = InfoSnapshot(**j)
+        self.changed.update(info.diff(self.info))
+        self.info = info
+        return True
+
+    def _parse_sensors(self, j):
+        sensors = SensorsSnapshot.from_readings(
+            SensorReading(**reading) for reading in j.get("sensors") or ())
+        # Changes are reported per sensor key ("sensors.<key>.<field>"), and for
+        # the thermostat's own sensor also as "sensors.thermostat.<field>".
+        old, new = self.sensors, sensors
+        for key in old.by_key.keys() | new.by_key.keys():
+            self.changed.update("sensors.{0}.{1}".format(key, field) for field in
+                                new.by_key.get(key, EMPTY_READING).diff(
+                                    old.by_key.get(key, EMPTY_READING)))
+        self.changed.update("sensors.thermostat.{0}".format(field)
+                            for field in new.thermostat.diff(old.thermostat))
+        self.sensors = sensors
+        return True
+
+    def _parse_alerts(self, j):
+        self.alerts = tuple(Alert(**alert) for alert in j.get("alerts") or ())
+        return self.alerts
+
+    #
+    # Change detection: compare each raw body with the last one and only parse
+    # and diff it when it differs. self.changed collects the snapshot fields
+    # that actually changed.
+    #
+    # Every response body is decoded here, once.
+    def _decode(self, path, body):
+        try:
+            return _loads(body)
+        except ValueError as ex:
+            _LOGGER.error("Invalid response to %s from Venstar ColorTouch: %s", path, ex)
+            return False
+
+    def _apply_info_body(self, body):
+        if body == self._info_body:
+            self.stats.last_good_poll = time.time()
+            return True
+        info = self._decode("query/info", body)
+        if info is False:
+            return False
+        self._info_body = body
+        self.stats.last_good_poll = time.time()
+        return self._parse_info(info)
+
+    def _apply_sensors_body(self, body):
+        if body == self._sensors_body:
+            return True
+        sensors = self._decode("query/sensors", body)
+        if sensors is False:
+            return False
+        self._sensors_body = body
+        return self._parse_sensors(sensors)
+
+    def _apply_alerts_body(self, body):
+        # Returns the alerts that turned on or cleared since the last poll (an
+        # alert that disappears from the list counts as cleared), or False.
+        if body == self._alerts_body:
+            return ()
+        j = self._decode("query/alerts", body)
+        if j is False:
+            return False
+        was_active = {alert.name: bool(alert.active) for alert in self.alerts}
+        alerts = self._parse_alerts(j)
+        self._alerts_body = body
+        transitions = [alert for alert in alerts
+                       if bool(alert.active) != was_active.pop(alert.name, False)]
+        transitions.extend(Alert(name=name, active=False)
+                           for name, active in was_active.items() if active)
+        return tuple(transitions)
+
+    def _apply_refresh(self, info, sensors, write_count):
+        # Both bodies are applied back to back once both requests are done, so
+        # readers never see new info paired with stale sensors or vice versa.
+        self.changed = set()
+        if info is not False and write_count != self._write_count:
+            # A write was accepted while query/info was in flight; keep the
+            # optimistic state and let the next refresh confirm it.
+            self.stats.last_good_poll = time.time()
+            info_success = True
+        else:
+            info_success = info is not False and self._apply_info_body(info)
+        return {
+            "info": info_success,
+            "sensors": sensors is not False and self._apply_sensors_body(sensors),
+        }
+
+    def _control_data(self, changes=None):
+        values = {'mode':self.mode, 'fan':self.fan, 'heattemp':self.heattemp, 'cooltemp':self.cooltemp}
+        values.update(changes or {})
+        return urllib.parse.urlencode({key: _plain(value) for key, value in values.items()})
+
+    def _settings_data(self, changes=None):
+        values = {'tempunits':self.tempunits, 'hum_setpoint':self.hum_setpoint, 'dehum_setpoint':self.dehum_setpoint}
+        values.update(changes or {})
+        return urllib.parse.urlencode({key: _plain(value) for key, value in values.items()})
+
+    #
+    # Optimistic update: local fields only change once the device has accepted
+    # the write, and then without a follow-up read. Callers that want to confirm
+    # what the device ended up with schedule their own (single) refresh.
+    #
+    def _apply_write(self, changes):
+        self.info = self.info.replace(**{field: _plain(value) for field, value in changes.items()})
+        self._write_count += 1
+        self.changed = set(changes)
+        # The next query/info must be parsed even if it matches the last body:
+        # it is what confirms (or reverts) the optimistic change.
+        self._info_body = None
+
+    def _check_result(self, name, j):
+        if "success" in j:
+            _LOGGER.debug("%s Success!", name)
+            return True
+        _LOGGER.error("%s Fail %s.", name, j)
+        return False
+
+    def _check_setpoints(self, heattemp, cooltemp, mode=None):
+        # Must not violate setpointdelta if we're (about to be) in auto mode.
+        if mode is None:
+            mode = self.mode
+        if mode != self.MODE_AUTO:
+            return True
+        if heattemp is None or cooltemp is None or self.setpointdelta is None:
+            _LOGGER.error("Can't check the auto mode setpoints before both setpoints "
+                          "and the setpoint delta are known.")
+            return False
+        if heattemp + self.setpointdelta > cooltemp:
+            _LOGGER.error("In auto mode, the cool temp must be %s "
+                          "degrees warmer than the heat temp.", self.setpointdelta)
+            return False
+        return True
+
+    @property
+    def program(self):
+        """The current Program, read from the last query/info."""
+        info = self.info
+        return Program(**{field: getattr(info, field) for field in Program.__slots__})
+
+    #
+    # Program writes: diff a desired Program against the current state and plan
+    # the fewest writes that get there. Settings can't change while the schedule
+    # runs, so a running schedule is switched off in the same /settings write,
+    # and switching it on is always the last step.
+    #
+    def plan_program(self, program):
+        """Return the ("settings" | "control" | "schedule", changes) steps to apply ``program``.
+
+        Returns False if the program's setpoints are invalid.
+        """
+        info = self.info
+        changes = {field: _plain(value) for field, value in program.as_dict().items()
+                   if value is not None and _plain(value) != getattr(info, field)}
+        control = {field: changes.pop(field) for field in CONTROL_FIELDS if field in changes}
+        schedule = changes.pop("schedule", info.schedule)
+        if control and not self._check_setpoints(control.get("heattemp", info.heattemp),
+                                                 control.get("cooltemp", info.cooltemp),
+                                                 control.get("mode", info.mode)):
+            return False
+        steps = []
+        running = info.schedule
+        if changes:
+            if running:
+                changes["schedule"] = running = 0
+            steps.append(("settings", changes))
+        if control:
+            steps.append(("control", control))
+        if schedule != running:
+            steps.append(("schedule", {"schedule": schedule}))
+        return steps
+
+    def get_info(self, attr):
+        return getattr(self.info, attr)
+
+    def get_sensor(self, sensor, attr):
+        """Return ``attr`` of a sensor, by key or type, or None if it isn't there."""
+        reading = self.sensors.get(sensor)
+        return None if reading is None else getattr(reading, attr)
+
+    def get_thermostat_sensor(self, attr):
+        return getattr(self.sensors.thermostat, attr)
+
+    def get_outdoor_sensor(self, attr):
+        return getattr(self.sensors.outdoor, attr)
+
+    def get_indoor_temp(self):
+        return self.sensors.thermostat.temp
+
+    def get_outdoor_temp(self):
+        return self.sensors.outdoor.temp
+
+    def get_indoor_humidity(self):
+        return self.sensors.thermostat.hum
+
+
+for _field in _INFO_ATTRIBUTES:
+    setattr(_VenstarColorTouchBase, _field, property(attrgetter("info." + _field)))
+del _field
+
+
+# Hosts whose InsecureRequestWarning is already filtered; each gets one filter,
+# however many clients are created for it or moved to it.
+_QUIET_HOSTS = set()
+
+
+def _import_requests():
+    global requests, urllib3
+    if requests is None:
+        import requests.adapters
+        import requests.auth
+        import urllib3.util.retry
+
+
+class VenstarColorTouch(_VenstarColorTouchBase):
+    def __init__(self, addr, timeout, user=None, password=None, proto='http', SSLCert=False,
+                 connect_timeout=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        super().__init__(addr, timeout, user, password, proto, SSLCert, connect_timeout,
+                         max_in_flight)
+        _import_requests()
+        self.scheduler = SyncRequestScheduler(max_in_flight)
+        self._reads_lock = threading.Lock()
+
+        if user != None and password != None:
+            self.auth = requests.auth.HTTPDigestAuth(user, password)
+        else:
+            self.auth = None
+
+        self._session = None
+        self._ignore_insecure_warning()
+
+    def move(self, addr):
+        super().move(addr)
+        self._ignore_insecure_warning()
+
+    #
+    # SSLCert=False turns off certificate checks on purpose (the units use
+    # self-signed certificates). urllib3 would warn on every request; ignore that
+    # warning for this unit's host only, leaving it on for everything else in
+    # the process.
+    #
+    def _ignore_insecure_warning(self):
+        if self.proto != "https" or self.SSLCert:
+            return
+        host = urllib.parse.urlsplit(self._uri("")).hostname
+        if host in _QUIET_HOSTS:
+            return
+        _QUIET_HOSTS.add(host)
+        warnings.filterwarnings(
+            "ignore", "Unverified HTTPS request is being made to host '{0}'".format(re.escape(host)),
+            urllib3.exceptions.InsecureRequestWarning)
+
+    def login(self):
+        j = self._request_json("/")
+        if j is False:
+            return j
+        return self._parse_login(j)
+
+    #
+    # One long-lived session per thermostat: keeps the TCP (and TLS) connection
+    # alive between polls, and the shared HTTPDigestAuth object remembers the
+    # last nonce so authenticated requests don't need a 401 challenge each time.
+    #
+    def _get_session(self):
+        if self._session is None:
+            session = requests.Session()
+            retries = urllib3.util.retry.Retry(total=CONNECT_RETRIES, connect=CONNECT_RETRIES,
+                                               read=0, status=0, redirect=0,
+                                               raise_on_status=False)
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                    pool_maxsize=POOL_MAXSIZE,
+                                                    max_retries=retries)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.auth = self.auth
+            self._session = session
+        return self._session
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    #
+    # All traffic goes through the scheduler. A read of a path another thread is
+    # already reading (or waiting to read) waits for that response instead of
+    # sending its own.
+    #
+    def _request(self, path, data=None):
+        if data is not None:
+            with self.scheduler.slot(PRIORITY_COMMAND):
+                return self._send(path, data)
+        with self._reads_lock:
+            read = self._reads.get(path)
+            leader = read is None
+            if leader:
+                read = self._reads[path] = _SharedRead()
+        if not leader:
+            self.stats.record(self._endpoint(path), OUTCOME_MERGED)
+            read.done.wait()
+            return read.result
+        try:
+            with self.scheduler.slot(self._priority(path, None)):
+                read.result = self._send(path)
+        finally:
+            with self._reads_lock:
+                del self._reads[path]
+            read.done.set()
+        return read.result
+
+    def _send(self, path, data=None, stream=False):
+        uri = self._uri(path)
+        endpoint = self._endpoint(path)
+        if self._circuit_open(endpoint):
+            return False
+        session = self._get_session()
+        timeout = (self.connect_timeout, self.timeout)
+        start = time.monotonic()
+        try:
+            # verify is passed per request: requests lets REQUESTS_CA_BUNDLE
+            # override a session-level verify=False.
+            if data is not None:
+                req = session.post(uri,
+                                   verify=self.SSLCert,
+                                   timeout=timeout,
+                                   data=data)
+            else:
+                req = session.get(uri,
+                                  verify=self.SSLCert,
+                                  timeout=timeout,
+                                  stream=stream)
+        except requests.exceptions.Timeout as ex:
+            self.breaker.record_failure()
+            self.stats.record(endpoint, OUTCOME_TIMEOUT, time.monotonic() - start)
+            _LOGGER.error("Timeout requesting %s from Venstar ColorTouch: %s", uri, ex)
+            return False
+        except requests.exceptions.ConnectionError as ex:
+            # Drop the pool so the next call starts from a fresh connection
+            # rather than reusing one the device has already torn down.
+            self.close()
+            self.breaker.record_failure()
+            self.stats.record(endpoint, OUTCOME_CONNECTION_ERROR, time.monotonic() - start)
+            _LOGGER.error("Error requesting %s from Venstar ColorTouch: %s", uri, ex)
+            return False
+        except Exception as ex:
+            self.breaker.record_failure()
+            self.stats.record(endpoint, OUTCOME_CONNECTION_ERROR, time.monotonic() - start)
+            _LOGGER.error("Error requesting %s from Venstar ColorTouch: %s", uri, ex)
+            return False
+        latency = time.monotonic() - start
+        # Any HTTP response at all means the device is reachable.
+        self.breaker.record_success()
+
+        # HTTPDigestAuth answers challenges itself; they show up in the history.
+        for previous in req.history:
+            if previous.status_code == 401:
+                self.stats.record(endpoint, OUTCOME_AUTH_CHALLENGE)
+
+        if not req.ok:
+            self.stats.record(endpoint, OUTCOME_HTTP_ERROR, latency)
+            _LOGGER.error("Connection error requesting %s from Venstar ColorTouch. Status Code: %s",
+                          uri, req.status_code)
+            return False
+
+        self.stats.record(endpoint, OUTCOME_SUCCESS, latency)
+        return req
+
+    def _request_json(self, path, data=None):
+        r = self._request(path, data)
+        if r is False:
+            return r
+        return self._decode(path, r.content)
+
+    def update_info(self):
+        r = self._request("query/info")
+
+        if r is False:
+            return r
+
+        self.changed = set()
+        return self._apply_info_body(r.content)
+
+    def update_sensors(self):
+        r = self._request("query/sensors")
+
+        if r is False:
+            return r
+        self.changed = set()
+        return self._apply_sensors_body(r.content)
+
+    # Fetch query/info and query/sensors, then apply them together. Returns a dict
+    # mapping "info" and "sensors" to whether that endpoint updated.
+    def refresh(self):
+        write_count = self._write_count
+        info = self._request("query/info")
+        sensors = self._request("query/sensors")
+        return self._apply_refresh(info is not False and info.content,
+                                   sensors is not False and sensors.content,
+                                   write_count)
+
+    # returns a list of all runtime records. get_runtimes()[-1] should be the last one.
+    # runtimes are updated every day (86400 seconds). Records starting before
+    # since (a timestamp) are skipped while the body streams in.
+    def get_runtimes(self, since=None):
+        # The slot is held until the streamed body has been read.
+        with self.scheduler.slot(PRIORITY_BACKGROUND):
+            r = self._send("query/runtimes", stream=True)
+            if r is False:
+                return r
+            parser = RecordStream(since)
+            try:
+                for chunk in r.iter_content(STREAM_CHUNK_SIZE):
+                    parser.feed(chunk)
+                return parser.close()
+            except ValueError as ex:
+                _LOGGER.error("Invalid response to query/runtimes from Venstar ColorTouch: %s", ex)
+            except requests.exceptions.RequestException as ex:
+                _LOGGER.error("Error reading query/runtimes from Venstar ColorTouch: %s", ex)
+            finally:
+                r.close()
+            return False
+
+    def get_alerts(self):
+        j = self._request_json("query/alerts")
+        if j is False:
+            return j
+        return self._parse_alerts(j)[0]
+
+    # Refresh the cached alert list in self.alerts. Returns the alerts whose
+    # state changed since the last call, or False on failure.
+    def update_alerts(self):
+        r = self._request("query/alerts")
+        if r is False:
+            return r
+        return self._apply_alerts_body(r.content)
+
+    # The /control endpoint requires heattemp/cooltemp in each message, even if you're just turning
+    # the fan on/off or setting the mode. So we retrieve everything from self and use accessors
+    # to set them.
+    def _write(self, name, path, data, changes):
+        j = self._request_json(path, data)
+        if j is False:
+            return j
+        if self._check_result(name, j):
+            self._apply_write(changes)
+            return True
+        return False
+
+    def set_control(self, changes=None):
+        if self.mode is None:
+            return False
+        return self._write("set_control", "/control", self._control_data(changes), changes or {})
+
+    def set_setpoints(self, heattemp, cooltemp):
+        if not self._check_setpoints(heattemp, cooltemp):
+            return False
+        return self.set_control({'heattemp':heattemp, 'cooltemp':cooltemp})
+
+    def set_mode(self, mode):
+        return self.set_control({'mode':mode})
+
+    def set_fan(self, fan):
+        return self.set_control({'fan':fan})
+
+    #
+    # set_settings can't change the schedule or away while schedule is on, so no point in trying.
+    #
+    def set_settings(self, changes=None):
+        if self.mode is None:
+            return False
+        return self._write("set_settings", "/settings", self._settings_data(changes), changes or {})
+
+    def set_tempunits(self, tempunits):
+        return self.set_settings({'tempunits':tempunits})
+
+    #
+    # We can't change any settings while the schedule is active so we can't use set_settings()
+    #
+    def set_schedule(self, schedule):
+        if (self.schedule == schedule):
+            return True
+        #
+        # If thermostat is in away mode, then can't enable schedule.
+        #
+        #if (self.away == 1):
+        #    return False
+        data = urllib.parse.urlencode({'schedule':schedule})
+        return self._write("set_schedule", "/settings", data, {'schedule':schedule})
+
+    def set_hum_setpoint(self, hum_setpoint):
+        return self.set_settings({'hum_setpoint':hum_setpoint})
+
+    def set_dehum_setpoint(self, dehum_setpoint):
+        return self.set_settings({'dehum_setpoint':dehum_setpoint})
+
+    # Bring the thermostat to a Program with only the writes that change something.
+    def apply_program(self, program):
+        steps = self.plan_program(program)
+        if steps is False:
+            return False
+        for step, changes in steps:
+            if step == "settings":
+                success = self.set_settings(changes)
+            elif step == "control":
+                success = self.set_control(changes)
+            else:
+                success = self.set_schedule(changes["schedule"])
+            if not success:
+                return False
+        return True
+
+
+class _SharedRead:
+    """A sync read other threads are waiting on."""
+
+    __slots__ = ("done", "result")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = False
+
+
+class _DigestAuth:
+    """HTTP Digest credentials for aiohttp, which has no built-in digest support.
+
+    The last challenge is kept so every request after the first carries a
+    pre-computed Authorization header instead of taking a 401 round trip.
+    """
+
+    def __init__(self, user, password):
+        self.user = user
+        self.password = password
+        self._chal = None
+        self._nonce_count = 0
+
+    @property
+    def nonce(self):
+        return self._chal["nonce"] if self._chal is not None else None
+
+    def challenge(self, header, sent_nonce=None):
+        """Store a WWW-Authenticate challenge; return False if it can't be answered.
+
+        ``sent_nonce`` is the nonce the rejected request was signed with, if any.
+        """
+        if not header or not header.lower().startswith("digest "):
+            return False
+        try:
+            chal = urllib.request.parse_keqv_list(urllib.request.parse_http_list(header[7:]))
+        except ValueError:
+            return False
+        if "nonce" not in chal:
+            return False
+        # Rejected with the very nonce we signed with, and not flagged stale:
+        # the credentials themselves were refused.
+        if chal["nonce"] == sent_nonce and chal.get("stale", "").lower() != "true":
+            return False
+        if self._chal is None or chal["nonce"] != self._chal["nonce"]:
+            self._chal = chal
+            self._nonce_count = 0
+        return True
+
+    def header(self, method, path):
+        if self._chal is None:
+            return None
+        chal = self._chal
+        algorithm = chal.get("algorithm", "MD5").upper()
+        if algorithm.startswith("SHA-256"):
+            hash_fn = hashlib.sha256
+        else:
+            hash_fn = hashlib.md5
+
+        def H(value):
+            return hash_fn(value.encode("utf-8")).hexdigest()
+
+        realm = chal.get("realm", "")
+        nonce = chal["nonce"]
+        qop = chal.get("qop")
+        ha1 = H("{0}:{1}:{2}".format(self.user, realm, self.password))
+        ha2 = H("{0}:{1}".format(method, path))
+        self._nonce_count += 1
+        nc = "{0:08x}".format(self._nonce_count)
+        cnonce = os.urandom(8).hex()
+        if algorithm.endswith("-SESS"):
+            ha1 = H("{0}:{1}:{2}".format(ha1, nonce, cnonce))
+
+        if qop is None:
+            response = H("{0}:{1}:{2}".format(ha1, nonce, ha2))
+        elif "auth" in [q.strip() for q in qop.split(",")]:
+            response = H("{0}:{1}:{2}:{3}:{4}:{5}".format(ha1, nonce, nc, cnonce, "auth", ha2))
+        else:
+            return None
+
+        header = ('Digest username="{0}", realm="{1}", nonce="{2}", uri="{3}", '
+                  'response="{4}", algorithm="{5}"').format(
+                      self.user, realm, nonce, path, response, chal.get("algorithm", "MD5"))
+        if "opaque" in chal:
+            header += ', opaque="{0}"'.format(chal["opaque"])
+        if qop is not None:
+            header += ', qop="auth", nc={0}, cnonce="{1}"'.format(nc, cnonce)
+        return header
+
+
+class _WriteBatch:
+    """Changes for one write endpoint waiting to go out as a single POST."""
+
+    __slots__ = ("changes", "futures", "timer")
+
+    def __init__(self):
+        self.changes = {}
+        self.futures = []
+        self.timer = None
+
+    def resolve(self, success):
+        for future in self.futures:
+            if not future.done():
+                future.set_result(success)
+
+
+class AsyncVenstarColorTouch(_VenstarColorTouchBase):
+    """Asyncio client; every device call is a coroutine run on the event loop.
+
+    Pass an existing aiohttp ``session`` to share its connection pool (Home
+    Assistant's shared session, for instance). Otherwise the client opens its
+    own on first use and ``close()`` must be awaited to release it.
+    """
+
+    def __init__(self, addr, timeout, user=None, password=None, proto='http', SSLCert=False,
+                 session=None, connect_timeout=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        super().__init__(addr, timeout, user, password, proto, SSLCert, connect_timeout,
+                         max_in_flight)
+        self.scheduler = RequestScheduler(max_in_flight)
+
+        if user != None and password != None:
+            self.auth = _DigestAuth(user, password)
+        else:
+            self.auth = None
+
+        self._session = session
+        self._owns_session = session is None
+        if SSLCert is False:
+            self._ssl = False
+        elif isinstance(SSLCert, str):
+            self._ssl = ssl.create_default_context(cafile=SSLCert)
+        else:
+            self._ssl = None
+
+        self._timeout = aiohttp.ClientTimeout(total=self.connect_timeout + self.timeout,
+                                              sock_connect=self.connect_timeout,
+                                              sock_read=self.timeout)
+        self.write_debounce = WRITE_DEBOUNCE
+        self._batches = {}
+        self._flushes = set()
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=POOL_MAXSIZE))
+        return self._session
+
+    async def close(self):
+        # Queued writes fail rather than going out after the client is gone.
+        for batch in self._batches.values():
+            batch.timer.cancel()
+            batch.resolve(False)
+        self._batches = {}
+        flushes = list(self._flushes)
+        for task in flushes:
+            task.cancel()
+        await asyncio.gather(*flushes, return_exceptions=True)
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _request(self, path, data=None):
+        """Return the decoded JSON body, or False on any failure."""
+        body = await self._request_body(path, data)
+        if body is False:
+            return body
+        return self._decode(path, body)
+
+    async def _request_body(self, path, data=None, parser=None):
+        """Send a request through the scheduler; see _send for the result.
+
+        A plain read of a path that is already queued or in flight joins that
+        request instead of sending another.
+        """
+        if data is not None or parser is not None:
+            async with self.scheduler.slot(self._priority(path, data)):
+                return await self._send(path, data, parser)
+        read = self._reads.get(path)
+        if read is None:
+            read = self._reads[path] = asyncio.ensure_future(self._scheduled_read(path))
+        else:
+            self.stats.record(self._endpoint(path), OUTCOME_MERGED)
+        # Shielded: one caller giving up doesn't cancel the read for the others.
+        return await asyncio.shield(read)
+
+    async def _scheduled_read(self, path):
+        try:
+            async with self.scheduler.slot(self._priority(path, None)):
+                return await self._send(path)
+        finally:
+            del self._reads[path]
+
+    async def _send(self, path, data=None, parser=None):
+        """Return the raw response body, or False on any failure.
+
+        With a ``parser`` (a RecordStream), the body is fed to it chunk by chunk
+        as it arrives and the parsed records are returned instead.
+        """
+        uri = self._uri(path)
+        endpoint = self._endpoint(path)
+        method = "GET" if data is None else "POST"
+        target = "/" + path.lstrip("/")
+        headers = {}
+        if data is not None:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if self._circuit_open(endpoint):
+            return False
+        session = self._get_session()
+        start = time.monotonic()
+        try:
+            # At most two passes: the second only after answering a fresh digest challenge.
+            for _ in range(2):
+                sent_nonce = None
+                if self.auth is not None:
+                    authorization = self.auth.header(method, target)
+                    if authorization is not None:
+                        headers["Authorization"] = authorization
+                        sent_nonce = self.auth.nonce
+                async with session.request(method, uri, data=data, headers=headers,
+                                           ssl=self._ssl,
+                                           timeout=self._timeout) as resp:
+                    self.breaker.record_success()
+                    if (resp.status == 401 and self.auth is not None
+                            and self.auth.challenge(resp.headers.get("WWW-Authenticate"), sent_nonce)):
+                        self.stats.record(endpoint, OUTCOME_AUTH_CHALLENGE)
+                        await resp.read()
+                        continue
+                    if resp.status >= 400:
+                        self.stats.record(endpoint, OUTCOME_HTTP_ERROR, time.monotonic() - start)
+                        _LOGGER.error("Connection error requesting %s from Venstar ColorTouch. Status Code: %s",
+                                      uri, resp.status)
+                        return False
+                    if parser is not None:
+                        async for chunk in resp.content.iter_chunked(STREAM_CHUNK_SIZE):
+                            parser.feed(chunk)
+                        body = parser.close()
+                    else:
+                        body = await resp.read()
+                    self.stats.record(endpoint, OUTCOME_SUCCESS, time.monotonic() - start)
+                    return body
+        except asyncio.TimeoutError:
+            self.breaker.record_failure()
+            self.stats.record(endpoint, OUTCOME_TIMEOUT, time.monotonic() - start)
+            _LOGGER.error("Timeout requesting %s from Venstar ColorTouch", uri)
+            return False
+        except aiohttp.ClientError as ex:
+            self.breaker.record_failure()
+            self.stats.record(endpoint, OUTCOME_CONNECTION_ERROR, time.monotonic() - start)
+            _LOGGER.error("Error requesting %s from Venstar ColorTouch: %r", uri, ex)
+            return False
+        except ValueError as ex:
+            _LOGGER.error("Invalid response to %s from Venstar ColorTouch: %s", path, ex)
+            return False
+        self.stats.record(endpoint, OUTCOME_HTTP_ERROR, time.monotonic() - start)
+        _LOGGER.error("Authentication with Venstar ColorTouch at %s failed", uri)
+        return False
+
+    async def login(self):
+        j = await self._request("/")
+        if j is False:
+            return j
+        return self._parse_login(j)
+
+    async def update_info(self):
+        body = await self._request_body("query/info")
+        if body is False:
+            return body
+        self.changed = set()
+        return self._apply_info_body(body)
+
+    async def update_sensors(self):
+        body = await self._request_body("query/sensors")
+        if body is False:
+            return body
+        self.changed = set()
+        return self._apply_sensors_body(body)
+
+    async def refresh(self):
+        """Fetch query/info and query/sensors and apply both together.
+
+        Both are queued at once; they go out concurrently if max_in_flight
+        allows, otherwise back to back. Returns a dict mapping "info" and
+        "sensors" to whether that endpoint updated.
+        """
+        write_count = self._write_count
+        info, sensors = await asyncio.gather(self._request_body("query/info"),
+                                             self._request_body("query/sensors"))
+        return self._apply_refresh(info, sensors, write_count)
+
+    async def get_runtimes(self, since=None):
+        """Return the daily runtime records, oldest first, or False.
+
+        The body is parsed as it streams in; records starting before ``since``
+        are skipped.
+        """
+        return await self._request_body("query/runtimes", parser=RecordStream(since))
+
+    async def get_alerts(self):
+        j = await self._request("query/alerts")
+        if j is False:
+            return j
+        return self._parse_alerts(j)[0]
+
+    async def update_alerts(self):
+        """Refresh the cached alert list in self.alerts.
+
+        Returns the alerts whose state changed since the last call, or False.
+        """
+        body = await self._request_body("query/alerts")
+        if body is False:
+            return body
+        return self._apply_alerts_body(body)
+
+    #
+    # Write coalescing: setters queue their change instead of posting right away.
+    # Everything queued for an endpoint within write_debounce seconds goes out as
+    # one POST, and every caller's future resolves with that POST's result.
+    #
+    def queue_control(self, **changes):
+        """Queue mode/fan/heattemp/cooltemp changes; return a future for the merged /control write."""
+        return self._queue_write("control", CONTROL_FIELDS, changes)
+
+    def queue_settings(self, **changes):
+        """Queue tempunits/hum_setpoint/dehum_setpoint changes; return a future for the merged /settings write."""
+        return self._queue_write("settings", SETTINGS_FIELDS, changes)
+
+    def _queue_write(self, endpoint, fields, changes):
+        unknown = set(changes) - set(fields)
+        if unknown:
+            raise ValueError("Can't write {0} through /{1}".format(", ".join(sorted(unknown)), endpoint))
+        loop = asyncio.get_running_loop()
+        batch = self._batches.get(endpoint)
+        if batch is None:
+            batch = self._batches[endpoint] = _WriteBatch()
+            batch.timer = loop.call_later(self.write_debounce, self._start_flush, endpoint)
+        batch.changes.update(changes)
+        future = loop.create_future()
+        batch.futures.append(future)
+        return future
+
+    def _start_flush(self, endpoint):
+        batch = self._batches.pop(endpoint)
+        task = asyncio.ensure_future(self._flush(endpoint, batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, endpoint, batch):
+        success = False
+        try:
+            if endpoint == "control":
+                success = await self._write_control(batch.changes)
+            else:
+                success = await self._write_settings(batch.changes)
+        except Exception:
+            _LOGGER.exception("Error writing /%s to Venstar ColorTouch at %s", endpoint, self.addr)
+        finally:
+            # Also when cancelled, so no caller waits on a write that never ends.
+            batch.resolve(success)
+
+    async def _write_control(self, changes):
+        if "heattemp" in changes or "cooltemp" in changes:
+            if not self._check_setpoints(changes.get("heattemp", self.heattemp),
+                                         changes.get("cooltemp", self.cooltemp),
+                                         changes.get("mode", self.mode)):
+                return False
+        return await self.set_control(changes)
+
+    async def _write_settings(self, changes):
+        return await self.set_settings(changes)
+
+    async def _write(self, name, path, data, changes):
+        j = await self._request(path, data)
+        if j is False:
+            return j
+        if self._check_result(name, j):
+            self._apply_write(changes)
+            return True
+        return False
+
+    async def set_control(self, changes=None):
+        if self.mode is None:
+            return False
+        return await self._write("set_control", "/control", self._control_data(changes), changes or {})
+
+    async def set_setpoints(self, heattemp, cooltemp):
+        return await self.queue_control(heattemp=heattemp, cooltemp=cooltemp)
+
+    async def set_mode(self, mode):
+        return await self.queue_control(mode=mode)
+
+    async def set_fan(self, fan):
+        return await self.queue_control(fan=fan)
+
+    async def set_settings(self, changes=None):
+        if self.mode is None:
+            return False
+        return await self._write("set_settings", "/settings", self._settings_data(changes), changes or {})
+
+    async def set_tempunits(self, tempunits):
+        return await self.queue_settings(tempunits=tempunits)
+
+    async def set_schedule(self, schedule):
+        if (self.schedule == schedule):
+            return True
+        data = urllib.parse.urlencode({'schedule':schedule})
+        return await self._write("set_schedule", "/settings", data, {'schedule':schedule})
+
+    async def set_hum_setpoint(self, hum_setpoint):
+        return await self.queue_settings(hum_setpoint=hum_setpoint)
+
+    async def set_dehum_setpoint(self, dehum_setpoint):
+        return await self.queue_settings(dehum_setpoint=dehum_setpoint)
+
+    async def apply_program(self, program):
+        """Bring the thermostat to a Program with only the writes that change something.
+
+        The steps go out directly, in order, rather than through the write queue.
+        """
+        steps = self.plan_program(program)
+        if steps is False:
+            return False
+        for step, changes in steps:
+            if step == "settings":
+                success = await self.set_settings(changes)
+            elif step == "control":
+                success = await self.set_control(changes)
+            else:
+                success = await self.set_schedule(changes["schedule"])
+            if not success:
+                return False
+        return True